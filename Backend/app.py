@@ -1,8 +1,7 @@
-from flask import Flask, render_template, request, jsonify, make_response, redirect, url_for
+from flask import Flask, render_template, request, jsonify, make_response, redirect, url_for, g, Response, stream_with_context
 import os
 import time # Ensure time is imported, it's used later
 from flask_cors import CORS
-import bcrypt
 from flask_jwt_extended import create_access_token, jwt_required, get_jwt_identity, JWTManager
 from datetime import datetime # Import datetime for timestamp formatting
 import psycopg2.errors # Explicitly import psycopg2.errors
@@ -11,15 +10,17 @@ from db_utils import (
     create_user, get_user_by_username_or_email, create_post, create_follow,
     create_like, create_comment, create_saved_post, create_message,
     create_notification, update_user_settings,
-    get_user_by_id, get_all_users, get_all_posts, get_posts_by_user_id, get_likes_for_post,
-    get_comments_for_post, get_messages_between_users, get_saved_posts_for_user,
+    get_user_by_id, iter_users, iter_home_feed_posts, iter_comments_for_post, iter_saved_posts_for_user,
+    iter_notifications_for_user, get_all_posts, get_posts_by_user_id, get_likes_for_post,
+    get_messages_between_users,
     get_followers_for_user, get_following_for_user, get_user_settings,
     get_chat_summaries_for_user,
+    mark_conversation_as_read, # <-- Sohbeti okundu işaretlemek için
     delete_follow,
-    get_notifications_for_user,
+    get_unread_notification_count, # <-- Okunmamış bildirim sayacı
     get_post_by_id, # <-- Import the new function
+    get_users_by_ids, get_posts_by_ids, # <-- Toplu (batch) okuma uç noktaları için
     mark_notification_as_read,
-    get_home_feed_posts, # <-- YENİ IMPORT: Ana sayfa akışı için
     create_comment_like, # <-- Import for comment likes
     delete_comment_like, # <-- Import for deleting comment likes
     get_comment_like_count, # <-- Import for comment like counts
@@ -29,8 +30,26 @@ from db_utils import (
     get_post_like_count, # <-- Import the new function
     search_users, # <-- Import the new function
     update_user_profile, # <-- Import for profile updates
+    update_user_password_hash, # <-- Parola yeni bcrypt maliyetiyle yeniden özetlendiğinde
     is_follow_request_pending # <-- Import for checking pending follow requests
 )
+from pagination import encode_cursor, decode_cursor, parse_limit
+from serialization import json_stream_response, dumps
+from log_utils import get_logger, fields
+import metrics
+from db_config import (
+    METRICS_ENABLED, NOTIFICATION_DISPATCH_ENABLED, REALTIME_ENABLED, SUGGESTIONS_REFRESH_ENABLED, USER_INDEX_ENABLED,
+    USER_SEARCH_DEFAULT_LIMIT, USER_SEARCH_MAX_LIMIT, USERS_LIST_MAX_LIMIT,
+    RATE_LIMIT_LOGIN_IP_CAPACITY, RATE_LIMIT_LOGIN_IP_RATE, RATE_LIMIT_LOGIN_USER_CAPACITY,
+    RATE_LIMIT_LOGIN_USER_RATE, RATE_LIMIT_SIGNUP_IP_CAPACITY, RATE_LIMIT_SIGNUP_IP_RATE, RATE_LIMIT_TRUST_FORWARDED_FOR,
+    BATCH_MAX_IDS,
+)
+import notification_dispatch
+import realtime
+import suggestions
+import user_index
+import passwords
+import ratelimit
 
 # Varsayımsal: Beğeniyi ve kaydedileni kaldırma fonksiyonları db_utils'da olmalı
 # Eğer yoksa, bunları db_utils.py içine eklemelisin.
@@ -52,6 +71,59 @@ CORS(app) # This line allows requests from all origins (for development)
 app.config["JWT_SECRET_KEY"] = "your-super-secret-jwt-key-change-this"  # Change this in your environment!
 jwt = JWTManager(app)
 
+logger = get_logger(__name__)
+
+# Page sizes for keyset-paginated list endpoints
+FEED_PAGE_DEFAULT_LIMIT = 20
+FEED_PAGE_MAX_LIMIT = 100
+NOTIFICATIONS_PAGE_DEFAULT_LIMIT = 30
+NOTIFICATIONS_PAGE_MAX_LIMIT = 100
+MESSAGES_PAGE_DEFAULT_LIMIT = 50
+MESSAGES_PAGE_MAX_LIMIT = 200
+USERS_PAGE_DEFAULT_LIMIT = 50
+USERS_PAGE_MAX_LIMIT = USERS_LIST_MAX_LIMIT
+
+# Bildirim olaylarını outbox'tan notifications tablosuna taşıyan arka plan işçileri
+if NOTIFICATION_DISPATCH_ENABLED:
+    notification_dispatch.get_dispatcher().start()
+
+# Takip değişikliklerinden sonra öneri listelerini yeniden hesaplayan arka plan işçisi
+if SUGGESTIONS_REFRESH_ENABLED:
+    suggestions.get_refresher().start()
+
+# Kullanıcı araması için bellekteki önek indeksi (arka planda yüklenir ve tazelenir)
+if USER_INDEX_ENABLED:
+    user_index.get_index().start()
+
+@app.before_request
+def start_request_timer():
+    g.request_started_at = time.perf_counter()
+
+@app.after_request
+def log_request(response):
+    """Emits one structured INFO line per request and records its latency (static files are skipped)."""
+    if not request.path.startswith('/static/'):
+        started_at = getattr(g, 'request_started_at', None)
+        elapsed = time.perf_counter() - started_at if started_at is not None else 0.0
+        # Route şablonu (ör. /api/users/<int:user_id>) etiket sayısını sınırlı tutar
+        route = request.url_rule.rule if request.url_rule is not None else '<unmatched>'
+        metrics.observe_request(request.method, route, response.status_code, elapsed)
+        logger.info(
+            "request",
+            extra=fields(method=request.method, path=request.path, status=response.status_code,
+                         duration_ms=round(elapsed * 1000, 1), bytes=response.calculate_content_length())
+        )
+    return response
+
+@app.route('/metrics')
+def metrics_endpoint():
+    """Prometheus text exposition of request and query metrics and registered subsystem stats."""
+    if not METRICS_ENABLED:
+        return make_response('metrics disabled\n', 404)
+    response = make_response(metrics.render())
+    response.headers['Content-Type'] = 'text/plain; version=0.0.4; charset=utf-8'
+    return response
+
 @app.after_request
 def add_header(response):
     """
@@ -96,7 +168,7 @@ def home_page():
         posts = get_all_posts() # Or get_home_feed_posts(user_id) if implemented
         return render_template('home.html', posts=posts, user_id=user_id)
     except Exception as e:
-        print(f"Error verifying JWT cookie for /home: {e}")
+        logger.warning("Error verifying JWT cookie for /home: %s", e)
         # If token is invalid or expired, redirect to login
         return redirect(url_for('login_page'))
 
@@ -113,7 +185,7 @@ def messages_page():
         user_id = int(get_jwt_identity())
         return render_template('messages.html', user_id=user_id)
     except Exception as e:
-        print(f"Error verifying JWT cookie for /messages: {e}")
+        logger.warning("Error verifying JWT cookie for /messages: %s", e)
         return redirect(url_for('login_page'))
 
 
@@ -121,28 +193,27 @@ def messages_page():
 def profile_page():
     access_token_cookie = request.cookies.get('access_token_cookie')
     if not access_token_cookie:
-        print("--- /profile route: No access_token_cookie found, redirecting to login. ---")
+        logger.debug("/profile route: No access_token_cookie found, redirecting to login.")
         return redirect(url_for('login_page'))
 
     try:
         from flask_jwt_extended import verify_jwt_in_request, get_jwt_identity
         verify_jwt_in_request(locations=["cookies"])
         user_id = int(get_jwt_identity())
-        print(f"--- /profile route: Retrieved user_id from JWT cookie: {user_id} ---")
+        logger.debug("/profile route: Retrieved user_id from JWT cookie: %s", user_id)
 
         # Fetch the user data for the profile page
         user = get_user_by_id(user_id)
-        print(f"--- /profile route: Result of get_user_by_id({user_id}): {user} ---")
+        logger.debug("/profile route: Result of get_user_by_id(%s): %s", user_id, user)
         if not user:
-            print(f"--- /profile route: User with ID {user_id} not found. ---")
+            logger.debug("/profile route: User with ID %s not found.", user_id)
             return jsonify({"error": "User not found"}), 404
 
         # TODO: Web profili için URL'den username alınmalı ve o kullanıcının profili gösterilmeli.
         # Şu an sadece oturum açmış kullanıcının profilini gösteriyoruz.
         return render_template('profile.html', user=user, user_id=user_id)
     except Exception as e:
-        print(f"Error verifying JWT cookie for /profile: {e}")
-        print(traceback.format_exc())
+        logger.exception("Error verifying JWT cookie for /profile: %s", e)
         return redirect(url_for('login_page'))
 
 
@@ -158,7 +229,7 @@ def create_post_page():
         user_id = int(get_jwt_identity())
         return render_template('create_post.html', user_id=user_id)
     except Exception as e:
-        print(f"Error verifying JWT cookie for /create_post: {e}")
+        logger.warning("Error verifying JWT cookie for /create_post: %s", e)
         return redirect(url_for('login_page'))
 
 
@@ -174,7 +245,7 @@ def settings_page():
         user_id = int(get_jwt_identity())
         return render_template('settings.html', user_id=user_id)
     except Exception as e:
-        print(f"Error verifying JWT cookie for /settings: {e}")
+        logger.warning("Error verifying JWT cookie for /settings: %s", e)
         return redirect(url_for('login_page'))
 
 
@@ -190,7 +261,7 @@ def discover_page():
         user_id = int(get_jwt_identity())
         return render_template('discover.html', user_id=user_id)
     except Exception as e:
-        print(f"Error verifying JWT cookie for /discover: {e}")
+        logger.warning("Error verifying JWT cookie for /discover: %s", e)
         return redirect(url_for('login_page'))
 
 
@@ -206,7 +277,7 @@ def notifications_page():
         user_id = int(get_jwt_identity())
         return render_template('notifications.html', user_id=user_id)
     except Exception as e:
-        print(f"Error verifying JWT cookie for /notifications: {e}")
+        logger.warning("Error verifying JWT cookie for /notifications: %s", e)
         return redirect(url_for('login_page'))
 
 
@@ -222,7 +293,7 @@ def saved_posts_page():
         user_id = int(get_jwt_identity())
         return render_template('saved_posts.html', user_id=user_id)
     except Exception as e:
-        print(f"Error verifying JWT cookie for /saved_posts: {e}")
+        logger.warning("Error verifying JWT cookie for /saved_posts: %s", e)
         return redirect(url_for('login_page'))
 
 
@@ -235,6 +306,26 @@ def saved_posts_page():
 # def get_user_id_from_token(auth_header):
 #     return None
 
+def _client_ip():
+    """Client address used as the per-IP rate limit key (first X-Forwarded-For hop only behind a trusted proxy)."""
+    if RATE_LIMIT_TRUST_FORWARDED_FOR:
+        forwarded_for = request.headers.get('X-Forwarded-For', '')
+        if forwarded_for:
+            return forwarded_for.split(',')[0].strip()
+    return request.remote_addr or 'unknown'
+
+def _too_many_requests(retry_after):
+    """429 response for a request rejected by the rate limiter (see ratelimit.py)."""
+    response = jsonify({'success': False, 'message': 'Too many attempts, please try again later'})
+    response.headers['Retry-After'] = str(retry_after)
+    return response, 429
+
+def _password_hashing_busy():
+    """503 response for when the password hashing pool has no free slot (see passwords.py)."""
+    response = jsonify({'success': False, 'message': 'Server is busy, please try again shortly'})
+    response.headers['Retry-After'] = '1'
+    return response, 503
+
 @app.route('/api/login', methods=['POST'])
 def api_login():
     data = request.get_json()
@@ -244,9 +335,27 @@ def api_login():
     if not username_or_email or not password:
         return jsonify({'success': False, 'message': 'Missing username/email or password'}), 400
 
+    # Kullanıcı araması ve bcrypt'ten önce: önce IP, sonra hedef hesap başına sınır
+    retry_after = (
+        ratelimit.check('login:ip', _client_ip(), RATE_LIMIT_LOGIN_IP_CAPACITY, RATE_LIMIT_LOGIN_IP_RATE)
+        or ratelimit.check('login:user', username_or_email.strip().lower(),
+                           RATE_LIMIT_LOGIN_USER_CAPACITY, RATE_LIMIT_LOGIN_USER_RATE)
+    )
+    if retry_after:
+        return _too_many_requests(retry_after)
+
     user = get_user_by_username_or_email(username_or_email)
 
-    if user and bcrypt.checkpw(password.encode('utf-8'), user['password_hash'].encode('utf-8')):
+    password_ok = False
+    if user:
+        try:
+            password_ok, new_hash = passwords.verify_password(password, user['password_hash'])
+        except passwords.PasswordHashBusy:
+            return _password_hashing_busy()
+        if new_hash:
+            update_user_password_hash(user['user_id'], new_hash)
+
+    if password_ok:
         # Generate a real JWT token, ensuring identity is a string
         access_token = create_access_token(identity=str(user['user_id']))
 
@@ -285,11 +394,18 @@ def api_signup():
     if not username or not email or not password:
         return jsonify({'success': False, 'message': 'Missing username, email, or password'}), 400
 
-    hashed_password = bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt())
+    retry_after = ratelimit.check('signup:ip', _client_ip(), RATE_LIMIT_SIGNUP_IP_CAPACITY, RATE_LIMIT_SIGNUP_IP_RATE)
+    if retry_after:
+        return _too_many_requests(retry_after)
+
+    try:
+        hashed_password = passwords.hash_password(password)
+    except passwords.PasswordHashBusy:
+        return _password_hashing_busy()
 
     # Assuming create_user now only takes mandatory fields
     # Update create_user in db_utils if it should handle optional fields directly
-    user_id = create_user(username, email, hashed_password.decode('utf-8'))
+    user_id = create_user(username, email, hashed_password)
 
     if user_id:
         # Generate a real JWT token, ensuring identity is a string
@@ -380,30 +496,47 @@ def api_get_home_feed_posts():
     #     return jsonify({"error": "Invalid user_id query parameter"}), 400
     # --- End Old User ID Handling ---
 
-    # Use the new function to get the personalized feed
-    posts = get_home_feed_posts(user_id) # user_id is now int
+    # Keyset pagination: ?limit=N&cursor=<next_cursor from the previous page>
+    # Without either parameter the legacy (unpaginated) list response is kept for older clients.
+    limit_param = request.args.get('limit')
+    cursor_param = request.args.get('cursor')
+    if limit_param is None and cursor_param is None:
+        try:
+            return json_stream_response(iter_home_feed_posts(user_id)) # user_id is now int
+        except psycopg2.Error as e:
+            logger.exception("Error fetching home feed for user %s: %s", user_id, e)
+            return jsonify({"error": "Failed to fetch posts"}), 500
 
-    # TODO: Enhance get_home_feed_posts or process here to add 'is_liked' and 'is_saved' status for the requesting user (user_id)
-    # Example (if added to get_home_feed_posts):
-    # for post in posts:
-    #     post['is_liked'] = post.pop('is_liked_by_current_user', False) # Rename/default
-    #     post['is_saved'] = post.pop('is_saved_by_current_user', False) # Rename/default
+    try:
+        limit = parse_limit(limit_param, FEED_PAGE_DEFAULT_LIMIT, FEED_PAGE_MAX_LIMIT)
+        before = decode_cursor(cursor_param, 2, (datetime, int)) if cursor_param else None
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
 
-    return jsonify(posts), 200
+    # Fetch one extra row to know whether another page exists
+    try:
+        return json_stream_response(
+            iter_home_feed_posts(user_id, limit=limit + 1, before=before), key='posts', limit=limit,
+            next_cursor=lambda last_post: encode_cursor(last_post['created_at'], last_post['post_id'])
+        )
+    except psycopg2.Error as e:
+        logger.exception("Error fetching home feed for user %s: %s", user_id, e)
+        return jsonify({"error": "Failed to fetch posts"}), 500
 
 # --- User Endpoints (General) ---
 
 @app.route('/api/users', methods=['GET'])
+@jwt_required(optional=True)
 def api_get_all_users():
-    print("--- Entering api_get_all_users route handler ---") # Added logging
-    # --- Get User ID (Optional, depending on if user list is public) ---
-    # If you want to exclude the current user from the list, get their ID
-    requesting_user_id = get_current_user_id()
-    print(f"--- api_get_all_users: requesting_user_id = {requesting_user_id} ---") # Added logging
-    # If you want to require authentication to see the user list:
-    # if not requesting_user_id:
-    #    return jsonify({"error": "Authentication required"}), 401
-    # --- End Get User ID ---
+    """
+    Lists users ordered by username, USERS_PAGE_MAX_LIMIT at most per request.
+    Without limit/cursor parameters the legacy bare list (first page) is returned;
+    otherwise {'users': [...], 'next_cursor': ...}. The body is streamed from a
+    server-side cursor, so memory use does not grow with the page or table size.
+    """
+    jwt_identity = get_jwt_identity()
+    requesting_user_id = int(jwt_identity) if jwt_identity else None
+    logger.debug("api_get_all_users: requesting_user_id = %s", requesting_user_id) # Added logging
 
     # Get the exclude_user_id from query parameters (still allow excluding others)
     exclude_user_id_str = request.args.get('exclude_user_id')
@@ -412,7 +545,7 @@ def api_get_all_users():
         try:
             exclude_user_id = int(exclude_user_id_str)
         except ValueError:
-            print(f"!!! api_get_all_users: Invalid exclude_user_id query parameter: {exclude_user_id_str} ---") # Added logging
+            logger.error("api_get_all_users: Invalid exclude_user_id query parameter: %s", exclude_user_id_str) # Added logging
             return jsonify({"error": "Invalid exclude_user_id query parameter"}), 400
 
     # If no exclude_user_id is provided in query params, but user is authenticated,
@@ -420,31 +553,27 @@ def api_get_all_users():
     if exclude_user_id is None and requesting_user_id is not None:
         exclude_user_id = requesting_user_id
 
-    # Assuming get_all_users exists in db_utils and can take exclude_user_id
-    # Get the exclude_user_id from query parameters
-    # NOTE: This block seems redundant as exclude_user_id is already determined above.
-    # Keeping it for now but might need refactoring.
-    exclude_user_id_str = request.args.get('exclude_user_id')
-    exclude_user_id = None
-    if exclude_user_id_str:
-        try:
-            exclude_user_id = int(exclude_user_id_str)
-        except ValueError:
-            # This case is already handled above, but keeping for safety
-            print(f"!!! api_get_all_users: Redundant check - Invalid exclude_user_id query parameter: {exclude_user_id_str} ---") # Added logging
-            return jsonify({"error": "Invalid exclude_user_id query parameter"}), 400
+    limit_param = request.args.get('limit')
+    cursor_param = request.args.get('cursor')
+    paginated = limit_param is not None or cursor_param is not None
+    after_username = None
+    try:
+        limit = parse_limit(limit_param, USERS_PAGE_DEFAULT_LIMIT, USERS_PAGE_MAX_LIMIT)
+        if cursor_param:
+            after_username, = decode_cursor(cursor_param, 1, (str,))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    if not paginated:
+        limit = USERS_PAGE_MAX_LIMIT # Eski istemciler sayfalama bilmez; sabit üst sınırla ilk sayfa
 
-    # Use the determined exclude_user_id
-    # print(f"--- Attempting to fetch all users (exclude_user_id: {exclude_user_id}) ---") # Moved logging to db_utils
     try:
-        # Use the actual get_all_users function from db_utils
-        users = get_all_users(current_user_id=exclude_user_id) # Pass exclude_user_id as current_user_id
-        print(f"--- api_get_all_users: Successfully fetched {len(users)} users from db_utils ---") # Added logging
-        return jsonify(users), 200
-    except Exception as e:
-        print(f"!!! Error in api_get_all_users while calling get_all_users: {e}") # More specific logging
-        import traceback
-        print(traceback.format_exc())
+        batches = iter_users(current_user_id=exclude_user_id, limit=limit, after_username=after_username)
+        if not paginated:
+            return json_stream_response(batches, limit=limit)
+        return json_stream_response(batches, key='users', limit=limit,
+                                    next_cursor=lambda last_user: encode_cursor(last_user['username']))
+    except psycopg2.Error as e:
+        logger.exception("Error in api_get_all_users: %s", e)
         return jsonify({"error": "Failed to fetch users"}), 500
 
 # --- User Search Endpoint ---
@@ -455,7 +584,7 @@ def api_search_users():
     # --- End Get User ID ---
 
     search_query = request.args.get('query')
-    print(f"--- api_search_users: Received search_query = '{search_query}' ---") # Added logging
+    logger.debug("api_search_users: Received search_query = '%s'", search_query) # Added logging
     if not search_query:
         return jsonify({"error": "Missing 'query' parameter"}), 400
 
@@ -467,22 +596,28 @@ def api_search_users():
         except ValueError:
             return jsonify({"error": "Invalid exclude_user_id query parameter"}), 400
 
+    try:
+        limit = parse_limit(request.args.get('limit'), USER_SEARCH_DEFAULT_LIMIT, USER_SEARCH_MAX_LIMIT)
+    except ValueError:
+        return jsonify({"error": "Invalid limit query parameter"}), 400
+
     # If no exclude_user_id is provided in query params, but user is authenticated,
     # exclude the current user by default.
     if exclude_user_id is None and requesting_user_id is not None:
         exclude_user_id = requesting_user_id
 
 
-    print(f"--- Attempting to search users for query: '{search_query}' (exclude_user_id: {exclude_user_id}) ---")
+    logger.debug("Attempting to search users for query: '%s' (exclude_user_id: %s)", search_query, exclude_user_id)
     try:
-        # Use the actual search_users function from db_utils, passing the correct keyword argument
-        users = search_users(search_query, current_user_id=exclude_user_id)
-        print(f"--- Successfully found {len(users)} users for query '{search_query}' ---")
+        # Bellekteki indeks açıksa ve yüklendiyse ondan cevaplanır; aksi halde SQL araması
+        users = user_index.search(search_query, current_user_id=exclude_user_id, limit=limit)
+        if users is None:
+            # Use the actual search_users function from db_utils, passing the correct keyword argument
+            users = search_users(search_query, current_user_id=exclude_user_id, limit=limit)
+        logger.debug("Successfully found %s users for query '%s'", len(users), search_query)
         return jsonify(users), 200
     except Exception as e:
-        print(f"!!! Error searching users: {e}")
-        import traceback
-        print(traceback.format_exc())
+        logger.exception("Error searching users: %s", e)
         return jsonify({"error": "Failed to search users"}), 500
 
 # --- User Endpoints (By ID) ---
@@ -536,6 +671,60 @@ def api_get_post(post_id):
     else:
         return jsonify({"error": "Post not found"}), 404 # Not Found
 
+# --- Batch Endpoints ---
+
+def _parse_batch_ids(data):
+    """Reads {"ids": [...]} from a batch request body: distinct integer ids in request order. Raises ValueError."""
+    ids = data.get('ids') if isinstance(data, dict) else None
+    if not isinstance(ids, list) or not ids:
+        raise ValueError("'ids' must be a non-empty list of integers")
+    if any(isinstance(i, bool) or not isinstance(i, int) for i in ids):
+        raise ValueError("'ids' must be a non-empty list of integers")
+    ids = list(dict.fromkeys(ids))
+    if len(ids) > BATCH_MAX_IDS:
+        raise ValueError(f"At most {BATCH_MAX_IDS} ids can be requested at once")
+    return ids
+
+def _batch_response(key, ids, found):
+    """{key: {"<id>": item or null}}; datetimes are encoded as ISO 8601 like the single-item endpoints."""
+    body = dumps({key: {str(i): found.get(i) for i in ids}})
+    return Response(body, status=200, mimetype='application/json')
+
+@app.route('/api/batch/users', methods=['POST'])
+@jwt_required()
+def api_batch_users():
+    """Resolves up to BATCH_MAX_IDS users in one query, with the same privacy rules as get_user_by_id."""
+    requesting_user_id = int(get_jwt_identity())
+    try:
+        user_ids = _parse_batch_ids(request.get_json(silent=True))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    try:
+        users = get_users_by_ids(user_ids, requesting_user_id)
+    except psycopg2.Error:
+        return jsonify({"error": "Failed to fetch users"}), 500
+    for user in users.values():
+        user.pop('password_hash', None) # Tam profil satırı u.* içerir; parola özeti istemciye gönderilmez
+    return _batch_response('users', user_ids, users)
+
+@app.route('/api/batch/posts', methods=['POST'])
+@jwt_required()
+def api_batch_posts():
+    """
+    Resolves up to BATCH_MAX_IDS posts (with counts and like/save status) in one query.
+    Posts of private accounts the caller neither owns nor follows come back as null, like missing ids.
+    """
+    current_user_id = int(get_jwt_identity())
+    try:
+        post_ids = _parse_batch_ids(request.get_json(silent=True))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    try:
+        posts = get_posts_by_ids(post_ids, current_user_id)
+    except psycopg2.Error:
+        return jsonify({"error": "Failed to fetch posts"}), 500
+    return _batch_response('posts', post_ids, posts)
+
 @app.route('/api/users/<int:user_id>/posts', methods=['GET'])
 def api_get_user_posts(user_id):
     # This endpoint gets posts specifically for a user's profile
@@ -574,9 +763,7 @@ def api_like_post(post_id):
             # Could be duplicate like (UniqueViolation) or other error
             return jsonify({'success': False, 'message': 'Failed to like post (maybe already liked?)'}), 409 # Conflict or 500
     except Exception as e:
-        print(f"!!! Unexpected error in api_like_post: {e}")
-        import traceback
-        print(traceback.format_exc())
+        logger.exception("Unexpected error in api_like_post: %s", e)
         return jsonify({'success': False, 'message': 'An internal error occurred'}), 500
 
 
@@ -608,9 +795,7 @@ def api_unlike_post(post_id):
         else:
             return jsonify({'success': False, 'message': 'Failed to unlike post (like not found?)'}), 404 # Not Found or 500
     except Exception as e:
-        print(f"!!! Unexpected error in api_unlike_post: {e}")
-        import traceback
-        print(traceback.format_exc())
+        logger.exception("Unexpected error in api_unlike_post: %s", e)
         return jsonify({'success': False, 'message': 'An internal error occurred'}), 500
 
 
@@ -630,8 +815,11 @@ def api_get_post_comments(post_id):
     current_user_id = int(jwt_current_user_id_str) # Convert to int
     # --- End Get User ID ---
 
-    comments = get_comments_for_post(post_id, current_user_id) # Pass current_user_id
-    return jsonify(comments), 200
+    try:
+        return json_stream_response(iter_comments_for_post(post_id, current_user_id)) # Pass current_user_id
+    except psycopg2.Error as e:
+        logger.exception("Error fetching comments for post %s: %s", post_id, e)
+        return jsonify({"error": "Failed to fetch comments"}), 500
 
 @app.route('/api/comments', methods=['POST'])
 @jwt_required()
@@ -694,9 +882,7 @@ def api_comment_likes(comment_id): # Renamed function for clarity
                 # Could be duplicate like (UniqueViolation) or other error
                 return jsonify({'success': False, 'message': 'Failed to like comment (maybe already liked?)'}), 409 # Conflict or 500
         except Exception as e:
-            print(f"!!! Unexpected error in api_comment_likes (POST): {e}")
-            import traceback
-            print(traceback.format_exc())
+            logger.exception("Unexpected error in api_comment_likes (POST): %s", e)
             return jsonify({'success': False, 'message': 'An internal error occurred'}), 500
 
     elif request.method == 'DELETE':
@@ -711,9 +897,7 @@ def api_comment_likes(comment_id): # Renamed function for clarity
                 # Could be like not found or other deletion error
                 return jsonify({'success': False, 'message': 'Failed to unlike comment (like not found?)'}), 404 # Not Found or 500
         except Exception as e:
-            print(f"!!! Unexpected error in api_comment_likes (DELETE): {e}")
-            import traceback
-            print(traceback.format_exc())
+            logger.exception("Unexpected error in api_comment_likes (DELETE): %s", e)
             return jsonify({'success': False, 'message': 'An internal error occurred'}), 500
 
     # Should not reach here if methods are only POST and DELETE
@@ -770,9 +954,7 @@ def api_create_follow():
         # Catch UniqueViolation specifically for duplicate follow attempts or pending requests
         return jsonify({'success': False, 'message': 'Follow relationship or request already exists'}), 409 # Conflict
     except Exception as e:
-        print(f"!!! Error in api_create_follow: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("Error in api_create_follow: %s", e)
         return jsonify({'success': False, 'message': 'An internal error occurred while processing follow request'}), 500
 
 
@@ -835,9 +1017,7 @@ def api_get_my_follow_requests():
                 req['created_at'] = req['created_at'].isoformat()
         return jsonify(requests), 200
     except Exception as e:
-        print(f"!!! Error in api_get_my_follow_requests: {e}")
-        import traceback
-        print(traceback.format_exc())
+        logger.exception("Error in api_get_my_follow_requests: %s", e)
         return jsonify({"error": "Failed to fetch follow requests"}), 500
 
 @app.route('/api/follow_requests/<int:request_id>/accept', methods=['PUT'])
@@ -859,9 +1039,7 @@ def api_accept_follow_request(request_id):
         else:
             return jsonify({'success': False, 'message': 'Failed to accept follow request (not found or already accepted)'}), 400 # Or 404
     except Exception as e:
-        print(f"!!! Error in api_accept_follow_request: {e}")
-        import traceback
-        print(traceback.format_exc())
+        logger.exception("Error in api_accept_follow_request: %s", e)
         return jsonify({'success': False, 'message': 'An internal error occurred'}), 500
 
 @app.route('/api/follow_requests/<int:request_id>/reject', methods=['PUT'])
@@ -882,9 +1060,7 @@ def api_reject_follow_request(request_id):
         else:
             return jsonify({'success': False, 'message': 'Failed to reject follow request (not found or already rejected)'}), 400 # Or 404
     except Exception as e:
-        print(f"!!! Error in api_reject_follow_request: {e}")
-        import traceback
-        print(traceback.format_exc())
+        logger.exception("Error in api_reject_follow_request: %s", e)
         return jsonify({'success': False, 'message': 'An internal error occurred'}), 500
 
 
@@ -898,15 +1074,11 @@ def api_get_suggested_users():
     # --- End Get User ID ---
 
     # Explicitly import here for debugging NameError
-    from db_utils import get_suggested_users, is_following_user
+    from db_utils import get_suggested_users
 
+    # Önerilen kullanıcılar zaten takip edilmeyenlerdir; is_following satırlarda FALSE olarak gelir
     suggested_users = get_suggested_users(current_user_id) # current_user_id is int
 
-    # Check follow status for each suggested user
-    for user in suggested_users: # user['user_id'] is int from DB
-        user['is_following'] = is_following_user(current_user_id, user['user_id']) # Both are int
-        print(f"--- Suggested user: {user.get('username')}, Profile Picture URL: {user.get('profile_picture_url')} ---") # Added logging
-
     return jsonify(suggested_users), 200
 
 
@@ -938,9 +1110,7 @@ def api_save_post(post_id):
         else:
             return jsonify({'success': False, 'message': 'Failed to save post (maybe already saved?)'}), 409 # Conflict or 500
     except Exception as e:
-        print(f"!!! Unexpected error in api_save_post: {e}")
-        import traceback
-        print(traceback.format_exc())
+        logger.exception("Unexpected error in api_save_post: %s", e)
         return jsonify({'success': False, 'message': 'An internal error occurred'}), 500
 
 
@@ -970,9 +1140,7 @@ def api_unsave_post(post_id):
         else:
             return jsonify({'success': False, 'message': 'Failed to unsave post (save record not found?)'}), 404 # Not Found or 500
     except Exception as e:
-        print(f"!!! Unexpected error in api_unsave_post: {e}")
-        import traceback
-        print(traceback.format_exc())
+        logger.exception("Unexpected error in api_unsave_post: %s", e)
         return jsonify({'success': False, 'message': 'An internal error occurred'}), 500
 
 
@@ -991,12 +1159,9 @@ def api_get_saved_posts(user_id): # Changed user_id_from_url back to user_id
         # Pass both the user whose saved posts are being fetched (user_id from URL)
         # and the user making the request (requesting_user_id from JWT) for like/save status context.
         # In this specific route, they are the same due to the auth check above.
-        saved_posts = get_saved_posts_for_user(user_id_of_saver=user_id, requesting_user_id=requesting_user_id)
-        return jsonify(saved_posts), 200
+        return json_stream_response(iter_saved_posts_for_user(user_id_of_saver=user_id, requesting_user_id=requesting_user_id))
     except Exception as e:
-        print(f"!!! Error in api_get_saved_posts for user {user_id}: {e}")
-        import traceback
-        print(traceback.format_exc())
+        logger.exception("Error in api_get_saved_posts for user %s: %s", user_id, e)
         return jsonify({"error": "Failed to fetch saved posts due to an internal server error"}), 500
 
 # --- Message Endpoints ---
@@ -1058,8 +1223,28 @@ def api_get_messages(user1_id, user2_id):
         return jsonify({"error": "Unauthorized to view these messages"}), 403
     # --- End Auth Check ---
 
-    messages = get_messages_between_users(user1_id, user2_id) # Both are int
-    return jsonify(messages), 200
+    # Cursor pagination: ?limit=N&before_id=<next_before_id from the previous page>
+    # Without either parameter the legacy (full history) list response is kept for older clients.
+    limit_param = request.args.get('limit')
+    before_id_param = request.args.get('before_id')
+    if limit_param is None and before_id_param is None:
+        messages = get_messages_between_users(user1_id, user2_id) # Both are int
+        return jsonify(messages), 200
+
+    try:
+        limit = parse_limit(limit_param, MESSAGES_PAGE_DEFAULT_LIMIT, MESSAGES_PAGE_MAX_LIMIT)
+        before_id = int(before_id_param) if before_id_param else None
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    # Fetch one extra (older) message to know whether another page exists; the page is oldest-first
+    messages = get_messages_between_users(user1_id, user2_id, limit=limit + 1, before_id=before_id)
+    next_before_id = None
+    if len(messages) > limit:
+        messages = messages[1:]
+        next_before_id = messages[0]['message_id']
+
+    return jsonify({'messages': messages, 'next_before_id': next_before_id}), 200
 
 @app.route('/api/users/<int:user_id>/chats', methods=['GET'])
 @jwt_required()
@@ -1086,6 +1271,16 @@ def api_get_my_chats():
     chat_summaries = get_chat_summaries_for_user(user_id) # user_id is int
     return jsonify(chat_summaries), 200
 
+@app.route('/api/messages/<int:partner_user_id>/read', methods=['POST'])
+@jwt_required()
+def api_mark_conversation_as_read(partner_user_id):
+    # Marks every message the current user received from partner_user_id as read and resets the chat's unread count
+    user_id = int(get_jwt_identity())
+    rows_updated = mark_conversation_as_read(user_id, partner_user_id)
+    if rows_updated is None:
+        return jsonify({'success': False, 'message': 'Failed to mark conversation as read'}), 500
+    return jsonify({'success': True, 'marked_read': rows_updated}), 200
+
 # --- Notification Endpoints ---
 
 @app.route('/api/users/<int:user_id>/notifications', methods=['GET'])
@@ -1098,19 +1293,70 @@ def api_get_user_notifications(user_id): # Changed argument name to match route
         return jsonify({"error": "Unauthorized to view notifications for this user"}), 403
     # --- End Auth Check ---
 
-    notifications = get_notifications_for_user(user_id) # user_id is int
+    # Keyset pagination: ?limit=N&cursor=<next_cursor from the previous page>
+    # Without either parameter the legacy (unpaginated) list response is kept for older clients.
+    limit_param = request.args.get('limit')
+    cursor_param = request.args.get('cursor')
+    paginated = limit_param is not None or cursor_param is not None
+    limit = before = None
+    if paginated:
+        try:
+            limit = parse_limit(limit_param, NOTIFICATIONS_PAGE_DEFAULT_LIMIT, NOTIFICATIONS_PAGE_MAX_LIMIT)
+            before = decode_cursor(cursor_param, 2, (datetime, int)) if cursor_param else None
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
 
-    # Format created_at timestamps to ISO 8601 strings for the mobile app
-    for notification in notifications:
-        if 'created_at' in notification and isinstance(notification['created_at'], datetime):
-            notification['created_at'] = notification['created_at'].isoformat()
+    # Fetch one extra row to know whether another page exists.
+    # created_at is encoded as an ISO 8601 string for the mobile app (see serialization.py)
+    try:
+        batches = iter_notifications_for_user(user_id, limit=limit + 1 if paginated else None, before=before) # user_id is int
+        if not paginated:
+            return json_stream_response(batches)
+        return json_stream_response(
+            batches, key='notifications', limit=limit,
+            next_cursor=lambda last: encode_cursor(last['created_at'].isoformat(), last['notification_id'])
+        )
+    except psycopg2.Error as e:
+        logger.exception("Error fetching notifications for user %s: %s", user_id, e)
+        return jsonify({"error": "Failed to fetch notifications"}), 500
+
+@app.route('/api/events/stream', methods=['GET'])
+@jwt_required(locations=["headers", "cookies"]) # EventSource başlık gönderemez; web istemcisi çerezle doğrulanır
+def api_event_stream():
+    """
+    Server-Sent Events stream of new messages ('message') and notifications ('notification')
+    for the current user. Reconnecting clients send Last-Event-ID to receive what they missed.
+    """
+    if not REALTIME_ENABLED:
+        return jsonify({"error": "Real-time events are disabled"}), 404
+    user_id = int(get_jwt_identity())
+    last_event_id = request.headers.get('Last-Event-ID') or request.args.get('last_event_id')
+    cursor = None
+    if last_event_id is not None:
+        try:
+            cursor = realtime.EventCursor.parse(last_event_id)
+        except ValueError:
+            return jsonify({"error": "Invalid Last-Event-ID"}), 400
+
+    response = Response(stream_with_context(realtime.sse_stream(user_id, cursor)), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no' # nginx arkasında yanıtı tamponlama
+    return response
 
-    return jsonify(notifications), 200
+@app.route('/api/notifications/unread_count', methods=['GET'])
+@jwt_required()
+def api_get_unread_notification_count():
+    # Rozet (badge) için: listeyi çekmeden okunmamış bildirim sayısını döndürür
+    requesting_user_id = int(get_jwt_identity())
+    unread_count = get_unread_notification_count(requesting_user_id)
+    if unread_count is None:
+        return jsonify({"error": "Failed to fetch unread notification count"}), 500
+    return jsonify({'unread_count': unread_count}), 200
 
 @app.route('/api/notifications/<int:notification_id>', methods=['DELETE'])
 @jwt_required()
 def api_delete_notification(notification_id):
-    print(f"--- api_delete_notification called for notification_id: {notification_id} ---") # Added logging
+    logger.debug("api_delete_notification called for notification_id: %s", notification_id) # Added logging
     # --- Auth Check (Important: ensure user owns the notification) ---
     jwt_requesting_user_id_str = get_jwt_identity()
     requesting_user_id = int(jwt_requesting_user_id_str) # Convert to int
@@ -1125,18 +1371,16 @@ def api_delete_notification(notification_id):
 
     try:
         from db_utils import mark_notification_as_deleted # Import the function
-        print(f"--- api_delete_notification: Calling mark_notification_as_deleted with notification_id: {notification_id} ---") # Added logging
+        logger.debug("api_delete_notification: Calling mark_notification_as_deleted with notification_id: %s", notification_id) # Added logging
         success = mark_notification_as_deleted(notification_id) # notification_id is int
-        print(f"--- api_delete_notification: mark_notification_as_deleted returned: {success} ---") # Added logging
+        logger.debug("api_delete_notification: mark_notification_as_deleted returned: %s", success) # Added logging
         if success:
             return jsonify({'success': True, 'message': 'Bildirim başarıyla silindi olarak işaretlendi.'}), 200
         else:
-            print(f"--- api_delete_notification: mark_notification_as_deleted failed for notification_id: {notification_id} ---") # Added logging
+            logger.debug("api_delete_notification: mark_notification_as_deleted failed for notification_id: %s", notification_id) # Added logging
             return jsonify({'success': False, 'message': 'Bildirim bulunamadı veya silinirken bir hata oluştu.'}), 404 # Not Found
     except Exception as e:
-        print(f"!!! Error in api_delete_notification: {e}")
-        import traceback
-        print(traceback.format_exc())
+        logger.exception("Error in api_delete_notification: %s", e)
         return jsonify({'success': False, 'message': f'Dahili bir hata oluştu: {e}'}), 500
 
 
@@ -1223,23 +1467,22 @@ def api_get_user_by_username(username):
         jwt_identity = get_jwt_identity()
         if jwt_identity:
             requesting_user_id = int(jwt_identity) # Convert back to int for comparisons
-            print(f"--- api_get_user_by_username: Requesting user ID from JWT: {requesting_user_id} ---")
+            logger.debug("api_get_user_by_username: Requesting user ID from JWT: %s", requesting_user_id)
         else:
-             print(f"--- api_get_user_by_username: No valid JWT found. Requesting user ID is None. ---")
+             logger.debug("api_get_user_by_username: No valid JWT found. Requesting user ID is None.")
     except Exception as e:
         # Log any unexpected errors during identity retrieval
-        print(f"!!! Error getting JWT identity in api_get_user_by_username: {e} ---")
-        print(traceback.format_exc())
+        logger.exception("Error getting JWT identity in api_get_user_by_username: %s", e)
         # Continue with requesting_user_id = None
 
     # First, get the target user's ID by username or email
     target_user_basic = get_user_by_username_or_email(username)
     if not target_user_basic:
-        print(f"--- api_get_user_by_username: Target user '{username}' not found. ---")
+        logger.debug("api_get_user_by_username: Target user '%s' not found.", username)
         return jsonify({"error": "User not found"}), 404
 
     target_user_id = target_user_basic['user_id']
-    print(f"--- api_get_user_by_username: Target user ID found: {target_user_id} ---")
+    logger.debug("api_get_user_by_username: Target user ID found: %s", target_user_id)
 
     # Use the modified get_user_by_id function which handles privacy and follow status
     # Pass both the target user ID and the requesting user ID
@@ -1252,12 +1495,12 @@ def api_get_user_by_username(username):
         if 'updated_at' in user_data and isinstance(user_data['updated_at'], datetime):
             user_data['updated_at'] = user_data['updated_at'].isoformat()
 
-        print(f"--- api_get_user_by_username: Successfully fetched user data for '{username}'. ---")
+        logger.debug("api_get_user_by_username: Successfully fetched user data for '%s'.", username)
         return jsonify(user_data), 200
     else:
         # This case should ideally not be reached if target_user_basic was found,
         # unless get_user_by_id failed internally after finding the user.
-        print(f"--- api_get_user_by_username: Failed to fetch user data for '{username}' via get_user_by_id. ---")
+        logger.debug("api_get_user_by_username: Failed to fetch user data for '%s' via get_user_by_id.", username)
         return jsonify({"error": "Failed to retrieve user data"}), 500 # Or 404 if get_user_by_id returns None for privacy reasons (though get_user_by_id should return limited data instead of None)
 
 # --- User Privacy Settings Endpoint ---
@@ -1291,9 +1534,7 @@ def api_update_my_privacy_status():
         else:
             return jsonify({'success': False, 'message': 'Failed to update privacy status'}), 500
     except Exception as e:
-        print(f"!!! Error in api_update_my_privacy_status: {e}")
-        import traceback
-        print(traceback.format_exc())
+        logger.exception("Error in api_update_my_privacy_status: %s", e)
         return jsonify({'success': False, 'message': 'An internal error occurred during privacy update'}), 500
 
 
@@ -1349,16 +1590,12 @@ def upload_image():
                 image_url = f"/uploads/{filename}" # Adjust based on your static route
                 return jsonify({'success': True, 'message': 'Image uploaded successfully', 'imageUrl': image_url}), 201
             except Exception as e:
-                 print(f"Error saving uploaded file: {e}")
-                 import traceback
-                 traceback.print_exc() # Print the full traceback
+                 logger.exception("Error saving uploaded file: %s", e)
                  return jsonify({'success': False, 'message': 'Failed to save image'}), 500
         else:
             return jsonify({'success': False, 'message': 'File type not allowed'}), 400
     except Exception as e:
-        print(f"!!! Unexpected error in upload_image: {e}")
-        import traceback
-        print(traceback.format_exc())
+        logger.exception("Unexpected error in upload_image: %s", e)
         return jsonify({'success': False, 'message': 'An internal error occurred during upload'}), 500
 
 
@@ -1410,9 +1647,7 @@ def api_update_user_profile_details(user_id_from_path):
             # This could be due to various reasons, e.g., username taken (if db_utils handles this)
             return jsonify({'success': False, 'message': 'Failed to update profile (e.g., username might be taken or no changes made)'}), 400 # Or 409 if username conflict
     except Exception as e:
-        print(f"!!! Error in api_update_user_profile_details: {e}")
-        import traceback
-        print(traceback.format_exc())
+        logger.exception("Error in api_update_user_profile_details: %s", e)
         return jsonify({'success': False, 'message': 'An internal error occurred during profile update'}), 500
 
 
@@ -1438,9 +1673,7 @@ def update_account():
             profile_picture_file.save(filepath)
             profile_picture_url = f"/uploads/{filename}" # Adjust based on your static route
         except Exception as e:
-            print(f"Error saving profile picture: {e}")
-            import traceback
-            traceback.print_exc()
+            logger.exception("Error saving profile picture: %s", e)
             return jsonify({'success': False, 'message': 'Failed to save profile picture'}), 500
     elif profile_picture_file:
          return jsonify({'success': False, 'message': 'Profile picture file type not allowed'}), 400
@@ -1468,9 +1701,7 @@ def update_account():
             # This might happen if the username is already taken
             return jsonify({'success': False, 'message': 'Failed to update account (username might be taken)'}), 409 # Conflict or 500
     except Exception as e:
-        print(f"!!! Unexpected error in update_account: {e}")
-        import traceback
-        print(traceback.format_exc())
+        logger.exception("Unexpected error in update_account: %s", e)
         return jsonify({'success': False, 'message': 'An internal error occurred during account update'}), 500
 
 
@@ -0,0 +1,10 @@
+# --- bench ---
+# Performans ölçüm araçları. Backend dizininden modül olarak çalıştırılır:
+#
+#     python -m bench.generate --users 10000      # Yerel Postgres'e sentetik veri yükler
+#     python -m bench.micro --out micro.json      # db_utils okuma fonksiyonlarının mikro ölçümleri
+#     python -m bench.load --base-url http://localhost:5000 --out load.json
+#     python -m bench.report old.json new.json    # İki ölçüm dosyasını karşılaştırır
+#
+# generate.py ürettiği kimlikleri dataset.json'a yazar; micro.py ve load.py örnek
+# kullanıcı/gönderi/konuşma kimliklerini buradan okur.
@@ -0,0 +1,246 @@
+# --- bench/generate.py ---
+# Yerel bir Postgres veritabanına sentetik sosyal ağ verisi yükler.
+# Şema gerçek create_tables (migrations) ile kurulur; veriler toplu INSERT ile yazılır,
+# böylece post_stats/user_stats tetikleyicileri de gerçek yük altında çalışır.
+#
+# Takip grafiği kuvvet yasasına (power-law) uyar: her kullanıcının bir popülerlik
+# ağırlığı vardır (Pareto dağılımı) ve takip edilecek hesaplar bu ağırlıklarla seçilir.
+# Böylece az sayıda çok takipçili hesap ve uzun bir kuyruk oluşur.
+#
+# Kullanım: python -m bench.generate --users 10000 --follows 50 --posts 20 [--reset]
+import argparse
+import itertools
+import json
+import os
+import random
+import time
+from datetime import datetime, timedelta, timezone
+
+import bcrypt
+import psycopg2.extras
+
+import db_utils
+import suggestions
+from db_pool import get_pool
+from db_config import NOTIFICATION_COALESCE_WINDOW, NOTIFICATION_COALESCE_LATEST_ACTORS, SUGGESTIONS_BATCH_SIZE
+
+USERNAME_PREFIX = 'bench_user_'
+USERNAME_LIKE = USERNAME_PREFIX.replace('_', r'\_') + '%' # LIKE deseni ('_' kaçışlı)
+BENCH_PASSWORD = 'bench-password' # Yük testi bu parola ile giriş yapar
+DEFAULT_DATASET_PATH = os.path.join(os.path.dirname(__file__), 'dataset.json')
+PAGE_SIZE = 1000 # execute_values sayfa boyutu
+SAMPLE_SIZE = 5000 # dataset.json'a yazılacak en fazla gönderi/konuşma örneği
+
+
+def _weights(count, alpha, rng):
+    """Pareto-distributed weights, returned as cumulative weights for random.choices."""
+    return list(itertools.accumulate(rng.paretovariate(alpha) for _ in range(count)))
+
+
+def _random_times(count, days, rng):
+    now = datetime.now(timezone.utc)
+    return [now - timedelta(seconds=rng.uniform(0, days * 86400)) for _ in range(count)]
+
+
+def reset(conn):
+    """Deletes every benchmark user; ON DELETE CASCADE removes their posts, follows, likes etc."""
+    bench_filter = (USERNAME_LIKE,)
+    with conn.cursor() as cursor:
+        # messages.sender/receiver NOT NULL + ON DELETE SET NULL olduğundan mesajlar önce silinmeli
+        cursor.execute(
+            """
+            DELETE FROM messages m USING users u
+            WHERE u.username LIKE %s AND u.user_id IN (m.sender_user_id, m.receiver_user_id);
+            """, bench_filter)
+        cursor.execute("DELETE FROM users WHERE username LIKE %s;", bench_filter)
+        deleted = cursor.rowcount
+    conn.commit()
+    print(f"Deleted {deleted} benchmark users.")
+
+
+def generate(conn, users=1000, follows=50, posts=20, likes=30, comments=5, conversations=2,
+             messages=20, days=90, alpha=1.2, private_ratio=0.1, seed=42):
+    """Generates the dataset and returns the id sample written to dataset.json."""
+    rng = random.Random(seed)
+    password_hash = bcrypt.hashpw(BENCH_PASSWORD.encode('utf-8'), bcrypt.gensalt(rounds=4)).decode('utf-8')
+    timings = {}
+
+    with conn.cursor() as cursor:
+        started = time.perf_counter()
+        cursor.execute("SELECT COALESCE(MAX(user_id), 0) FROM users;")
+        offset = cursor.fetchone()[0]
+        rows = [
+            (f"{USERNAME_PREFIX}{offset + i}", f"{USERNAME_PREFIX}{offset + i}@bench.local", password_hash,
+             f"Bench User {offset + i}", rng.random() < private_ratio)
+            for i in range(users)
+        ]
+        user_ids = [r[0] for r in psycopg2.extras.execute_values(
+            cursor,
+            "INSERT INTO users (username, email, password_hash, full_name, is_private) VALUES %s RETURNING user_id;",
+            rows, page_size=PAGE_SIZE, fetch=True)]
+        conn.commit()
+        timings['users'] = time.perf_counter() - started
+
+        # Takip grafiği: popülerlik ağırlıklarına göre takip edilen seçimi
+        started = time.perf_counter()
+        popularity = _weights(users, alpha, rng)
+        follow_rows = set()
+        for follower_index, follower in enumerate(user_ids):
+            degree = min(users - 1, max(1, int(rng.expovariate(1.0 / follows))))
+            for followed_index in rng.choices(range(users), cum_weights=popularity, k=degree):
+                if followed_index != follower_index:
+                    follow_rows.add((follower, user_ids[followed_index]))
+        follow_rows = sorted(follow_rows)
+        follow_times = _random_times(len(follow_rows), days, rng)
+        psycopg2.extras.execute_values(
+            cursor,
+            "INSERT INTO follows (follower_user_id, followed_user_id, created_at) VALUES %s ON CONFLICT DO NOTHING;",
+            [(a, b, t) for (a, b), t in zip(follow_rows, follow_times)], page_size=PAGE_SIZE)
+        conn.commit()
+        timings['follows'] = time.perf_counter() - started
+
+        # Gönderiler: yazar etkinliği de kuvvet yasasına uyar
+        started = time.perf_counter()
+        activity = _weights(users, alpha, rng)
+        authors = rng.choices(user_ids, cum_weights=activity, k=users * posts)
+        post_times = _random_times(len(authors), days, rng)
+        post_rows = [(author, f"Bench post {i}", t) for i, (author, t) in enumerate(zip(authors, post_times))]
+        post_ids = [r[0] for r in psycopg2.extras.execute_values(
+            cursor,
+            "INSERT INTO posts (user_id, content_text, created_at) VALUES %s RETURNING post_id;",
+            post_rows, page_size=PAGE_SIZE, fetch=True)]
+        conn.commit()
+        timings['posts'] = time.perf_counter() - started
+
+        # Beğeniler ve yorumlar: popüler yazarların gönderileri daha çok etkileşim alır
+        started = time.perf_counter()
+        author_weight = dict(zip(user_ids, (b - a for a, b in zip([0.0] + popularity[:-1], popularity))))
+        post_cum_weights = list(itertools.accumulate(author_weight[a] for a in authors))
+        like_rows = set()
+        for post_id in rng.choices(post_ids, cum_weights=post_cum_weights, k=len(post_ids) * likes // max(posts, 1)):
+            like_rows.add((rng.choice(user_ids), post_id))
+        psycopg2.extras.execute_values(
+            cursor,
+            "INSERT INTO likes (user_id, post_id) VALUES %s ON CONFLICT DO NOTHING;",
+            sorted(like_rows), page_size=PAGE_SIZE)
+        comment_targets = rng.choices(post_ids, cum_weights=post_cum_weights, k=len(post_ids) * comments // max(posts, 1))
+        comment_times = _random_times(len(comment_targets), days, rng)
+        comment_ids = [r[0] for r in psycopg2.extras.execute_values(
+            cursor,
+            "INSERT INTO comments (user_id, post_id, comment_text, created_at) VALUES %s RETURNING comment_id;",
+            [(rng.choice(user_ids), post_id, f"Bench comment {i}", t)
+             for i, (post_id, t) in enumerate(zip(comment_targets, comment_times))],
+            page_size=PAGE_SIZE, fetch=True)]
+        conn.commit()
+        timings['likes_comments'] = time.perf_counter() - started
+
+        # Mesajlar: takip ilişkisi olan çiftler arasında konuşmalar
+        started = time.perf_counter()
+        pairs = rng.sample(follow_rows, min(len(follow_rows), users * conversations))
+        message_rows = []
+        for a, b in pairs:
+            for t in sorted(_random_times(max(1, int(rng.expovariate(1.0 / messages))), days, rng)):
+                sender, receiver = (a, b) if rng.random() < 0.5 else (b, a)
+                message_rows.append((sender, receiver, "Bench message", t))
+        psycopg2.extras.execute_values(
+            cursor,
+            "INSERT INTO messages (sender_user_id, receiver_user_id, message_text, created_at) VALUES %s;",
+            message_rows, page_size=PAGE_SIZE)
+        conn.commit()
+        timings['messages'] = time.perf_counter() - started
+
+        # Bildirimler: uygulamanın yazdığı türleri küme tabanlı SQL ile üret
+        started = time.perf_counter()
+        bench_filter = (USERNAME_LIKE,)
+        if NOTIFICATION_COALESCE_WINDOW <= 0:
+            cursor.execute(
+                """
+                INSERT INTO notifications (recipient_user_id, actor_user_id, type, post_id, created_at)
+                SELECT p.user_id, l.user_id, 'like', l.post_id, l.created_at
+                FROM likes l JOIN posts p ON p.post_id = l.post_id JOIN users u ON u.user_id = p.user_id
+                WHERE l.user_id <> p.user_id AND u.username LIKE %s;
+                """, bench_filter)
+        else:
+            # Beğeniler dağıtım işçisi gibi pencere başına tek satırda birleştirilir
+            cursor.execute(
+                """
+                INSERT INTO notifications (recipient_user_id, actor_user_id, type, post_id, created_at,
+                                           actor_count, latest_actor_ids, coalesce_bucket)
+                SELECT p.user_id, (array_agg(l.user_id ORDER BY l.created_at DESC))[1], 'like', l.post_id, MAX(l.created_at),
+                       COUNT(*), (array_agg(l.user_id ORDER BY l.created_at DESC))[1:%(latest)s],
+                       FLOOR(EXTRACT(EPOCH FROM l.created_at) / %(window)s)::BIGINT AS bucket
+                FROM likes l JOIN posts p ON p.post_id = l.post_id JOIN users u ON u.user_id = p.user_id
+                WHERE l.user_id <> p.user_id AND u.username LIKE %(like)s
+                GROUP BY p.user_id, l.post_id, bucket;
+                """, {'like': USERNAME_LIKE, 'window': NOTIFICATION_COALESCE_WINDOW, 'latest': NOTIFICATION_COALESCE_LATEST_ACTORS})
+        cursor.execute(
+            """
+            INSERT INTO notifications (recipient_user_id, actor_user_id, type, post_id, comment_id, created_at)
+            SELECT p.user_id, c.user_id, 'comment', c.post_id, c.comment_id, c.created_at
+            FROM comments c JOIN posts p ON p.post_id = c.post_id JOIN users u ON u.user_id = p.user_id
+            WHERE c.user_id <> p.user_id AND u.username LIKE %s;
+            """, bench_filter)
+        cursor.execute(
+            """
+            INSERT INTO notifications (recipient_user_id, actor_user_id, type, created_at)
+            SELECT f.followed_user_id, f.follower_user_id, 'follow', f.created_at
+            FROM follows f JOIN users u ON u.user_id = f.followed_user_id
+            WHERE u.username LIKE %s;
+            """, bench_filter)
+        conn.commit()
+        timings['notifications'] = time.perf_counter() - started
+
+        # Öneri listeleri: periyodik toplu işin yapacağını burada bir kez yap
+        started = time.perf_counter()
+        for i in range(0, len(user_ids), SUGGESTIONS_BATCH_SIZE):
+            suggestions.compute_for_users(conn, user_ids[i:i + SUGGESTIONS_BATCH_SIZE])
+        cursor.execute("DELETE FROM suggestion_refresh_queue WHERE user_id = ANY(%s);", (user_ids,))
+        conn.commit()
+        timings['suggestions'] = time.perf_counter() - started
+
+        cursor.execute("ANALYZE;")
+        conn.commit()
+
+    print(f"Generated {len(user_ids)} users, {len(follow_rows)} follows, {len(post_ids)} posts, "
+          f"{len(like_rows)} likes, {len(comment_targets)} comments, {len(message_rows)} messages.")
+    for step, seconds in timings.items():
+        print(f"  {step:<16} {seconds:8.2f}s")
+    return {
+        'username_prefix': USERNAME_PREFIX,
+        'username_offset': offset, # users[i] kullanıcısının adı: username_prefix + (username_offset + i)
+        'password': BENCH_PASSWORD,
+        'users': user_ids,
+        'posts': rng.sample(post_ids, min(len(post_ids), SAMPLE_SIZE)),
+        'comments': rng.sample(comment_ids, min(len(comment_ids), SAMPLE_SIZE)),
+        'conversations': [list(pair) for pair in pairs[:SAMPLE_SIZE]],
+        'seed': seed,
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Seed a local database with a synthetic social graph.")
+    parser.add_argument('--users', type=int, default=1000)
+    parser.add_argument('--follows', type=int, default=50, help="mean follows per user")
+    parser.add_argument('--posts', type=int, default=20, help="mean posts per user")
+    parser.add_argument('--likes', type=int, default=30, help="mean likes given per user")
+    parser.add_argument('--comments', type=int, default=5, help="mean comments written per user")
+    parser.add_argument('--conversations', type=int, default=2, help="conversations per user")
+    parser.add_argument('--messages', type=int, default=20, help="mean messages per conversation")
+    parser.add_argument('--days', type=int, default=90, help="spread timestamps over this many days")
+    parser.add_argument('--alpha', type=float, default=1.2, help="Pareto shape of popularity (lower = more skewed)")
+    parser.add_argument('--private-ratio', type=float, default=0.1)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--reset', action='store_true', help="delete existing benchmark users first")
+    parser.add_argument('--dataset', default=DEFAULT_DATASET_PATH)
+    args = parser.parse_args()
+
+    db_utils.create_tables()
+    with get_pool().connection() as conn:
+        if args.reset:
+            reset(conn)
+        dataset = generate(conn, users=args.users, follows=args.follows, posts=args.posts, likes=args.likes,
+                           comments=args.comments, conversations=args.conversations, messages=args.messages,
+                           days=args.days, alpha=args.alpha, private_ratio=args.private_ratio, seed=args.seed)
+    with open(args.dataset, 'w') as f:
+        json.dump(dataset, f)
+    print(f"Dataset ids written to {args.dataset}")
@@ -0,0 +1,162 @@
+# --- bench/load.py ---
+# Ana /api/* uç noktaları için HTTP yük sürücüsü. Çalışan bir sunucuya (app.py veya
+# gunicorn) karşı, dataset.json'daki kullanıcılarla giriş yapıp ağırlıklı bir istek
+# karışımı gönderir; uç nokta başına p50/p95/p99 ve toplam verim (throughput) raporlar.
+#
+# Kullanım: python -m bench.load --base-url http://localhost:5000 --concurrency 16 --duration 60 --out load.json
+import argparse
+import http.client
+import json
+import random
+import threading
+import time
+from datetime import datetime, timezone
+from urllib.parse import urlsplit
+
+from bench.generate import DEFAULT_DATASET_PATH
+from bench.report import summarize, write_report
+
+# ad -> (ağırlık, yol üreticisi). Yol üreticisi (dataset, rng, oturum_kullanıcısı) alır.
+ROUTES = {
+    'GET /api/posts (feed page)': (30, lambda ds, rng, me: "/api/posts?limit=20"),
+    'GET /api/users/<id>': (15, lambda ds, rng, me: f"/api/users/{rng.choice(ds['users'])}"),
+    'GET /api/users/<id>/posts': (10, lambda ds, rng, me: f"/api/users/{rng.choice(ds['users'])}/posts"),
+    'GET /api/posts/<id>': (5, lambda ds, rng, me: f"/api/posts/{rng.choice(ds['posts'])}"),
+    'GET /api/posts/<id>/comments': (10, lambda ds, rng, me: f"/api/posts/{rng.choice(ds['posts'])}/comments"),
+    'GET /api/users/<id>/notifications (page)': (10, lambda ds, rng, me: f"/api/users/{me}/notifications?limit=30"),
+    'GET /api/notifications/unread_count': (10, lambda ds, rng, me: "/api/notifications/unread_count"),
+    'GET /api/messages/<a>/<b> (page)': (5, lambda ds, rng, me: "/api/messages/{}/{}?limit=50".format(*rng.choice(ds['conversations']))),
+    'GET /api/users/me/chats': (5, lambda ds, rng, me: "/api/users/me/chats"),
+    'GET /api/users/<id>/followers': (3, lambda ds, rng, me: f"/api/users/{rng.choice(ds['users'])}/followers"),
+    'GET /api/suggested_users': (3, lambda ds, rng, me: "/api/suggested_users"),
+    'GET /api/users (page)': (2, lambda ds, rng, me: "/api/users?limit=50"),
+    'GET /api/users/search': (4, lambda ds, rng, me: f"/api/users/search?query={ds['username_prefix']}{rng.randrange(100)}&limit=20"),
+}
+
+
+class Client:
+    """Keep-alive HTTP client for one worker thread."""
+
+    def __init__(self, base_url, timeout):
+        parts = urlsplit(base_url)
+        self.host = parts.hostname
+        self.port = parts.port
+        self.https = parts.scheme == 'https'
+        self.timeout = timeout
+        self.conn = None
+
+    def request(self, method, path, token=None, body=None):
+        headers = {'Accept': 'application/json'}
+        if token:
+            headers['Authorization'] = f"Bearer {token}"
+        if body is not None:
+            body = json.dumps(body)
+            headers['Content-Type'] = 'application/json'
+        for attempt in (1, 2):
+            if self.conn is None:
+                conn_class = http.client.HTTPSConnection if self.https else http.client.HTTPConnection
+                self.conn = conn_class(self.host, self.port, timeout=self.timeout)
+            try:
+                self.conn.request(method, path, body=body, headers=headers)
+                response = self.conn.getresponse()
+                data = response.read()
+                return response.status, data
+            except (http.client.HTTPException, OSError):
+                self.conn.close()
+                self.conn = None
+                if attempt == 2:
+                    raise
+
+
+def login(client, username, password):
+    while True:
+        status, data = client.request('POST', '/api/login', body={'username_or_email': username, 'password': password})
+        if status != 429:
+            break
+        # Giriş IP başına hız sınırlıdır (ratelimit.py); hızlı kurulum için sunucuda RATE_LIMIT_ENABLED = False
+        time.sleep(5)
+    if status != 200:
+        raise RuntimeError(f"login failed for {username}: HTTP {status}")
+    payload = json.loads(data)
+    return payload['token'], payload['user']['user_id']
+
+
+def run(dataset, base_url, concurrency, duration, sessions, seed, timeout):
+    names = list(ROUTES)
+    weights = [ROUTES[name][0] for name in names]
+    latencies = {name: [] for name in names}
+    errors = {name: 0 for name in names}
+    lock = threading.Lock()
+
+    # Oturumlar: veri kümesinden rastgele kullanıcılarla giriş yap
+    setup_rng = random.Random(seed)
+    setup_client = Client(base_url, timeout)
+    accounts = setup_rng.sample(range(len(dataset['users'])), min(sessions, len(dataset['users'])))
+    tokens = [login(setup_client, f"{dataset['username_prefix']}{dataset['username_offset'] + i}", dataset['password'])
+              for i in accounts]
+
+    deadline = time.perf_counter() + duration
+
+    def worker(worker_index):
+        rng = random.Random(seed + worker_index)
+        client = Client(base_url, timeout)
+        local_latencies = {name: [] for name in names}
+        local_errors = {name: 0 for name in names}
+        while time.perf_counter() < deadline:
+            name = rng.choices(names, weights=weights)[0]
+            token, user_id = rng.choice(tokens)
+            path = ROUTES[name][1](dataset, rng, user_id)
+            started = time.perf_counter()
+            try:
+                status, _ = client.request('GET', path, token=token)
+                ok = status < 500
+            except (http.client.HTTPException, OSError):
+                ok = False
+            local_latencies[name].append(time.perf_counter() - started)
+            if not ok:
+                local_errors[name] += 1
+        with lock:
+            for name in names:
+                latencies[name].extend(local_latencies[name])
+                errors[name] += local_errors[name]
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=worker, args=(i,), daemon=True) for i in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall = time.perf_counter() - started
+
+    results = {name: summarize(latencies[name], errors[name], wall) for name in names if latencies[name]}
+    results['total'] = summarize([v for values in latencies.values() for v in values], sum(errors.values()), wall)
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="HTTP load driver for the main /api routes.")
+    parser.add_argument('--base-url', default='http://localhost:5000')
+    parser.add_argument('--dataset', default=DEFAULT_DATASET_PATH)
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--duration', type=float, default=30.0, help="seconds")
+    parser.add_argument('--sessions', type=int, default=50, help="distinct logged-in users")
+    parser.add_argument('--timeout', type=float, default=30.0)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--out', help="write the JSON report here instead of stdout")
+    args = parser.parse_args()
+
+    with open(args.dataset) as f:
+        dataset = json.load(f)
+    results = run(dataset, args.base_url, args.concurrency, args.duration, args.sessions, args.seed, args.timeout)
+    for name, summary in results.items():
+        print(f"{name:<36} n={summary['count']:>7} err={summary['errors']:>5} p50={summary['p50_ms']:>9.3f}ms "
+              f"p95={summary['p95_ms']:>9.3f}ms p99={summary['p99_ms']:>9.3f}ms rps={summary['throughput_rps']:>8.1f}")
+    write_report({
+        'kind': 'load',
+        'created_at': datetime.now(timezone.utc).isoformat(),
+        'base_url': args.base_url,
+        'concurrency': args.concurrency,
+        'duration_seconds': args.duration,
+        'dataset_users': len(dataset['users']),
+        'results': results,
+    }, args.out)
@@ -0,0 +1,125 @@
+# --- bench/micro.py ---
+# db_utils okuma fonksiyonlarının mikro ölçümleri. Her fonksiyon, dataset.json'dan
+# seçilen rastgele kimliklerle --iterations kez çağrılır ve gecikme dağılımı raporlanır.
+#
+# Kullanım: python -m bench.micro [--iterations 200] [--only get_home_feed_posts,...] [--out micro.json]
+import argparse
+import json
+import platform
+import random
+import time
+from datetime import datetime, timezone
+
+import db_utils
+from bench.generate import DEFAULT_DATASET_PATH
+from bench.report import summarize, write_report
+
+
+def _user(ds, rng):
+    return rng.choice(ds['users'])
+
+
+def _post(ds, rng):
+    return rng.choice(ds['posts'])
+
+
+def _consume(iter_func):
+    """Wraps a db_utils.iter_* generator function so a call reads every batch (as the streaming routes do)."""
+    def consume(*args):
+        return sum(len(batch) for batch in iter_func(*args))
+    consume.__name__ = iter_func.__name__
+    return consume
+
+
+# ad -> (db_utils fonksiyonu, argüman üreticisi); iter_* girdileri route'ların sunduğu akış sürümlerini ölçer
+BENCHMARKS = {
+    'get_user_by_id': (db_utils.get_user_by_id, lambda ds, rng: (_user(ds, rng), _user(ds, rng))),
+    'get_user_by_id (self)': (db_utils.get_user_by_id, lambda ds, rng: (lambda u: (u, u))(_user(ds, rng))),
+    'get_users_by_ids (20)': (db_utils.get_users_by_ids, lambda ds, rng: (rng.sample(ds['users'], 20), _user(ds, rng))),
+    'get_user_stats': (db_utils.get_user_stats, lambda ds, rng: (_user(ds, rng),)),
+    'get_user_by_username_or_email': (
+        db_utils.get_user_by_username_or_email,
+        lambda ds, rng: (f"{ds['username_prefix']}{ds['username_offset'] + rng.randrange(len(ds['users']))}",)),
+    'get_all_users': (db_utils.get_all_users, lambda ds, rng: (_user(ds, rng),)),
+    'iter_users': (_consume(db_utils.iter_users), lambda ds, rng: (_user(ds, rng),)),
+    'search_users': (db_utils.search_users, lambda ds, rng: (f"{ds['username_prefix']}{rng.randrange(100)}", _user(ds, rng))),
+    'search_users_for_message': (db_utils.search_users_for_message, lambda ds, rng: (_user(ds, rng), str(rng.randrange(100)))),
+    'get_all_posts': (db_utils.get_all_posts, lambda ds, rng: ()),
+    'get_home_feed_posts': (db_utils.get_home_feed_posts, lambda ds, rng: (_user(ds, rng),)),
+    'get_home_feed_posts (page)': (db_utils.get_home_feed_posts, lambda ds, rng: (_user(ds, rng), 20)),
+    'iter_home_feed_posts': (_consume(db_utils.iter_home_feed_posts), lambda ds, rng: (_user(ds, rng),)),
+    'iter_home_feed_posts (page)': (_consume(db_utils.iter_home_feed_posts), lambda ds, rng: (_user(ds, rng), 20)),
+    'get_posts_by_user_id': (db_utils.get_posts_by_user_id, lambda ds, rng: (_user(ds, rng), _user(ds, rng))),
+    'get_post_by_id': (db_utils.get_post_by_id, lambda ds, rng: (_post(ds, rng), _user(ds, rng))),
+    'get_posts_by_ids (20)': (db_utils.get_posts_by_ids, lambda ds, rng: (rng.sample(ds['posts'], 20), _user(ds, rng))),
+    'get_likes_for_post': (db_utils.get_likes_for_post, lambda ds, rng: (_post(ds, rng),)),
+    'get_post_like_count': (db_utils.get_post_like_count, lambda ds, rng: (_post(ds, rng),)),
+    'get_comment_like_count': (db_utils.get_comment_like_count, lambda ds, rng: (rng.choice(ds['comments']),)),
+    'get_comments_for_post': (db_utils.get_comments_for_post, lambda ds, rng: (_post(ds, rng), _user(ds, rng))),
+    'iter_comments_for_post': (_consume(db_utils.iter_comments_for_post), lambda ds, rng: (_post(ds, rng), _user(ds, rng))),
+    'get_messages_between_users': (db_utils.get_messages_between_users, lambda ds, rng: tuple(rng.choice(ds['conversations']))),
+    'get_messages_between_users (page)': (db_utils.get_messages_between_users, lambda ds, rng: (*rng.choice(ds['conversations']), 50)),
+    'get_saved_posts_for_user': (db_utils.get_saved_posts_for_user, lambda ds, rng: (lambda u: (u, u))(_user(ds, rng))),
+    'iter_saved_posts_for_user': (_consume(db_utils.iter_saved_posts_for_user), lambda ds, rng: (lambda u: (u, u))(_user(ds, rng))),
+    'get_followers_for_user': (db_utils.get_followers_for_user, lambda ds, rng: (_user(ds, rng),)),
+    'get_following_for_user': (db_utils.get_following_for_user, lambda ds, rng: (_user(ds, rng),)),
+    'is_following_user': (db_utils.is_following_user, lambda ds, rng: (_user(ds, rng), _user(ds, rng))),
+    'is_follow_request_pending': (db_utils.is_follow_request_pending, lambda ds, rng: (_user(ds, rng), _user(ds, rng))),
+    'get_suggested_users': (db_utils.get_suggested_users, lambda ds, rng: (_user(ds, rng),)),
+    'get_user_settings': (db_utils.get_user_settings, lambda ds, rng: (_user(ds, rng),)),
+    'get_chat_summaries_for_user': (db_utils.get_chat_summaries_for_user, lambda ds, rng: (_user(ds, rng),)),
+    'get_notifications_for_user': (db_utils.get_notifications_for_user, lambda ds, rng: (_user(ds, rng),)),
+    'get_notifications_for_user (page)': (db_utils.get_notifications_for_user, lambda ds, rng: (_user(ds, rng), 30)),
+    'iter_notifications_for_user': (_consume(db_utils.iter_notifications_for_user), lambda ds, rng: (_user(ds, rng),)),
+    'iter_notifications_for_user (page)': (
+        _consume(db_utils.iter_notifications_for_user), lambda ds, rng: (_user(ds, rng), 30)),
+    'get_unread_notification_count': (db_utils.get_unread_notification_count, lambda ds, rng: (_user(ds, rng),)),
+    'get_follow_requests_for_user': (db_utils.get_follow_requests_for_user, lambda ds, rng: (_user(ds, rng),)),
+}
+
+
+def run(dataset, names, iterations, warmup, seed):
+    rng = random.Random(seed)
+    results = {}
+    for name in names:
+        func, make_args = BENCHMARKS[name]
+        for _ in range(warmup):
+            func(*make_args(dataset, rng))
+        latencies = []
+        started = time.perf_counter()
+        for _ in range(iterations):
+            args = make_args(dataset, rng)
+            call_started = time.perf_counter()
+            func(*args)
+            latencies.append(time.perf_counter() - call_started)
+        results[name] = summarize(latencies, wall_seconds=time.perf_counter() - started)
+        print(f"{name:<36} p50={results[name]['p50_ms']:>9.3f}ms p95={results[name]['p95_ms']:>9.3f}ms "
+              f"p99={results[name]['p99_ms']:>9.3f}ms")
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Micro-benchmarks for db_utils read functions.")
+    parser.add_argument('--dataset', default=DEFAULT_DATASET_PATH)
+    parser.add_argument('--iterations', type=int, default=200)
+    parser.add_argument('--warmup', type=int, default=10)
+    parser.add_argument('--only', help="comma-separated benchmark names")
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--out', help="write the JSON report here instead of stdout")
+    args = parser.parse_args()
+
+    with open(args.dataset) as f:
+        dataset = json.load(f)
+    names = args.only.split(',') if args.only else list(BENCHMARKS)
+    unknown = [name for name in names if name not in BENCHMARKS]
+    if unknown:
+        parser.error(f"unknown benchmarks: {', '.join(unknown)}")
+    results = run(dataset, names, args.iterations, args.warmup, args.seed)
+    write_report({
+        'kind': 'micro',
+        'created_at': datetime.now(timezone.utc).isoformat(),
+        'python': platform.python_version(),
+        'iterations': args.iterations,
+        'dataset_users': len(dataset['users']),
+        'results': results,
+    }, args.out)
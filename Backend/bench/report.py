@@ -0,0 +1,67 @@
+# --- bench/report.py ---
+# Ölçüm sonuçlarının özetlenmesi ve iki JSON taban çizgisinin (baseline) karşılaştırılması.
+import json
+import math
+import sys
+
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return None
+    rank = max(1, math.ceil(pct / 100.0 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+def summarize(latencies_seconds, errors=0, wall_seconds=None):
+    """Summarizes one operation's latencies (in seconds) into a JSON-friendly dict in milliseconds."""
+    values = sorted(latencies_seconds)
+    count = len(values)
+    summary = {
+        'count': count,
+        'errors': errors,
+        'mean_ms': round(sum(values) / count * 1000, 3) if count else None,
+        'p50_ms': round(percentile(values, 50) * 1000, 3) if count else None,
+        'p95_ms': round(percentile(values, 95) * 1000, 3) if count else None,
+        'p99_ms': round(percentile(values, 99) * 1000, 3) if count else None,
+        'max_ms': round(values[-1] * 1000, 3) if count else None,
+    }
+    if wall_seconds:
+        summary['throughput_rps'] = round(count / wall_seconds, 2)
+    return summary
+
+
+def write_report(report, path=None):
+    text = json.dumps(report, indent=2, sort_keys=True)
+    if path:
+        with open(path, 'w') as f:
+            f.write(text + '\n')
+    else:
+        print(text)
+
+
+def compare(old, new, metric='p95_ms'):
+    """Yields (name, old_value, new_value, change_pct) for operations present in both reports."""
+    old_results = old.get('results', {})
+    new_results = new.get('results', {})
+    for name in sorted(set(old_results) & set(new_results)):
+        old_value = old_results[name].get(metric)
+        new_value = new_results[name].get(metric)
+        if old_value is None or new_value is None:
+            continue
+        change = (new_value - old_value) / old_value * 100 if old_value else 0.0
+        yield name, old_value, new_value, change
+
+
+if __name__ == '__main__':
+    if len(sys.argv) < 3:
+        print("Usage: python -m bench.report OLD.json NEW.json [metric]")
+        sys.exit(2)
+    with open(sys.argv[1]) as f:
+        old_report = json.load(f)
+    with open(sys.argv[2]) as f:
+        new_report = json.load(f)
+    metric = sys.argv[3] if len(sys.argv) > 3 else 'p95_ms'
+    print(f"{'operation':<40} {'old':>10} {'new':>10} {'change':>9}  ({metric})")
+    for name, old_value, new_value, change in compare(old_report, new_report, metric):
+        print(f"{name:<40} {old_value:>10.3f} {new_value:>10.3f} {change:>+8.1f}%")
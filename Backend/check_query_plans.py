@@ -0,0 +1,242 @@
+# --- check_query_plans.py ---
+# db_utils içindeki sıcak sorguların indeks kullandığını EXPLAIN ile doğrular.
+# Küçük (geliştirme) veritabanlarında planlayıcı zaten sıralı taramayı seçer;
+# bu yüzden kontrol enable_seqscan = off ile yapılır ve "indeks kullanılabiliyor mu"
+# sorusunu yanıtlar. Beklenen indeks planda yoksa betik 1 ile çıkar.
+#
+# UNBOUNDED_SORT_QUERIES ayrıca bir tablonun satırlarını LIMIT'siz okuyan bir Sort düğümü
+# olmadığını doğrular (ör. ana sayfa akışında takip edilenlerin tüm gönderilerini sıralamak).
+#
+# Kullanım: python check_query_plans.py
+import sys
+import traceback
+
+import psycopg2
+
+INDEX_SCAN_NODES = ('Index Scan', 'Index Only Scan', 'Bitmap Index Scan')
+
+HOME_FEED_PAGE_SQL = """
+        SELECT p.post_id FROM follows f
+        CROSS JOIN LATERAL (
+            SELECT fp.post_id, fp.created_at FROM posts fp
+            WHERE fp.user_id = f.followed_user_id
+              AND (fp.created_at, fp.post_id) < (%(before_created_at)s::timestamptz, %(before_post_id)s)
+            ORDER BY fp.created_at DESC, fp.post_id DESC
+            LIMIT %(limit)s
+        ) p
+        WHERE f.follower_user_id = %(user_id)s
+        ORDER BY p.created_at DESC, p.post_id DESC
+        LIMIT %(limit)s;
+        """
+
+# (açıklama, beklenen indeks, SQL, parametreler) — SQL db_utils'teki sorguların WHERE/ORDER BY kısmını izler
+HOT_QUERIES = [
+    (
+        'get_posts_by_user_id',
+        'idx_posts_user_created',
+        """
+        SELECT p.post_id FROM posts p
+        WHERE p.user_id = %(user_id)s
+        ORDER BY p.created_at DESC, p.post_id DESC;
+        """,
+        {'user_id': 1},
+    ),
+    (
+        'get_home_feed_posts (page)',
+        'idx_posts_user_created',
+        HOME_FEED_PAGE_SQL,
+        {'user_id': 1, 'limit': 20, 'before_created_at': '2100-01-01', 'before_post_id': 0},
+    ),
+    (
+        'get_comments_for_post',
+        'idx_comments_post_created',
+        """
+        SELECT c.comment_id FROM comments c
+        WHERE c.post_id = %(post_id)s
+        ORDER BY c.created_at ASC;
+        """,
+        {'post_id': 1},
+    ),
+    (
+        'get_notifications_for_user',
+        'idx_notifications_recipient_created',
+        """
+        SELECT n.notification_id FROM notifications n
+        WHERE n.recipient_user_id = %(user_id)s AND n.is_deleted = FALSE
+        ORDER BY n.created_at DESC, n.notification_id DESC
+        LIMIT 30;
+        """,
+        {'user_id': 1},
+    ),
+    (
+        'get_messages_between_users (page)',
+        'idx_messages_conversation_pair',
+        """
+        SELECT message_id FROM messages
+        WHERE LEAST(sender_user_id, receiver_user_id) = LEAST(%(user1_id)s, %(user2_id)s)
+          AND GREATEST(sender_user_id, receiver_user_id) = GREATEST(%(user1_id)s, %(user2_id)s)
+        ORDER BY message_id DESC
+        LIMIT 50;
+        """,
+        {'user1_id': 1, 'user2_id': 2},
+    ),
+    (
+        'get_chat_summaries_for_user',
+        'idx_conversation_summaries_user_last',
+        """
+        SELECT cs.partner_user_id FROM conversation_summaries cs
+        WHERE cs.user_id = %(user_id)s
+        ORDER BY cs.last_message_at DESC;
+        """,
+        {'user_id': 1},
+    ),
+    (
+        'search_users (prefix)',
+        'idx_users_username_lower_prefix',
+        """
+        SELECT u.user_id FROM users u
+        WHERE lower(u.username) LIKE %(prefix)s
+        ORDER BY lower(u.username)
+        LIMIT 200;
+        """,
+        {'prefix': 'user1%'},
+    ),
+    (
+        'search_users_for_message (contains)',
+        'idx_users_username_trgm',
+        """
+        SELECT u.user_id FROM users u
+        WHERE lower(u.username) LIKE %(contains)s
+        LIMIT 200;
+        """,
+        {'contains': '%ser12%'},
+    ),
+    (
+        'get_suggested_users',
+        'idx_user_suggestions_user_score',
+        """
+        SELECT s.suggested_user_id FROM user_suggestions s
+        WHERE s.user_id = %(user_id)s
+        ORDER BY s.score DESC, s.suggested_user_id
+        LIMIT 10;
+        """,
+        {'user_id': 1},
+    ),
+    (
+        'iter_users (page)',
+        'users_username_key',
+        """
+        SELECT u.user_id FROM users u
+        WHERE u.username > %(after_username)s
+        ORDER BY u.username
+        LIMIT 51;
+        """,
+        {'after_username': 'user5'},
+    ),
+    (
+        'get_followers_for_user',
+        'idx_follows_followed',
+        """
+        SELECT f.follow_id FROM follows f
+        WHERE f.followed_user_id = %(user_id)s;
+        """,
+        {'user_id': 1},
+    ),
+    (
+        'get_likes_for_post',
+        'idx_likes_post',
+        """
+        SELECT l.like_id FROM likes l
+        WHERE l.post_id = %(post_id)s;
+        """,
+        {'post_id': 1},
+    ),
+    (
+        'get_comments_for_post (like_count)',
+        'idx_comment_likes_comment',
+        """
+        SELECT COUNT(*) FROM comment_likes cl
+        WHERE cl.comment_id = %(comment_id)s;
+        """,
+        {'comment_id': 1},
+    ),
+]
+
+# (açıklama, Sort altında LIMIT'siz okunmaması gereken tablo, SQL, parametreler)
+UNBOUNDED_SORT_QUERIES = [
+    (
+        'get_home_feed_posts (page)',
+        'posts',
+        HOME_FEED_PAGE_SQL,
+        {'user_id': 1, 'limit': 20, 'before_created_at': '2100-01-01', 'before_post_id': 0},
+    ),
+]
+
+
+def _index_names(plan):
+    """Yields (node type, index name) for every index scan node in an EXPLAIN (FORMAT JSON) plan tree."""
+    if plan.get('Node Type') in INDEX_SCAN_NODES:
+        yield plan['Node Type'], plan.get('Index Name')
+    for child in plan.get('Plans', []):
+        yield from _index_names(child)
+
+
+def _unbounded_scans(plan, relation):
+    """True if `plan` reads `relation` somewhere without a Limit node in between."""
+    if plan.get('Node Type') == 'Limit':
+        return False
+    if plan.get('Relation Name') == relation:
+        return True
+    return any(_unbounded_scans(child, relation) for child in plan.get('Plans', []))
+
+
+def _unbounded_sorts(plan, relation):
+    """Yields the sort keys of every Sort node whose input reads `relation` without a Limit."""
+    if plan.get('Node Type') in ('Sort', 'Incremental Sort') \
+            and any(_unbounded_scans(child, relation) for child in plan.get('Plans', [])):
+        yield plan.get('Sort Key')
+    for child in plan.get('Plans', []):
+        yield from _unbounded_sorts(child, relation)
+
+
+def check_query_plans(conn, queries=HOT_QUERIES, sort_queries=UNBOUNDED_SORT_QUERIES):
+    """Runs EXPLAIN for each hot query and returns the list of (name, expected_index, found) failures."""
+    failures = []
+    with conn.cursor() as cursor:
+        cursor.execute("SET LOCAL enable_seqscan = off;")
+        for name, expected_index, sql, params in queries:
+            cursor.execute("EXPLAIN (FORMAT JSON) " + sql, params)
+            plan = cursor.fetchone()[0][0]['Plan']
+            found = list(_index_names(plan))
+            if any(index_name == expected_index for _, index_name in found):
+                print(f"--- OK   {name}: uses {expected_index} ---")
+            else:
+                print(f"!!! FAIL {name}: expected {expected_index}, plan used {found or 'no index'}")
+                failures.append((name, expected_index, found))
+        for name, relation, sql, params in sort_queries:
+            cursor.execute("EXPLAIN (FORMAT JSON) " + sql, params)
+            plan = cursor.fetchone()[0][0]['Plan']
+            sorts = list(_unbounded_sorts(plan, relation))
+            if sorts:
+                print(f"!!! FAIL {name}: sorts every {relation} row it reads (Sort Key {sorts[0]})")
+                failures.append((name, f"no unbounded sort over {relation}", sorts))
+            else:
+                print(f"--- OK   {name}: no unbounded sort over {relation} ---")
+    conn.rollback() # SET LOCAL'ı geri al
+    return failures
+
+
+if __name__ == '__main__':
+    from db_pool import get_pool
+
+    with get_pool().connection() as conn:
+        try:
+            failures = check_query_plans(conn)
+        except psycopg2.Error as e:
+            print(f"!!! Query plan check failed: {e}")
+            print(traceback.format_exc())
+            sys.exit(1)
+    if failures:
+        print(f"!!! {len(failures)} of {len(HOT_QUERIES) + len(UNBOUNDED_SORT_QUERIES)} plan checks failed. Run: python migrations.py migrate")
+        sys.exit(1)
+    print(f"--- All {len(HOT_QUERIES)} hot queries use their indexes. ---")
@@ -0,0 +1,180 @@
+# --- counters.py ---
+# Denormalize sayaç tablolarının bakımı.
+# post_stats, user_stats ve conversation_summaries tabloları migrations.py ile kurulan tetikleyicilerle güncel
+# tutulur; bu modüldeki işler olası sapmaları (elle yapılan silmeler,
+# tetikleyiciler kurulmadan önce yazılan veriler vb.) onarır.
+#
+# Kullanım: python counters.py reconcile-posts|reconcile-users|reconcile-conversations [batch_size]
+import psycopg2
+
+from log_utils import get_logger
+
+logger = get_logger(__name__)
+
+RECONCILE_BATCH_SIZE = 10000 # Tek işlemde kontrol edilecek post_id aralığı
+
+
+def reconcile_post_stats(conn, batch_size=RECONCILE_BATCH_SIZE):
+    """
+    Recomputes likes/comments counts from the source tables in post_id ranges and
+    repairs any post_stats row that drifted (or is missing). Commits after each
+    batch so long runs do not hold locks. Returns the number of repaired rows.
+    """
+    repaired = 0
+    with conn.cursor() as cursor:
+        cursor.execute("SELECT COALESCE(MIN(post_id), 0), COALESCE(MAX(post_id), 0) FROM posts;")
+        min_post_id, max_post_id = cursor.fetchone()
+        start = min_post_id
+        while start <= max_post_id:
+            end = start + batch_size
+            cursor.execute(
+                """
+                INSERT INTO post_stats (post_id, likes_count, comments_count)
+                SELECT p.post_id, COALESCE(l.cnt, 0), COALESCE(c.cnt, 0)
+                FROM posts p
+                LEFT JOIN (
+                    SELECT post_id, COUNT(*) AS cnt FROM likes
+                    WHERE post_id >= %(start)s AND post_id < %(end)s GROUP BY post_id
+                ) l ON l.post_id = p.post_id
+                LEFT JOIN (
+                    SELECT post_id, COUNT(*) AS cnt FROM comments
+                    WHERE post_id >= %(start)s AND post_id < %(end)s GROUP BY post_id
+                ) c ON c.post_id = p.post_id
+                WHERE p.post_id >= %(start)s AND p.post_id < %(end)s
+                ON CONFLICT (post_id) DO UPDATE
+                    SET likes_count = EXCLUDED.likes_count,
+                        comments_count = EXCLUDED.comments_count
+                    WHERE post_stats.likes_count <> EXCLUDED.likes_count
+                       OR post_stats.comments_count <> EXCLUDED.comments_count;
+                """,
+                {'start': start, 'end': end}
+            )
+            # Sadece eklenen veya gerçekten değişen satırlar sayılır
+            repaired += cursor.rowcount
+            conn.commit()
+            start = end
+    logger.info("reconcile_post_stats: %s post_stats rows repaired.", repaired)
+    return repaired
+
+def reconcile_user_stats(conn, batch_size=RECONCILE_BATCH_SIZE):
+    """
+    Recomputes followers/following/post/unread-notification counts in user_id ranges and repairs any
+    user_stats row that drifted (or is missing). Commits after each batch and
+    returns the number of repaired rows.
+    """
+    repaired = 0
+    with conn.cursor() as cursor:
+        cursor.execute("SELECT COALESCE(MIN(user_id), 0), COALESCE(MAX(user_id), 0) FROM users;")
+        min_user_id, max_user_id = cursor.fetchone()
+        start = min_user_id
+        while start <= max_user_id:
+            end = start + batch_size
+            cursor.execute(
+                """
+                INSERT INTO user_stats (user_id, followers_count, following_count, post_count, unread_notifications_count)
+                SELECT u.user_id, COALESCE(fr.cnt, 0), COALESCE(fg.cnt, 0), COALESCE(p.cnt, 0), COALESCE(n.cnt, 0)
+                FROM users u
+                LEFT JOIN (
+                    SELECT followed_user_id AS user_id, COUNT(*) AS cnt FROM follows
+                    WHERE followed_user_id >= %(start)s AND followed_user_id < %(end)s GROUP BY followed_user_id
+                ) fr ON fr.user_id = u.user_id
+                LEFT JOIN (
+                    SELECT follower_user_id AS user_id, COUNT(*) AS cnt FROM follows
+                    WHERE follower_user_id >= %(start)s AND follower_user_id < %(end)s GROUP BY follower_user_id
+                ) fg ON fg.user_id = u.user_id
+                LEFT JOIN (
+                    SELECT user_id, COUNT(*) AS cnt FROM posts
+                    WHERE user_id >= %(start)s AND user_id < %(end)s GROUP BY user_id
+                ) p ON p.user_id = u.user_id
+                LEFT JOIN (
+                    SELECT recipient_user_id AS user_id, COUNT(*) AS cnt FROM notifications
+                    WHERE recipient_user_id >= %(start)s AND recipient_user_id < %(end)s
+                      AND is_read = FALSE AND is_deleted = FALSE
+                    GROUP BY recipient_user_id
+                ) n ON n.user_id = u.user_id
+                WHERE u.user_id >= %(start)s AND u.user_id < %(end)s
+                ON CONFLICT (user_id) DO UPDATE
+                    SET followers_count = EXCLUDED.followers_count,
+                        following_count = EXCLUDED.following_count,
+                        post_count = EXCLUDED.post_count,
+                        unread_notifications_count = EXCLUDED.unread_notifications_count
+                    WHERE user_stats.followers_count <> EXCLUDED.followers_count
+                       OR user_stats.following_count <> EXCLUDED.following_count
+                       OR user_stats.post_count <> EXCLUDED.post_count
+                       OR user_stats.unread_notifications_count <> EXCLUDED.unread_notifications_count;
+                """,
+                {'start': start, 'end': end}
+            )
+            repaired += cursor.rowcount
+            conn.commit()
+            start = end
+    logger.info("reconcile_user_stats: %s user_stats rows repaired.", repaired)
+    return repaired
+
+def reconcile_conversation_summaries(conn, batch_size=RECONCILE_BATCH_SIZE):
+    """
+    Recomputes last message and unread count per (user, partner) from messages and
+    repairs drifted or missing conversation_summaries rows. Batches walk ranges of the
+    conversation key's low user id, so each batch is one range scan of
+    idx_messages_conversation_pair and yields both users' rows for its conversations.
+    Commits after each batch and returns the number of repaired rows.
+    """
+    repaired = 0
+    with conn.cursor() as cursor:
+        cursor.execute("SELECT COALESCE(MIN(user_id), 0), COALESCE(MAX(user_id), 0) FROM users;")
+        min_user_id, max_user_id = cursor.fetchone()
+        start = min_user_id
+        while start <= max_user_id:
+            end = start + batch_size
+            cursor.execute(
+                """
+                INSERT INTO conversation_summaries (user_id, partner_user_id, last_message_id, last_message_at, unread_count)
+                SELECT p.user_id, p.partner_user_id, MAX(m.message_id),
+                       (ARRAY_AGG(COALESCE(m.created_at, NOW()) ORDER BY m.message_id DESC))[1],
+                       COUNT(*) FILTER (WHERE m.receiver_user_id = p.user_id AND m.is_read = FALSE)
+                FROM messages m
+                CROSS JOIN LATERAL (VALUES
+                    (1, m.sender_user_id, m.receiver_user_id),
+                    (2, m.receiver_user_id, m.sender_user_id)
+                ) AS p(n, user_id, partner_user_id)
+                WHERE LEAST(m.sender_user_id, m.receiver_user_id) >= %(start)s
+                  AND LEAST(m.sender_user_id, m.receiver_user_id) < %(end)s
+                  AND (p.n = 1 OR m.sender_user_id <> m.receiver_user_id)
+                GROUP BY p.user_id, p.partner_user_id
+                ON CONFLICT (user_id, partner_user_id) DO UPDATE
+                    SET last_message_id = EXCLUDED.last_message_id,
+                        last_message_at = EXCLUDED.last_message_at,
+                        unread_count = EXCLUDED.unread_count
+                    WHERE conversation_summaries.last_message_id <> EXCLUDED.last_message_id
+                       OR conversation_summaries.unread_count <> EXCLUDED.unread_count;
+                """,
+                {'start': start, 'end': end}
+            )
+            repaired += cursor.rowcount
+            conn.commit()
+            start = end
+    logger.info("reconcile_conversation_summaries: %s conversation_summaries rows repaired.", repaired)
+    return repaired
+
+
+if __name__ == '__main__':
+    import sys
+    from db_pool import get_pool
+
+    command = sys.argv[1] if len(sys.argv) > 1 else None
+    commands = {
+        'reconcile-posts': reconcile_post_stats,
+        'reconcile-users': reconcile_user_stats,
+        'reconcile-conversations': reconcile_conversation_summaries,
+    }
+    if command not in commands:
+        print(f"Usage: python counters.py [{'|'.join(commands)}] [batch_size]")
+        sys.exit(2)
+    batch_size = int(sys.argv[2]) if len(sys.argv) > 2 else RECONCILE_BATCH_SIZE
+    with get_pool().connection() as conn:
+        try:
+            commands[command](conn, batch_size)
+        except psycopg2.Error as e:
+            logger.exception("%s failed: %s", command, e)
+            conn.rollback()
+            sys.exit(1)
@@ -5,3 +5,93 @@ DB_HOST = "localhost"
 DB_NAME = "solara_db"
 DB_USER = "snr"
 DB_PASSWORD = "1179"
+
+# Connection pool settings (see db_pool.py)
+DB_POOL_MIN_SIZE = 1 # Havuzda her zaman açık tutulacak bağlantı sayısı
+DB_POOL_MAX_SIZE = 20 # Aynı anda açık olabilecek en fazla bağlantı sayısı
+DB_POOL_CHECKOUT_TIMEOUT = 10 # Boş bağlantı için en fazla kaç saniye beklenecek
+DB_POOL_IDLE_TIMEOUT = 300 # min_size üzerindeki boşta bağlantılar bu kadar saniye sonra kapatılır
+DB_POOL_HEALTH_CHECK_INTERVAL = 30 # Bu kadar saniyeden uzun boşta kalan bağlantı verilmeden önce SELECT 1 ile denenir
+
+# Home feed timeline settings (see timelines.py)
+TIMELINE_FANOUT_ENABLED = False # True: akış, gönderi oluşturulurken takipçilerin zaman çizelgelerine yazılır
+TIMELINE_FANOUT_MAX_FOLLOWERS = 10000 # Bundan fazla takipçisi olan yazarların gönderileri okuma anında birleştirilir
+TIMELINE_BACKFILL_POSTS = 50 # Yeni takipte takip edilenin en son kaç gönderisi zaman çizelgesine eklenir
+TIMELINE_MAX_ENTRIES = 1000 # Budama (trim) sırasında kullanıcı başına tutulacak en fazla kayıt
+
+# Logging settings (see log_utils.py)
+LOG_LEVEL = "INFO" # DEBUG, INFO, WARNING, ERROR
+LOG_FORMAT = "text" # "text": anahtar=değer satırları, "json": satır başına bir JSON nesnesi
+LOG_DEBUG_SAMPLE_RATE = 0.01 # DEBUG seviyesinde kayıtların yalnızca bu oranı yazılır (1.0 = hepsi)
+LOG_QUEUE_SIZE = 10000 # Yazıcı iş parçacığı yetişemezse bundan sonraki kayıtlar düşürülür
+
+# Metrics settings (see metrics.py)
+METRICS_ENABLED = True # False: ölçüm yapılmaz, /metrics 404 döner (ek yük yok)
+
+# Notification dispatch settings (see notification_dispatch.py)
+NOTIFICATION_DISPATCH_ENABLED = True # True: app.py süreç içinde dağıtım işçilerini başlatır (False ise ayrı süreç: python notification_dispatch.py run)
+NOTIFICATION_DISPATCH_WORKERS = 1 # Süreç başına işçi iş parçacığı sayısı (SKIP LOCKED sayesinde birden fazla süreç güvenle çalışır)
+NOTIFICATION_DISPATCH_BATCH_SIZE = 500 # Tek INSERT ile taşınacak en fazla olay sayısı
+NOTIFICATION_DISPATCH_POLL_INTERVAL = 1.0 # Saniye; kuyruk boşken işçilerin yeniden bakma aralığı
+NOTIFICATION_DISPATCH_LAG_WARNING = 30 # Saniye; en eski bekleyen olay bundan yaşlıysa uyarı loglanır
+NOTIFICATION_COALESCE_WINDOW = 3600 # Saniye; aynı gönderi/yorum için bu pencere içindeki beğeni bildirimleri tek satırda birleştirilir (0 = kapalı)
+NOTIFICATION_COALESCE_LATEST_ACTORS = 3 # Birleştirilmiş bildirimde saklanan en son etkileşen kullanıcı sayısı
+
+# Real-time event stream settings (see realtime.py)
+REALTIME_ENABLED = True # False: olay yayınlanmaz, /api/events/stream 404 döner
+REALTIME_HEARTBEAT_INTERVAL = 15 # Saniye; boşta SSE bağlantısına bu aralıkla yorum satırı gönderilir (proxy zaman aşımlarını önler)
+REALTIME_RETRY_MS = 3000 # İstemcinin bağlantı koparsa yeniden denemeden önce beklemesi (SSE retry alanı)
+REALTIME_SUBSCRIBER_QUEUE_SIZE = 256 # Bağlantı başına bekleyen olay sınırı; dolarsa bağlantı veritabanından yeniden eşitlenir
+REALTIME_EVENT_RETENTION = 86400 # Saniye; Last-Event-ID ile geri alınabilecek olayların saklanma süresi
+REALTIME_RECONNECT_DELAY = 2 # Saniye; LISTEN bağlantısı koparsa yeniden bağlanmadan önce beklenir
+REALTIME_GAP_TIMEOUT = 30 # Saniye; daha büyük id'li bir olay görüldükten sonra, commit'i gecikmiş küçük id'li olaylar bu süre kadar beklenir
+
+# User search settings (db_utils.search_users / search_users_for_message)
+USER_SEARCH_DEFAULT_LIMIT = 20 # limit verilmezse dönen en fazla sonuç
+USER_SEARCH_MAX_LIMIT = 50 # İstemcinin isteyebileceği en fazla sonuç
+USER_SEARCH_CANDIDATES = 200 # Sıralamadan önce indeksten okunacak en fazla aday (kısa öneklerde maliyeti sınırlar)
+
+# In-process user search index settings (see user_index.py)
+USER_INDEX_ENABLED = False # True: /api/users/search önek aramalarını bellekteki indeksten cevaplar
+USER_INDEX_REFRESH_INTERVAL = 5 # Saniye; diğer süreçlerde oluşturulan/değişen kullanıcılar bu aralıkla okunur
+USER_INDEX_REBUILD_INTERVAL = 3600 # Saniye; indeks bu aralıkla tamamen yeniden yüklenir (silinen kullanıcılar temizlenir)
+USER_INDEX_MAX_DELTA = 10000 # Ana bloklara katlanmadan önce bellekte biriken en fazla değişmiş kullanıcı
+
+# Suggested users settings (see suggestions.py)
+SUGGESTIONS_TOP_K = 50 # Kullanıcı başına saklanan en fazla öneri
+SUGGESTIONS_MUTUAL_WEIGHT = 1.0 # Ortak bağlantı (takip edilenin takip ettiği) başına puan
+SUGGESTIONS_POPULARITY_WEIGHT = 0.5 # ln(1 + takipçi sayısı) çarpanı
+SUGGESTIONS_MAX_FOLLOWEES = 500 # Hesaplamada kullanılacak en fazla (en son) takip edilen; çok takip eden hesaplarda maliyeti sınırlar
+SUGGESTIONS_POPULAR_POOL = 200 # Ortak bağlantısı az olan kullanıcılar için eklenen popüler aday sayısı
+SUGGESTIONS_REFRESH_ENABLED = True # True: app.py takip değişikliklerinin kuyruğunu süreç içinde işler (False ise: python suggestions.py run)
+SUGGESTIONS_REFRESH_INTERVAL = 10 # Saniye; kuyruğun kontrol edilme aralığı
+SUGGESTIONS_BATCH_SIZE = 200 # Tek işlemde yeniden hesaplanacak en fazla kullanıcı
+
+# User listing settings (db_utils.iter_users / get_all_users, /api/users)
+USERS_LIST_MAX_LIMIT = 200 # Tek istekte dönebilecek en fazla kullanıcı (sabit üst sınır)
+
+# Streaming list response settings (see serialization.py)
+STREAM_FETCH_SIZE = 200 # Sunucu tarafı cursor'dan tek FETCH ile okunup tek parça olarak gönderilen satır sayısı
+
+# Password hashing settings (see passwords.py)
+PASSWORD_HASH_ROUNDS = 12 # bcrypt maliyeti; değiştirilirse eski özetler başarılı girişte yeni maliyetle yeniden özetlenir
+PASSWORD_HASH_WORKERS = None # Özetleme süreç sayısı; None: çekirdek sayısı, 0: havuz yok (istek iş parçacığında çalışır)
+PASSWORD_HASH_MAX_CONCURRENT = None # Aynı anda çalışan + sırada bekleyen en fazla özetleme; None: süreç sayısının 2 katı
+PASSWORD_HASH_QUEUE_TIMEOUT = 5.0 # Saniye; bu sürede sıra gelmezse istek 503 ile reddedilir
+
+# Rate limiting settings (see ratelimit.py)
+RATE_LIMIT_ENABLED = True # False: /api/login ve /api/signup sınırlanmaz
+RATE_LIMIT_STORE = 'local' # 'local': worker başına bellekte; 'postgres': rate_limit_buckets tablosunda tüm worker'lar için ortak
+RATE_LIMIT_LOGIN_IP_CAPACITY = 20 # IP başına art arda yapılabilecek en fazla giriş denemesi
+RATE_LIMIT_LOGIN_IP_RATE = 20 / 60 # Saniyede yenilenen IP jetonu (dakikada 20)
+RATE_LIMIT_LOGIN_USER_CAPACITY = 5 # Kullanıcı adı/e-posta başına art arda yapılabilecek en fazla giriş denemesi
+RATE_LIMIT_LOGIN_USER_RATE = 1 / 60 # Saniyede yenilenen kullanıcı jetonu (dakikada 1)
+RATE_LIMIT_SIGNUP_IP_CAPACITY = 5 # IP başına art arda yapılabilecek en fazla kayıt
+RATE_LIMIT_SIGNUP_IP_RATE = 5 / 3600 # Saniyede yenilenen kayıt jetonu (saatte 5)
+RATE_LIMIT_TRUST_FORWARDED_FOR = False # True: istemci IP'si X-Forwarded-For'dan alınır (yalnızca güvenilir bir proxy arkasında açın)
+RATE_LIMIT_LOCAL_MAX_KEYS = 100000 # Bellekte tutulan en fazla kova; en eski kullanılanlar silinir
+RATE_LIMIT_IDLE_TTL = 3600 # Saniye; paylaşılan depoda bu süredir dokunulmayan kovalar silinir
+RATE_LIMIT_PRUNE_INTERVAL = 300 # Saniye; paylaşılan depodaki eski kovaların silinme aralığı
+
+# Batch lookup settings (/api/batch/users, /api/batch/posts)
+BATCH_MAX_IDS = 100 # Tek istekte istenebilecek en fazla ID
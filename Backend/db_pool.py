@@ -0,0 +1,247 @@
+# --- db_pool.py ---
+# Süreç genelinde paylaşılan, thread-safe PostgreSQL bağlantı havuzu.
+# Her db_utils çağrısında yeni bir psycopg2.connect (TCP + auth) yapmak yerine
+# bağlantılar burada tutulur ve tekrar kullanılır.
+import threading
+import time
+from contextlib import contextmanager
+
+import psycopg2
+import psycopg2.extensions
+
+from db_config import (
+    DB_HOST, DB_NAME, DB_USER, DB_PASSWORD,
+    DB_POOL_MIN_SIZE, DB_POOL_MAX_SIZE, DB_POOL_CHECKOUT_TIMEOUT,
+    DB_POOL_IDLE_TIMEOUT, DB_POOL_HEALTH_CHECK_INTERVAL, METRICS_ENABLED,
+)
+from metrics import InstrumentedConnection, register_stats
+
+
+class PoolTimeoutError(psycopg2.OperationalError):
+    """Raised when no connection became available within the checkout timeout."""
+
+
+class ConnectionPool:
+    """
+    Thread-safe connection pool with health checks and idle recycling.
+
+    Connections are handed out with `connection()` (a context manager) and are
+    returned to the pool when the block exits. A connection that has been idle
+    longer than `health_check_interval` is pinged before being handed out, and
+    idle connections above `min_size` are closed after `idle_timeout` seconds.
+    """
+
+    def __init__(self, min_size=DB_POOL_MIN_SIZE, max_size=DB_POOL_MAX_SIZE,
+                 checkout_timeout=DB_POOL_CHECKOUT_TIMEOUT, idle_timeout=DB_POOL_IDLE_TIMEOUT,
+                 health_check_interval=DB_POOL_HEALTH_CHECK_INTERVAL, **connect_kwargs):
+        if min_size < 0 or max_size < 1 or min_size > max_size:
+            raise ValueError(f"Invalid pool sizes: min_size={min_size}, max_size={max_size}")
+        self.min_size = min_size
+        self.max_size = max_size
+        self.checkout_timeout = checkout_timeout
+        self.idle_timeout = idle_timeout
+        self.health_check_interval = health_check_interval
+        self._connect_kwargs = connect_kwargs or {
+            'host': DB_HOST, 'database': DB_NAME, 'user': DB_USER, 'password': DB_PASSWORD,
+        }
+        if METRICS_ENABLED:
+            # Her cursor.execute süresini ölç (bkz. metrics.py)
+            self._connect_kwargs.setdefault('connection_factory', InstrumentedConnection)
+        self._cond = threading.Condition(threading.Lock())
+        self._idle = [] # (conn, returned_at) çiftleri; sondaki en son iade edilen
+        self._in_use = set()
+        self._creating = 0 # Kilit dışında açılmakta olan bağlantı sayısı
+        self._closed = False
+        self._counters = {
+            'checkouts': 0,
+            'checkout_waits': 0, # Boşta bağlantı olmadığı için beklemek zorunda kalan checkout sayısı
+            'checkout_wait_seconds_total': 0.0,
+            'checkout_wait_seconds_max': 0.0,
+            'checkout_timeouts': 0,
+            'connections_created': 0,
+            'connections_discarded': 0, # Sağlık kontrolünden geçemeyen veya bozuk dönen bağlantılar
+            'connections_recycled': 0, # Boşta kalma süresi dolduğu için kapatılan bağlantılar
+        }
+        for _ in range(min_size):
+            self._idle.append((self._new_connection(), time.monotonic()))
+
+    # --- Internal helpers ---
+
+    def _new_connection(self):
+        conn = psycopg2.connect(**self._connect_kwargs)
+        with self._cond:
+            self._counters['connections_created'] += 1
+        return conn
+
+    def _is_healthy(self, conn, idle_for):
+        if conn.closed:
+            return False
+        if idle_for < self.health_check_interval:
+            return True
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT 1;")
+            conn.rollback() # SELECT 1 ile açılan işlemi kapat
+            return True
+        except psycopg2.Error:
+            return False
+
+    def _discard(self, conn, counter='connections_discarded'):
+        try:
+            if not conn.closed:
+                conn.close()
+        except psycopg2.Error:
+            pass
+        with self._cond:
+            self._counters[counter] += 1
+
+    def _recycle_idle_locked(self, now):
+        """Closes connections idle past idle_timeout while keeping min_size around. Caller holds the lock."""
+        expired = []
+        total = len(self._idle) + len(self._in_use) + self._creating
+        # En eski iade edilenler listenin başında
+        while self._idle and total > self.min_size and now - self._idle[0][1] > self.idle_timeout:
+            expired.append(self._idle.pop(0)[0])
+            total -= 1
+        return expired
+
+    # --- Public API ---
+
+    def getconn(self):
+        """Checks out a healthy connection, waiting up to checkout_timeout seconds."""
+        started = time.monotonic()
+        deadline = started + self.checkout_timeout
+        waited = False
+        while True:
+            conn = None
+            idle_for = 0.0
+            create = False
+            with self._cond:
+                if self._closed:
+                    raise psycopg2.InterfaceError("Connection pool is closed")
+                expired = self._recycle_idle_locked(time.monotonic())
+                if self._idle:
+                    conn, returned_at = self._idle.pop()
+                    idle_for = time.monotonic() - returned_at
+                    self._in_use.add(conn)
+                elif len(self._in_use) + self._creating < self.max_size:
+                    create = True
+                    self._creating += 1 # Yer ayır; bağlantı kilit dışında açılacak
+                else:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._counters['checkout_timeouts'] += 1
+                        raise PoolTimeoutError(
+                            f"Timed out after {self.checkout_timeout}s waiting for a database connection "
+                            f"(max_size={self.max_size})"
+                        )
+                    waited = True
+                    self._cond.wait(remaining)
+                    continue
+            for old_conn in expired:
+                self._discard(old_conn, 'connections_recycled')
+
+            if create:
+                try:
+                    conn = self._new_connection()
+                finally:
+                    with self._cond:
+                        self._creating -= 1
+                        if conn is not None:
+                            self._in_use.add(conn)
+                        else:
+                            self._cond.notify()
+            elif not self._is_healthy(conn, idle_for):
+                with self._cond:
+                    self._in_use.discard(conn)
+                self._discard(conn)
+                continue # Tekrar dene; gerekirse yeni bağlantı açılır
+
+            wait_seconds = time.monotonic() - started
+            with self._cond:
+                self._counters['checkouts'] += 1
+                if waited:
+                    self._counters['checkout_waits'] += 1
+                self._counters['checkout_wait_seconds_total'] += wait_seconds
+                if wait_seconds > self._counters['checkout_wait_seconds_max']:
+                    self._counters['checkout_wait_seconds_max'] = wait_seconds
+            return conn
+
+    def putconn(self, conn):
+        """Returns a connection to the pool, rolling back any open transaction first."""
+        broken = conn.closed != 0
+        if not broken and conn.get_transaction_status() != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+            try:
+                conn.rollback()
+            except psycopg2.Error:
+                broken = True
+        with self._cond:
+            self._in_use.discard(conn)
+            if not broken and not self._closed:
+                self._idle.append((conn, time.monotonic()))
+            self._cond.notify()
+        if broken or self._closed:
+            self._discard(conn)
+
+    @contextmanager
+    def connection(self):
+        """Context manager: `with pool.connection() as conn:` checks out and always returns the connection."""
+        conn = self.getconn()
+        try:
+            yield conn
+        finally:
+            self.putconn(conn)
+
+    def closeall(self):
+        """Closes every idle connection and marks the pool as closed."""
+        with self._cond:
+            self._closed = True
+            idle = [conn for conn, _ in self._idle]
+            self._idle = []
+            self._cond.notify_all()
+        for conn in idle:
+            self._discard(conn, 'connections_recycled')
+
+    def stats(self):
+        """Returns a snapshot of the pool counters and current sizes."""
+        with self._cond:
+            snapshot = dict(self._counters)
+            snapshot['idle'] = len(self._idle)
+            snapshot['in_use'] = len(self._in_use) + self._creating
+            snapshot['min_size'] = self.min_size
+            snapshot['max_size'] = self.max_size
+        return snapshot
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    """Returns the process-wide pool, creating it on first use."""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ConnectionPool()
+    return _pool
+
+
+register_stats('solara_db_pool', lambda: get_pool().stats(), {
+    'in_use': ('connections_in_use', 'gauge', 'Pooled connections checked out (or being opened).'),
+    'idle': ('connections_idle', 'gauge', 'Pooled connections waiting to be checked out.'),
+    'max_size': ('max_size', 'gauge', 'Configured pool size limit.'),
+    'checkout_timeouts': ('checkout_timeouts_total', 'counter', 'Checkouts that gave up waiting for a connection.'),
+    'connections_created': ('connections_created_total', 'counter', 'Connections opened by the pool.'),
+    'connections_discarded': ('connections_discarded_total', 'counter', 'Connections closed after a failed health check or error.'),
+    'connections_recycled': ('connections_recycled_total', 'counter', 'Idle connections closed after the idle timeout.'),
+})
+
+
+def close_pool():
+    """Closes the process-wide pool (e.g. on shutdown or after fork)."""
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.closeall()
+            _pool = None
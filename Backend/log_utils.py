@@ -0,0 +1,136 @@
+# --- log_utils.py ---
+# Seviyeli, örneklemeli ve yapılandırılmış (structured) loglama.
+# İstek işleyen iş parçacıkları kayıtları yalnızca bir kuyruğa bırakır; stdout'a
+# yazma işini QueueListener'ın arka plan iş parçacığı yapar. Böylece yavaş bir
+# terminal veya log toplayıcı istek gecikmesine yansımaz.
+#
+# Kullanım:
+#     from log_utils import get_logger
+#     logger = get_logger(__name__)
+#     logger.debug("get_user_by_id: user_id=%s", user_id)  # Mesaj yalnızca yazılacaksa biçimlenir
+#     logger.info("request", extra=fields(method='GET', path='/api/posts', status=200))
+import atexit
+import json
+import logging
+import logging.handlers
+import queue
+import random
+import sys
+import threading
+import time
+
+from db_config import LOG_LEVEL, LOG_FORMAT, LOG_DEBUG_SAMPLE_RATE, LOG_QUEUE_SIZE
+
+_listener = None
+_setup_lock = threading.Lock()
+
+
+def fields(**values):
+    """Builds the `extra` argument for structured key=value fields on a log record."""
+    return {'fields': values}
+
+
+class SamplingFilter(logging.Filter):
+    """Passes only `rate` of the records at or below `max_level`; higher levels always pass."""
+
+    def __init__(self, rate, max_level=logging.DEBUG):
+        super().__init__()
+        self.rate = rate
+        self.max_level = max_level
+        self.dropped = 0
+
+    def filter(self, record):
+        if record.levelno > self.max_level or self.rate >= 1.0:
+            return True
+        if random.random() < self.rate:
+            return True
+        self.dropped += 1
+        return False
+
+
+class StructuredFormatter(logging.Formatter):
+    """Formats records as `ts level logger message key=value ...` or as one JSON object per line."""
+
+    def __init__(self, fmt_type='text'):
+        super().__init__()
+        self.fmt_type = fmt_type
+
+    def format(self, record):
+        timestamp = time.strftime('%Y-%m-%dT%H:%M:%S', time.gmtime(record.created)) + '.%03dZ' % record.msecs
+        message = record.getMessage()
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        extra_fields = getattr(record, 'fields', None) or {}
+        if self.fmt_type == 'json':
+            payload = {'ts': timestamp, 'level': record.levelname, 'logger': record.name, 'msg': message}
+            payload.update(extra_fields)
+            if record.exc_text:
+                payload['exc'] = record.exc_text
+            return json.dumps(payload, default=str, ensure_ascii=False)
+        line = f"{timestamp} {record.levelname:<5} {record.name} {message}"
+        if extra_fields:
+            line += ' ' + ' '.join(f"{key}={value}" for key, value in extra_fields.items())
+        if record.exc_text:
+            line += '\n' + record.exc_text
+        return line
+
+
+class _DroppingQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that never blocks the caller: records are dropped when the queue is full."""
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def prepare(self, record):
+        # Mesaj burada biçimlenir (argümanlar sonradan değişebilir); satır biçimleme yazıcı iş parçacığında yapılır.
+        # Traceback nesneleri kuyrukta tutulmaz, metne çevrilir.
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+def setup_logging(level=LOG_LEVEL, fmt_type=LOG_FORMAT, debug_sample_rate=LOG_DEBUG_SAMPLE_RATE,
+                  queue_size=LOG_QUEUE_SIZE, stream=None):
+    """Installs the queue-based handler on the root logger. Safe to call more than once."""
+    global _listener
+    with _setup_lock:
+        if _listener is not None:
+            return
+        log_queue = queue.Queue(maxsize=queue_size)
+        stream_handler = logging.StreamHandler(stream or sys.stdout)
+        stream_handler.setFormatter(StructuredFormatter(fmt_type))
+        queue_handler = _DroppingQueueHandler(log_queue)
+        # Örnekleme kuyruğa girmeden önce yapılır; düşürülen kayıt hiç kopyalanmaz
+        queue_handler.addFilter(SamplingFilter(debug_sample_rate))
+
+        root = logging.getLogger()
+        root.handlers = [queue_handler]
+        root.setLevel(level)
+        _listener = logging.handlers.QueueListener(log_queue, stream_handler, respect_handler_level=True)
+        _listener.start()
+        atexit.register(shutdown_logging)
+
+
+def shutdown_logging():
+    """Flushes queued records and stops the writer thread."""
+    global _listener
+    with _setup_lock:
+        if _listener is not None:
+            _listener.stop()
+            _listener = None
+
+
+def get_logger(name):
+    """Returns a per-module logger, configuring logging on first use."""
+    setup_logging()
+    return logging.getLogger(name)
@@ -0,0 +1,325 @@
+# --- metrics.py ---
+# İstek ve sorgu süresi ölçümleri; /metrics uç noktasından Prometheus metin
+# biçiminde sunulur. Harici bir kütüphane gerektirmez.
+#
+# - Flask kancaları (app.py) her isteği route şablonu, metot ve durum koduna göre ölçer.
+# - db_utils fonksiyonları @instrumented_query ile sarılır: çağrı süresi, dönen satır
+#   sayısı ve hata sayısı fonksiyon adıyla etiketlenir. Akış fonksiyonlarında (iter_*,
+#   generator) süre, generator bitene ya da kapanana kadar içinde geçen süredir (FETCH'ler
+#   dahil, tüketicinin JSON yazma süresi hariç); satır sayısı verilen partilerin toplamıdır.
+# - Havuz bağlantıları InstrumentedConnection ile açılır; her cursor.execute süresi
+#   ve hataları o anda çalışan db_utils fonksiyonunun adına yazılır; isimli (sunucu
+#   tarafı) cursor'larda her FETCH de ayrı bir ifade olarak ölçülür.
+# - Alt sistemler (havuz, bildirim dağıtımı, realtime, parola havuzu, hız sınırlayıcı...)
+#   stats() sözlüklerini register_stats ile kaydeder; render() bunları her kazımada okur.
+#
+# METRICS_ENABLED = False iken dekoratör fonksiyonu olduğu gibi döndürür, bağlantılar
+# sarılmaz ve kancalar hiçbir şey kaydetmez.
+import bisect
+import functools
+import inspect
+import threading
+import time
+
+import psycopg2.extensions
+
+from db_config import METRICS_ENABLED
+
+# Saniye cinsinden süre kovaları (1 ms .. 10 s)
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+ROW_BUCKETS = (0, 1, 5, 10, 25, 50, 100, 250, 500, 1000, 5000)
+
+
+class Counter:
+    """Monotonic counter keyed by a tuple of label values."""
+
+    def __init__(self, name, help_text, label_names):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            items = sorted(self._values.items())
+        for labels, value in items:
+            lines.append(f"{self.name}{_format_labels(self.label_names, labels)} {value}")
+        return lines
+
+
+class Histogram:
+    """Cumulative-bucket histogram keyed by a tuple of label values."""
+
+    def __init__(self, name, help_text, label_names, buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self.buckets = tuple(buckets)
+        self._series = {} # labels -> [bucket_counts, sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, labels, value):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            items = sorted((labels, (list(s[0]), s[1], s[2])) for labels, s in self._series.items())
+        for labels, (bucket_counts, total, count) in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float('inf'),), bucket_counts):
+                cumulative += bucket_count
+                le = '+Inf' if bound == float('inf') else repr(bound)
+                label_text = _format_labels(self.label_names + ('le',), labels + (le,))
+                lines.append(f"{self.name}_bucket{label_text} {cumulative}")
+            label_text = _format_labels(self.label_names, labels)
+            lines.append(f"{self.name}_sum{label_text} {total}")
+            lines.append(f"{self.name}_count{label_text} {count}")
+        return lines
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(names, values):
+    if not names:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in zip(names, values)) + '}'
+
+
+# --- Metrics ---
+
+http_request_duration = Histogram(
+    'solara_http_request_duration_seconds', 'HTTP request latency by route template.',
+    ('method', 'route', 'status'))
+db_query_duration = Histogram(
+    'solara_db_query_duration_seconds', 'Latency of db_utils calls (including pool checkout).',
+    ('query',))
+db_query_rows = Histogram(
+    'solara_db_query_rows', 'Rows returned or affected per db_utils call.',
+    ('query',), buckets=ROW_BUCKETS)
+db_statement_duration = Histogram(
+    'solara_db_statement_duration_seconds', 'Latency of individual cursor.execute calls.',
+    ('query',))
+db_query_errors = Counter(
+    'solara_db_query_errors_total', 'Database errors raised by cursor.execute, by db_utils call.',
+    ('query',))
+db_pool_wait = Histogram(
+    'solara_db_pool_checkout_wait_seconds', 'Time spent waiting for a pooled connection.',
+    ())
+notifications_dispatched = Counter(
+    'solara_notifications_dispatched_total', 'Notification events moved from the outbox into notifications.',
+    ())
+notification_dispatch_duration = Histogram(
+    'solara_notification_dispatch_batch_seconds', 'Latency of one outbox-to-notifications batch.',
+    ())
+
+_METRICS = (http_request_duration, db_query_duration, db_query_rows, db_statement_duration,
+            db_query_errors, db_pool_wait, notifications_dispatched, notification_dispatch_duration)
+
+# O anda çalışan db_utils çağrısı (iş parçacığına özel): [query_name, rows]
+_current = threading.local()
+
+
+def instrumented_query(func):
+    """Decorator for db_utils functions: records call latency and row count under the function name."""
+    if not METRICS_ENABLED:
+        return func
+    name = func.__name__
+    if inspect.isgeneratorfunction(func):
+        return _instrumented_generator(func, name)
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        outer = getattr(_current, 'call', None)
+        call = _current.call = [name, 0]
+        started = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            db_query_duration.observe((name,), time.perf_counter() - started)
+            db_query_rows.observe((name,), call[1])
+            _current.call = outer # İç içe çağrılar (ör. create_like -> create_notification)
+    return wrapper
+
+
+def _instrumented_generator(func, name):
+    """instrumented_query for generators (db_utils.iter_*): the call is current only while the generator runs."""
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        gen = func(*args, **kwargs)
+        call = [name, 0]
+        elapsed = 0.0
+
+        def resume(method):
+            nonlocal elapsed
+            outer = getattr(_current, 'call', None)
+            _current.call = call
+            started = time.perf_counter()
+            try:
+                return method()
+            finally:
+                elapsed += time.perf_counter() - started
+                _current.call = outer
+
+        try:
+            while True:
+                try:
+                    batch = resume(gen.__next__)
+                except StopIteration:
+                    return
+                call[1] += len(batch) if isinstance(batch, list) else 1
+                yield batch
+        finally:
+            resume(gen.close) # Erken kapatılırsa cursor/bağlantı bırakma süresi de bu çağrıya yazılır
+            db_query_duration.observe((name,), elapsed)
+            db_query_rows.observe((name,), call[1])
+    return wrapper
+
+
+_instrumented_cursor_classes = {}
+_cursor_classes_lock = threading.Lock()
+
+
+def _instrumented_cursor_class(base):
+    cls = _instrumented_cursor_classes.get(base)
+    if cls is not None:
+        return cls
+
+    def execute(self, query, vars=None):
+        started = time.perf_counter()
+        call = getattr(_current, 'call', None)
+        name = call[0] if call else 'other'
+        try:
+            result = base.execute(self, query, vars)
+        except psycopg2.Error:
+            db_query_errors.inc((name,))
+            raise
+        finally:
+            db_statement_duration.observe((name,), time.perf_counter() - started)
+        if call is not None and self.rowcount > 0:
+            call[1] += self.rowcount
+        return result
+
+    def timed_fetch(method):
+        # İsimli cursor'da execute yalnızca DECLARE'dir; asıl iş her FETCH'te sunucuda yapılır
+        @functools.wraps(method)
+        def fetch(self, *args):
+            if self.name is None:
+                return method(self, *args)
+            started = time.perf_counter()
+            call = getattr(_current, 'call', None)
+            name = call[0] if call else 'other'
+            try:
+                return method(self, *args)
+            except psycopg2.Error:
+                db_query_errors.inc((name,))
+                raise
+            finally:
+                db_statement_duration.observe((name,), time.perf_counter() - started)
+        return fetch
+
+    with _cursor_classes_lock:
+        cls = _instrumented_cursor_classes.get(base)
+        if cls is None:
+            cls = type('Instrumented' + base.__name__, (base,), {
+                'execute': execute,
+                'fetchone': timed_fetch(base.fetchone),
+                'fetchmany': timed_fetch(base.fetchmany),
+                'fetchall': timed_fetch(base.fetchall),
+            })
+            _instrumented_cursor_classes[base] = cls
+    return cls
+
+
+class InstrumentedConnection(psycopg2.extensions.connection):
+    """psycopg2 connection whose cursors time every execute() call (see db_pool)."""
+
+    def cursor(self, *args, **kwargs):
+        base = kwargs.get('cursor_factory') or self.cursor_factory or psycopg2.extensions.cursor
+        kwargs['cursor_factory'] = _instrumented_cursor_class(base)
+        return super().cursor(*args, **kwargs)
+
+
+def observe_request(method, route, status, seconds):
+    if METRICS_ENABLED:
+        http_request_duration.observe((method, route, str(status)), seconds)
+
+
+def observe_pool_wait(seconds):
+    if METRICS_ENABLED:
+        db_pool_wait.observe((), seconds)
+
+
+def observe_notification_dispatch(count, seconds):
+    if METRICS_ENABLED:
+        notifications_dispatched.inc((), count)
+        notification_dispatch_duration.observe((), seconds)
+
+
+# --- Alt sistem istatistikleri ---
+# Havuz, bildirim dağıtımı, realtime vb. kendi stats() sözlüklerini register_stats ile
+# kaydeder; render her kazımada sağlayıcıları çağırıp değerleri gauge/counter olarak yazar.
+_stats_providers = {} # prefix -> (provider, spec)
+_stats_lock = threading.Lock()
+
+
+def register_stats(prefix, provider, spec):
+    """
+    Registers a subsystem's stats for /metrics. `provider()` is called on every scrape and
+    returns a stats dict, or None to skip it (e.g. when the subsystem is disabled). `spec`
+    maps each stats key to (name suffix, 'gauge' or 'counter', help text[, label names]);
+    with label names the value is a nested dict, one level per label.
+    """
+    with _stats_lock:
+        _stats_providers[prefix] = (provider, spec)
+
+
+def _labelled(value, depth):
+    if depth == 0:
+        yield (), value
+        return
+    for label, child in sorted(value.items()):
+        for labels, leaf in _labelled(child, depth - 1):
+            yield (label,) + labels, leaf
+
+
+def _gauge_lines(prefix, stats, spec):
+    lines = []
+    for key, (suffix, metric_type, help_text, *label_names) in spec.items():
+        name = f"{prefix}_{suffix}"
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {metric_type}")
+        label_names = tuple(label_names[0]) if label_names else ()
+        for labels, value in _labelled(stats.get(key, {} if label_names else 0), len(label_names)):
+            lines.append(f"{name}{_format_labels(label_names, labels)} {value}")
+    return lines
+
+
+def render():
+    """Returns every metric, and every registered subsystem's stats, in the Prometheus text exposition format."""
+    lines = []
+    for metric in _METRICS:
+        lines.extend(metric.render())
+    with _stats_lock:
+        providers = list(_stats_providers.items())
+    for prefix, (provider, spec) in providers:
+        stats = provider()
+        if stats is not None:
+            lines.extend(_gauge_lines(prefix, stats, spec))
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,824 @@
+# --- migrations.py ---
+# Sürümlü şema geçişleri (migration).
+# Şema eskiden create_tables içindeki tek bir idempotent SQL betiğiyle kuruluyordu;
+# artık her değişiklik aşağıdaki MIGRATIONS listesine yeni bir sürüm olarak eklenir
+# ve uygulanan sürümler schema_migrations tablosunda tutulur. Mevcut sürümlerin
+# SQL'i değiştirilmez; şema değişikliği her zaman yeni bir sürümle yapılır.
+#
+# concurrent=True olan sürümler işlem (transaction) dışında, ifade ifade çalışır;
+# böylece büyük tablolarda CREATE INDEX CONCURRENTLY yazmaları kilitlemez.
+#
+# Kullanım: python migrations.py [migrate|status]
+from collections import namedtuple
+
+import psycopg2
+
+from log_utils import get_logger
+
+logger = get_logger(__name__)
+
+Migration = namedtuple('Migration', ['version', 'name', 'sql', 'concurrent'])
+
+# Aynı anda birden fazla worker'ın geçiş çalıştırmasını engelleyen advisory lock anahtarı
+MIGRATION_LOCK_KEY = 7351001
+
+
+MIGRATIONS = [
+    Migration(1, 'initial_schema', """
+        CREATE TABLE IF NOT EXISTS users (
+            user_id SERIAL PRIMARY KEY,
+            username VARCHAR(50) UNIQUE NOT NULL,
+            email VARCHAR(255) UNIQUE NOT NULL,
+            password_hash VARCHAR(255) NOT NULL,
+            full_name VARCHAR(100),
+            profile_picture_url VARCHAR(512),
+            created_at TIMESTAMPTZ DEFAULT NOW(),
+            updated_at TIMESTAMPTZ DEFAULT NOW(),
+            is_private BOOLEAN DEFAULT FALSE
+        );
+
+        CREATE TABLE IF NOT EXISTS posts (
+            post_id SERIAL PRIMARY KEY,
+            user_id INT NOT NULL,
+            content_text TEXT,
+            image_url VARCHAR(512),
+            created_at TIMESTAMPTZ DEFAULT NOW(),
+            updated_at TIMESTAMPTZ DEFAULT NOW(),
+            CONSTRAINT fk_user
+                FOREIGN KEY (user_id)
+                REFERENCES users(user_id) ON DELETE CASCADE,
+            CONSTRAINT check_content
+                CHECK (content_text IS NOT NULL OR image_url IS NOT NULL)
+        );
+
+        CREATE TABLE IF NOT EXISTS follows (
+            follow_id SERIAL PRIMARY KEY,
+            follower_user_id INT NOT NULL,
+            followed_user_id INT NOT NULL,
+            created_at TIMESTAMPTZ DEFAULT NOW(),
+            CONSTRAINT fk_follower
+                FOREIGN KEY (follower_user_id)
+                REFERENCES users(user_id) ON DELETE CASCADE,
+            CONSTRAINT fk_followed
+                FOREIGN KEY (followed_user_id)
+                REFERENCES users(user_id) ON DELETE CASCADE,
+            UNIQUE (follower_user_id, followed_user_id)
+        );
+
+        CREATE TABLE IF NOT EXISTS likes (
+            like_id SERIAL PRIMARY KEY,
+            user_id INT NOT NULL,
+            post_id INT NOT NULL,
+            created_at TIMESTAMPTZ DEFAULT NOW(), -- TIMESTATZ -> TIMESTAMPTZ olarak düzeltildi
+            CONSTRAINT fk_user_like
+                FOREIGN KEY (user_id)
+                REFERENCES users(user_id) ON DELETE CASCADE,
+            CONSTRAINT fk_post_like
+                FOREIGN KEY (post_id)
+                REFERENCES posts(post_id) ON DELETE CASCADE,
+            UNIQUE (user_id, post_id)
+        );
+
+        CREATE TABLE IF NOT EXISTS comments (
+            comment_id SERIAL PRIMARY KEY,
+            user_id INT NOT NULL,
+            post_id INT NOT NULL,
+            comment_text TEXT NOT NULL,
+            created_at TIMESTAMPTZ DEFAULT NOW(),
+            updated_at TIMESTAMPTZ DEFAULT NOW(),
+            CONSTRAINT fk_user_comment
+                FOREIGN KEY (user_id)
+                REFERENCES users(user_id) ON DELETE CASCADE,
+            CONSTRAINT fk_post_comment
+                FOREIGN KEY (post_id)
+                REFERENCES posts(post_id) ON DELETE CASCADE
+        );
+
+        CREATE TABLE IF NOT EXISTS comment_likes (
+            comment_like_id SERIAL PRIMARY KEY,
+            user_id INT NOT NULL,
+            comment_id INT NOT NULL,
+            created_at TIMESTAMPTZ DEFAULT NOW(),
+            CONSTRAINT fk_user_comment_like
+                FOREIGN KEY (user_id)
+                REFERENCES users(user_id) ON DELETE CASCADE,
+            CONSTRAINT fk_comment_like
+                FOREIGN KEY (comment_id)
+                REFERENCES comments(comment_id) ON DELETE CASCADE,
+            UNIQUE (user_id, comment_id)
+        );
+
+        CREATE TABLE IF NOT EXISTS saved_posts (
+            saved_post_id SERIAL PRIMARY KEY,
+            user_id INT NOT NULL,
+            post_id INT NOT NULL,
+            created_at TIMESTAMPTZ DEFAULT NOW(), -- 'saved_at' yerine 'created_at' kullanılıyor
+            CONSTRAINT fk_user_saved
+                FOREIGN KEY (user_id)
+                REFERENCES users(user_id) ON DELETE CASCADE,
+            CONSTRAINT fk_post_saved
+                FOREIGN KEY (post_id)
+                REFERENCES posts(post_id) ON DELETE CASCADE,
+            UNIQUE (user_id, post_id)
+        );
+
+        CREATE TABLE IF NOT EXISTS messages (
+            message_id BIGSERIAL PRIMARY KEY,
+            sender_user_id INT NOT NULL,
+            receiver_user_id INT NOT NULL,
+            message_text TEXT NOT NULL,
+            created_at TIMESTAMPTZ DEFAULT NOW(),
+            is_read BOOLEAN DEFAULT FALSE,
+            CONSTRAINT fk_sender
+                FOREIGN KEY (sender_user_id)
+                REFERENCES users(user_id) ON DELETE SET NULL, -- Kullanıcı silinirse mesaj kalır
+            CONSTRAINT fk_receiver
+                FOREIGN KEY (receiver_user_id)
+                REFERENCES users(user_id) ON DELETE SET NULL -- Kullanıcı silinirse mesaj kalır
+        );
+
+        -- ENUM type for notification type
+        DO $$
+        BEGIN
+            IF NOT EXISTS (SELECT 1 FROM pg_type WHERE typname = 'notification_type') THEN
+                CREATE TYPE notification_type AS ENUM ('like', 'comment', 'follow', 'message', 'follow_request');
+            END IF;
+            -- Add 'follow_request' to notification_type ENUM if it doesn't exist
+            IF NOT EXISTS (SELECT 1 FROM pg_enum WHERE enumtypid = 'notification_type'::regtype AND enumlabel = 'follow_request') THEN
+                ALTER TYPE notification_type ADD VALUE 'follow_request' AFTER 'message';
+            END IF;
+        END
+        $$;
+
+        -- notifications, follow_requests tablosuna referans verdiği için ondan sonra oluşturulur
+        CREATE TABLE IF NOT EXISTS follow_requests (
+            request_id SERIAL PRIMARY KEY,
+            requester_user_id INT NOT NULL, -- The user sending the request
+            recipient_user_id INT NOT NULL, -- The user receiving the request
+            created_at TIMESTAMPTZ DEFAULT NOW(),
+            CONSTRAINT fk_requester
+                FOREIGN KEY (requester_user_id)
+                REFERENCES users(user_id) ON DELETE CASCADE,
+            CONSTRAINT fk_recipient_request
+                FOREIGN KEY (recipient_user_id)
+                REFERENCES users(user_id) ON DELETE CASCADE,
+            UNIQUE (requester_user_id, recipient_user_id)
+        );
+
+        CREATE TABLE IF NOT EXISTS notifications (
+            notification_id SERIAL PRIMARY KEY,
+            recipient_user_id INT NOT NULL,
+            actor_user_id INT, -- Bildirimi tetikleyen kullanıcı (like, comment, follow yapan)
+            type notification_type NOT NULL,
+            post_id INT, -- Hangi postla ilgili (like, comment)
+            comment_id INT, -- ****** YENİ: Hangi yorumla ilgili (comment_like) ******
+            message_id BIGINT, -- Hangi mesajla ilgili
+            follow_request_id INT, -- ****** GÜNCELLEME: follow_request_id alanı eklendi ******
+            is_read BOOLEAN DEFAULT FALSE,
+            is_deleted BOOLEAN DEFAULT FALSE, -- ****** GÜNCELLEME: is_deleted alanı eklendi ******
+            created_at TIMESTAMPTZ DEFAULT NOW(),
+            CONSTRAINT fk_recipient
+                FOREIGN KEY (recipient_user_id)
+                REFERENCES users(user_id) ON DELETE CASCADE,
+            CONSTRAINT fk_actor
+                FOREIGN KEY (actor_user_id)
+                REFERENCES users(user_id) ON DELETE SET NULL, -- Actor silinse bile bildirim kalabilir
+            CONSTRAINT fk_post_notification
+                FOREIGN KEY (post_id)
+                REFERENCES posts(post_id) ON DELETE CASCADE, -- Post silinirse ilgili bildirimler de silinsin
+            CONSTRAINT fk_message_notification
+                FOREIGN KEY (message_id)
+                REFERENCES messages(message_id) ON DELETE CASCADE, -- Mesaj silinirse ilgili bildirimler de silinsin
+            CONSTRAINT fk_follow_request_notification -- ****** GÜNCELLEME: follow_request_id için FOREIGN KEY eklendi ******
+                FOREIGN KEY (follow_request_id)
+                REFERENCES follow_requests(request_id) ON DELETE CASCADE -- Takip isteği silinirse ilgili bildirim de silinsin
+        );
+
+        CREATE TABLE IF NOT EXISTS user_settings (
+            setting_id SERIAL PRIMARY KEY,
+            user_id INT UNIQUE NOT NULL,
+            dark_mode_enabled BOOLEAN DEFAULT FALSE,
+            email_notifications_enabled BOOLEAN DEFAULT TRUE,
+            updated_at TIMESTAMPTZ DEFAULT NOW(),
+            CONSTRAINT fk_user_settings
+                FOREIGN KEY (user_id)
+                REFERENCES users(user_id) ON DELETE CASCADE
+        );
+    """, False),
+
+    Migration(2, 'home_timelines', """
+        -- Fan-out-on-write ana sayfa zaman çizelgeleri (bkz. timelines.py)
+        CREATE TABLE IF NOT EXISTS timeline_entries (
+            user_id INT NOT NULL, -- Zaman çizelgesinin sahibi (takipçi)
+            post_id INT NOT NULL,
+            author_user_id INT NOT NULL, -- Takipten çıkınca budamak için
+            post_created_at TIMESTAMPTZ NOT NULL, -- Sıralama anahtarı (posts.created_at kopyası)
+            PRIMARY KEY (user_id, post_id),
+            CONSTRAINT fk_timeline_user
+                FOREIGN KEY (user_id)
+                REFERENCES users(user_id) ON DELETE CASCADE,
+            CONSTRAINT fk_timeline_post
+                FOREIGN KEY (post_id)
+                REFERENCES posts(post_id) ON DELETE CASCADE
+        );
+        CREATE INDEX IF NOT EXISTS idx_timeline_entries_user_created
+            ON timeline_entries (user_id, post_created_at DESC, post_id DESC);
+        CREATE INDEX IF NOT EXISTS idx_timeline_entries_user_author
+            ON timeline_entries (user_id, author_user_id);
+
+        -- Gönderileri dağıtılmayan, okuma anında birleştirilen çok takipçili yazarlar
+        CREATE TABLE IF NOT EXISTS timeline_pull_authors (
+            user_id INT PRIMARY KEY,
+            marked_at TIMESTAMPTZ DEFAULT NOW(),
+            CONSTRAINT fk_timeline_pull_author
+                FOREIGN KEY (user_id)
+                REFERENCES users(user_id) ON DELETE CASCADE
+        );
+    """, False),
+
+    Migration(3, 'post_stats_counters', """
+        -- Gönderi başına beğeni/yorum sayaçları. Liste sorguları her satır için
+        -- COUNT(*) alt sorgusu çalıştırmak yerine buradan okur. Sayaçlar aşağıdaki
+        -- tetikleyicilerle güncel tutulur; sapmalar counters.py ile onarılır.
+        CREATE TABLE IF NOT EXISTS post_stats (
+            post_id INT PRIMARY KEY,
+            likes_count INT NOT NULL DEFAULT 0,
+            comments_count INT NOT NULL DEFAULT 0,
+            CONSTRAINT fk_post_stats
+                FOREIGN KEY (post_id)
+                REFERENCES posts(post_id) ON DELETE CASCADE
+        );
+
+        CREATE OR REPLACE FUNCTION post_stats_on_post_insert() RETURNS TRIGGER AS $$
+        BEGIN
+            INSERT INTO post_stats (post_id) VALUES (NEW.post_id) ON CONFLICT (post_id) DO NOTHING;
+            RETURN NULL;
+        END
+        $$ LANGUAGE plpgsql;
+
+        CREATE OR REPLACE FUNCTION post_stats_on_like_change() RETURNS TRIGGER AS $$
+        BEGIN
+            IF TG_OP = 'INSERT' THEN
+                INSERT INTO post_stats (post_id, likes_count) VALUES (NEW.post_id, 1)
+                ON CONFLICT (post_id) DO UPDATE SET likes_count = post_stats.likes_count + 1;
+            ELSE
+                -- Gönderi silinirken (CASCADE) satır zaten gitmiş olabilir; UPDATE bu durumda hiçbir şey yapmaz
+                UPDATE post_stats SET likes_count = GREATEST(likes_count - 1, 0) WHERE post_id = OLD.post_id;
+            END IF;
+            RETURN NULL;
+        END
+        $$ LANGUAGE plpgsql;
+
+        CREATE OR REPLACE FUNCTION post_stats_on_comment_change() RETURNS TRIGGER AS $$
+        BEGIN
+            IF TG_OP = 'INSERT' THEN
+                INSERT INTO post_stats (post_id, comments_count) VALUES (NEW.post_id, 1)
+                ON CONFLICT (post_id) DO UPDATE SET comments_count = post_stats.comments_count + 1;
+            ELSE
+                UPDATE post_stats SET comments_count = GREATEST(comments_count - 1, 0) WHERE post_id = OLD.post_id;
+            END IF;
+            RETURN NULL;
+        END
+        $$ LANGUAGE plpgsql;
+
+        DROP TRIGGER IF EXISTS trg_post_stats_post_insert ON posts;
+        CREATE TRIGGER trg_post_stats_post_insert
+            AFTER INSERT ON posts
+            FOR EACH ROW EXECUTE FUNCTION post_stats_on_post_insert();
+        DROP TRIGGER IF EXISTS trg_post_stats_like_change ON likes;
+        CREATE TRIGGER trg_post_stats_like_change
+            AFTER INSERT OR DELETE ON likes
+            FOR EACH ROW EXECUTE FUNCTION post_stats_on_like_change();
+        DROP TRIGGER IF EXISTS trg_post_stats_comment_change ON comments;
+        CREATE TRIGGER trg_post_stats_comment_change
+            AFTER INSERT OR DELETE ON comments
+            FOR EACH ROW EXECUTE FUNCTION post_stats_on_comment_change();
+
+        -- Tablo sonradan eklendiyse mevcut gönderilerin sayaçlarını bir kez doldur
+        INSERT INTO post_stats (post_id, likes_count, comments_count)
+        SELECT p.post_id,
+               (SELECT COUNT(*) FROM likes l WHERE l.post_id = p.post_id),
+               (SELECT COUNT(*) FROM comments c WHERE c.post_id = p.post_id)
+        FROM posts p
+        WHERE NOT EXISTS (SELECT 1 FROM post_stats ps WHERE ps.post_id = p.post_id)
+        ON CONFLICT (post_id) DO NOTHING;
+    """, False),
+
+    Migration(4, 'user_stats_counters', """
+        -- Kullanıcı başına takipçi/takip edilen/gönderi sayaçları (profil görüntüleme için).
+        -- follows ve posts üzerindeki tetikleyicilerle güncel tutulur.
+        CREATE TABLE IF NOT EXISTS user_stats (
+            user_id INT PRIMARY KEY,
+            followers_count INT NOT NULL DEFAULT 0,
+            following_count INT NOT NULL DEFAULT 0,
+            post_count INT NOT NULL DEFAULT 0,
+            CONSTRAINT fk_user_stats
+                FOREIGN KEY (user_id)
+                REFERENCES users(user_id) ON DELETE CASCADE
+        );
+
+        CREATE OR REPLACE FUNCTION user_stats_on_follow_change() RETURNS TRIGGER AS $$
+        BEGIN
+            IF TG_OP = 'INSERT' THEN
+                -- Satırlar user_id sırasıyla kilitlenir; karşılıklı takiplerde kilitlenme (deadlock) olmaz
+                INSERT INTO user_stats (user_id, followers_count, following_count)
+                SELECT v.user_id, v.followers_delta, v.following_delta
+                FROM (VALUES (NEW.followed_user_id, 1, 0), (NEW.follower_user_id, 0, 1))
+                    AS v(user_id, followers_delta, following_delta)
+                ORDER BY v.user_id
+                ON CONFLICT (user_id) DO UPDATE
+                    SET followers_count = user_stats.followers_count + EXCLUDED.followers_count,
+                        following_count = user_stats.following_count + EXCLUDED.following_count;
+            ELSE
+                UPDATE user_stats
+                SET followers_count = GREATEST(followers_count - CASE WHEN user_id = OLD.followed_user_id THEN 1 ELSE 0 END, 0),
+                    following_count = GREATEST(following_count - CASE WHEN user_id = OLD.follower_user_id THEN 1 ELSE 0 END, 0)
+                WHERE user_id IN (OLD.followed_user_id, OLD.follower_user_id);
+            END IF;
+            RETURN NULL;
+        END
+        $$ LANGUAGE plpgsql;
+
+        CREATE OR REPLACE FUNCTION user_stats_on_post_change() RETURNS TRIGGER AS $$
+        BEGIN
+            IF TG_OP = 'INSERT' THEN
+                INSERT INTO user_stats (user_id, post_count) VALUES (NEW.user_id, 1)
+                ON CONFLICT (user_id) DO UPDATE SET post_count = user_stats.post_count + 1;
+            ELSE
+                UPDATE user_stats SET post_count = GREATEST(post_count - 1, 0) WHERE user_id = OLD.user_id;
+            END IF;
+            RETURN NULL;
+        END
+        $$ LANGUAGE plpgsql;
+
+        DROP TRIGGER IF EXISTS trg_user_stats_follow_change ON follows;
+        CREATE TRIGGER trg_user_stats_follow_change
+            AFTER INSERT OR DELETE ON follows
+            FOR EACH ROW EXECUTE FUNCTION user_stats_on_follow_change();
+        DROP TRIGGER IF EXISTS trg_user_stats_post_change ON posts;
+        CREATE TRIGGER trg_user_stats_post_change
+            AFTER INSERT OR DELETE ON posts
+            FOR EACH ROW EXECUTE FUNCTION user_stats_on_post_change();
+
+        -- Tablo sonradan eklendiyse mevcut kullanıcıların sayaçlarını bir kez doldur
+        INSERT INTO user_stats (user_id, followers_count, following_count, post_count)
+        SELECT u.user_id,
+               (SELECT COUNT(*) FROM follows f WHERE f.followed_user_id = u.user_id),
+               (SELECT COUNT(*) FROM follows f WHERE f.follower_user_id = u.user_id),
+               (SELECT COUNT(*) FROM posts p WHERE p.user_id = u.user_id)
+        FROM users u
+        WHERE NOT EXISTS (SELECT 1 FROM user_stats us WHERE us.user_id = u.user_id)
+        ON CONFLICT (user_id) DO NOTHING;
+    """, False),
+
+    # Sıcak sorgular için indeksler (bkz. check_query_plans.py). Her ifade ayrı çalıştırılır.
+    Migration(5, 'hot_path_indexes', [
+        # Profil ve ana sayfa: WHERE user_id = ... ORDER BY created_at DESC, post_id DESC
+        """CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_posts_user_created
+               ON posts (user_id, created_at DESC, post_id DESC);""",
+        # Gönderi yorumları: WHERE post_id = ... ORDER BY created_at
+        """CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_comments_post_created
+               ON comments (post_id, created_at);""",
+        # Bildirimler: WHERE recipient_user_id = ... AND is_deleted = FALSE ORDER BY created_at DESC
+        """CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_notifications_recipient_created
+               ON notifications (recipient_user_id, is_deleted, created_at DESC);""",
+        # İki kullanıcı arasındaki mesajlar (her iki yön için BitmapOr ile kullanılır)
+        """CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_messages_sender_receiver_created
+               ON messages (sender_user_id, receiver_user_id, created_at);""",
+        # Takipçi listeleri ve ters yönlü takip sorguları (UNIQUE indeks follower_user_id ile başlar)
+        """CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_follows_followed
+               ON follows (followed_user_id);""",
+        # Gönderiyi beğenenler ve yorum beğeni sayıları (UNIQUE indeksler user_id ile başlar)
+        """CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_likes_post
+               ON likes (post_id);""",
+        """CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_comment_likes_comment
+               ON comment_likes (comment_id);""",
+    ], True),
+
+    Migration(6, 'notification_unread_counter', """
+        -- Okunmamış bildirim sayısı (rozet) için sayaç; notifications tetikleyicisiyle güncel tutulur.
+        -- Okunmamış = is_read ve is_deleted ikisi de FALSE.
+        ALTER TABLE user_stats ADD COLUMN IF NOT EXISTS unread_notifications_count INT NOT NULL DEFAULT 0;
+
+        CREATE OR REPLACE FUNCTION user_stats_on_notification_change() RETURNS TRIGGER AS $$
+        DECLARE
+            old_unread BOOLEAN := FALSE;
+            new_unread BOOLEAN := FALSE;
+        BEGIN
+            IF TG_OP <> 'INSERT' THEN
+                old_unread := NOT COALESCE(OLD.is_read, FALSE) AND NOT COALESCE(OLD.is_deleted, FALSE);
+            END IF;
+            IF TG_OP <> 'DELETE' THEN
+                new_unread := NOT COALESCE(NEW.is_read, FALSE) AND NOT COALESCE(NEW.is_deleted, FALSE);
+            END IF;
+            IF new_unread AND NOT old_unread THEN
+                INSERT INTO user_stats (user_id, unread_notifications_count) VALUES (NEW.recipient_user_id, 1)
+                ON CONFLICT (user_id) DO UPDATE
+                    SET unread_notifications_count = user_stats.unread_notifications_count + 1;
+            ELSIF old_unread AND NOT new_unread THEN
+                UPDATE user_stats SET unread_notifications_count = GREATEST(unread_notifications_count - 1, 0)
+                WHERE user_id = OLD.recipient_user_id;
+            END IF;
+            RETURN NULL;
+        END
+        $$ LANGUAGE plpgsql;
+
+        DROP TRIGGER IF EXISTS trg_user_stats_notification_change ON notifications;
+        CREATE TRIGGER trg_user_stats_notification_change
+            AFTER INSERT OR UPDATE OF is_read, is_deleted OR DELETE ON notifications
+            FOR EACH ROW EXECUTE FUNCTION user_stats_on_notification_change();
+
+        -- Mevcut okunmamış bildirimleri bir kez say
+        INSERT INTO user_stats (user_id, unread_notifications_count)
+        SELECT recipient_user_id, COUNT(*)
+        FROM notifications
+        WHERE is_read = FALSE AND is_deleted = FALSE
+        GROUP BY recipient_user_id
+        ON CONFLICT (user_id) DO UPDATE
+            SET unread_notifications_count = EXCLUDED.unread_notifications_count;
+    """, False),
+
+    Migration(7, 'comment_notification_ids', """
+        -- Yorum bildirimleri artık comment_id'yi de saklar; önizleme yorumla comment_id üzerinden
+        -- eşlenir (post_id ile eşleme, gönderideki her yorum için satırı çoğaltıyordu).
+        -- Eski kayıtlar için aynı kullanıcının o gönderiye zamanca en yakın yorumu seçilir.
+        UPDATE notifications n
+        SET comment_id = (
+            SELECT c.comment_id FROM comments c
+            WHERE c.post_id = n.post_id AND c.user_id = n.actor_user_id
+            ORDER BY ABS(EXTRACT(EPOCH FROM (c.created_at - n.created_at)))
+            LIMIT 1
+        )
+        WHERE n.type = 'comment' AND n.comment_id IS NULL;
+    """, False),
+
+    Migration(8, 'notification_outbox', """
+        -- Bildirim olayları yazma işlemiyle (beğeni, yorum, takip...) aynı transaction içinde
+        -- bu tabloya yazılır; notification_dispatch.py işçileri toplu olarak notifications'a taşır.
+        -- Yabancı anahtarlar notifications ile aynıdır: bekleyen olayın hedefi silinirse olay da silinir,
+        -- böylece taşıma sırasında FK hatası bir grubu tıkayamaz.
+        CREATE TABLE IF NOT EXISTS notification_outbox (
+            outbox_id BIGSERIAL PRIMARY KEY,
+            recipient_user_id INT NOT NULL REFERENCES users(user_id) ON DELETE CASCADE,
+            actor_user_id INT REFERENCES users(user_id) ON DELETE SET NULL,
+            type notification_type NOT NULL,
+            post_id INT REFERENCES posts(post_id) ON DELETE CASCADE,
+            comment_id INT,
+            message_id BIGINT REFERENCES messages(message_id) ON DELETE CASCADE,
+            follow_request_id INT REFERENCES follow_requests(request_id) ON DELETE CASCADE,
+            created_at TIMESTAMPTZ NOT NULL DEFAULT NOW() -- Olay zamanı; bildirim bu zamanla yazılır
+        );
+    """, False),
+
+    Migration(9, 'notification_coalescing', """
+        -- create_comment_like 'comment_like' türünde bildirim yazar ama değer enum'da yoktu
+        ALTER TYPE notification_type ADD VALUE IF NOT EXISTS 'comment_like';
+
+        -- Birleştirilmiş (coalesced) bildirimler: aynı gönderi/yorum için bir zaman penceresindeki
+        -- beğeniler tek satırda toplanır ("X ve 1.203 kişi gönderini beğendi").
+        -- coalesce_bucket: created_at / pencere (tam sayı); NULL ise satır birleştirilmez.
+        ALTER TABLE notifications
+            ADD COLUMN IF NOT EXISTS actor_count INT NOT NULL DEFAULT 1,
+            ADD COLUMN IF NOT EXISTS latest_actor_ids INT[], -- En son etkileşen kullanıcılar, en yeniden eskiye
+            ADD COLUMN IF NOT EXISTS coalesce_bucket BIGINT;
+    """, False),
+
+    Migration(10, 'notification_coalescing_index', [
+        # Dağıtım işçisinin INSERT ... ON CONFLICT hedefi: (alıcı, tür, gönderi, yorum, pencere) başına tek satır
+        """CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS idx_notifications_coalesce
+               ON notifications (recipient_user_id, type, post_id, (COALESCE(comment_id, 0)), coalesce_bucket)
+               WHERE coalesce_bucket IS NOT NULL;""",
+    ], True),
+
+    Migration(11, 'realtime_events', """
+        -- Kullanıcıya gönderilecek anlık olaylar (yeni mesaj, yeni/güncellenen bildirim).
+        -- Satır eklenince tetikleyici pg_notify ile yayınlar; her sunucu süreci LISTEN ile alıp
+        -- SSE bağlantılarına iletir. Last-Event-ID ile yeniden bağlanan istemci kaçırdıklarını
+        -- bu tablodan okur; eski satırlar realtime.prune_events ile silinir.
+        CREATE TABLE IF NOT EXISTS user_events (
+            event_id BIGSERIAL PRIMARY KEY,
+            user_id INT NOT NULL REFERENCES users(user_id) ON DELETE CASCADE,
+            kind VARCHAR(20) NOT NULL, -- 'message' veya 'notification'
+            data JSONB NOT NULL,
+            created_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+        );
+        CREATE INDEX IF NOT EXISTS idx_user_events_user_event ON user_events (user_id, event_id);
+        CREATE INDEX IF NOT EXISTS idx_user_events_created ON user_events (created_at);
+
+        CREATE OR REPLACE FUNCTION user_events_notify() RETURNS TRIGGER AS $$
+        BEGIN
+            -- Teslim commit anında yapılır; geri alınan işlemlerin olayları hiç yayınlanmaz
+            PERFORM pg_notify('solara_events', json_build_object(
+                'id', NEW.event_id, 'user_id', NEW.user_id, 'kind', NEW.kind, 'data', NEW.data
+            )::text);
+            RETURN NULL;
+        END
+        $$ LANGUAGE plpgsql;
+
+        DROP TRIGGER IF EXISTS trg_user_events_notify ON user_events;
+        CREATE TRIGGER trg_user_events_notify
+            AFTER INSERT ON user_events
+            FOR EACH ROW EXECUTE FUNCTION user_events_notify();
+    """, False),
+
+    # Kanonik konuşma anahtarı (küçük id, büyük id): iki yönlü OR koşulu yerine tek bir eşitlik
+    # ile konuşmanın mesajlarına indeksten erişilir. Anahtar saklanan (GENERATED STORED) sütun
+    # değil, sorgularda LEAST/GREATEST ifadesidir ve 13'teki ifade indeksiyle karşılanır:
+    # STORED sütun eklemek messages tablosunu ACCESS EXCLUSIVE kilidi altında baştan yazardı.
+    # Sürüm numaraları kaymasın diye 12 boş bırakıldı (eski hali uygulanmışsa bkz. 22).
+    Migration(12, 'message_conversation_key', [], True),
+
+    Migration(13, 'message_conversation_index', [
+        # Konuşmanın en yeni N mesajı ve before_id ile önceki sayfalar: sınırlı indeks aralık taraması
+        """CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_messages_conversation_pair
+               ON messages (LEAST(sender_user_id, receiver_user_id), GREATEST(sender_user_id, receiver_user_id),
+                            message_id DESC);""",
+    ], True),
+
+    Migration(14, 'conversation_summaries', """
+        -- Sohbet listesi özeti: her katılımcı için konuşma başına bir satır (user_id, partner_user_id).
+        -- Sohbet listesi (user_id, last_message_at) indeksinde tek bir aralık okumasıdır;
+        -- kullanıcının tüm mesaj geçmişi üzerinde GROUP BY yapılmaz.
+        CREATE TABLE IF NOT EXISTS conversation_summaries (
+            user_id INT NOT NULL REFERENCES users(user_id) ON DELETE CASCADE,
+            partner_user_id INT NOT NULL REFERENCES users(user_id) ON DELETE CASCADE,
+            last_message_id BIGINT NOT NULL,
+            last_message_at TIMESTAMPTZ NOT NULL,
+            unread_count INT NOT NULL DEFAULT 0, -- user_id'nin henüz okumadığı, partnerden gelen mesajlar
+            PRIMARY KEY (user_id, partner_user_id)
+        );
+        CREATE INDEX IF NOT EXISTS idx_conversation_summaries_user_last
+            ON conversation_summaries (user_id, last_message_at DESC);
+
+        CREATE OR REPLACE FUNCTION conversation_summaries_on_message() RETURNS TRIGGER AS $$
+        BEGIN
+            INSERT INTO conversation_summaries AS cs (user_id, partner_user_id, last_message_id, last_message_at, unread_count)
+            SELECT p.user_id, p.partner_user_id, NEW.message_id, COALESCE(NEW.created_at, NOW()), p.unread
+            FROM (VALUES
+                (1, NEW.sender_user_id, NEW.receiver_user_id, 0),
+                (2, NEW.receiver_user_id, NEW.sender_user_id, CASE WHEN COALESCE(NEW.is_read, FALSE) THEN 0 ELSE 1 END)
+            ) AS p(n, user_id, partner_user_id, unread)
+            WHERE p.n = 1 OR NEW.sender_user_id <> NEW.receiver_user_id -- Kendine mesaj: tek satır
+            ORDER BY p.user_id -- Satırlar hep aynı sırada kilitlenir; karşılıklı eşzamanlı mesajlarda deadlock olmaz
+            ON CONFLICT (user_id, partner_user_id) DO UPDATE
+                SET last_message_id = GREATEST(cs.last_message_id, EXCLUDED.last_message_id),
+                    last_message_at = CASE WHEN EXCLUDED.last_message_id > cs.last_message_id
+                                           THEN EXCLUDED.last_message_at ELSE cs.last_message_at END,
+                    unread_count = cs.unread_count + EXCLUDED.unread_count;
+            RETURN NULL;
+        END
+        $$ LANGUAGE plpgsql;
+
+        DROP TRIGGER IF EXISTS trg_conversation_summaries_on_message ON messages;
+        CREATE TRIGGER trg_conversation_summaries_on_message
+            AFTER INSERT ON messages
+            FOR EACH ROW EXECUTE FUNCTION conversation_summaries_on_message();
+
+        -- Mevcut mesajlardan bir kez doldur
+        INSERT INTO conversation_summaries (user_id, partner_user_id, last_message_id, last_message_at, unread_count)
+        SELECT p.user_id, p.partner_user_id, MAX(m.message_id),
+               (ARRAY_AGG(COALESCE(m.created_at, NOW()) ORDER BY m.message_id DESC))[1],
+               COUNT(*) FILTER (WHERE m.receiver_user_id = p.user_id AND m.is_read = FALSE)
+        FROM messages m
+        CROSS JOIN LATERAL (VALUES
+            (1, m.sender_user_id, m.receiver_user_id),
+            (2, m.receiver_user_id, m.sender_user_id)
+        ) AS p(n, user_id, partner_user_id)
+        WHERE p.n = 1 OR m.sender_user_id <> m.receiver_user_id
+        GROUP BY p.user_id, p.partner_user_id
+        ON CONFLICT (user_id, partner_user_id) DO NOTHING;
+    """, False),
+
+    Migration(15, 'user_search_indexes', [
+        # Trigram eşleşmesi (LIKE '%q%') ve benzerlik sıralaması için; eklenti yetkisi gerektirir
+        "CREATE EXTENSION IF NOT EXISTS pg_trgm;",
+        # Önek araması (LIKE 'q%'): küçük harfe çevrilmiş kullanıcı adında btree aralık taraması
+        """CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_users_username_lower_prefix
+               ON users (lower(username) text_pattern_ops);""",
+        # İçeren arama (LIKE '%q%'): trigram GIN indeksi
+        """CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_users_username_trgm
+               ON users USING gin (lower(username) gin_trgm_ops);""",
+    ], True),
+
+    Migration(16, 'users_updated_at_index', [
+        # user_index.py değişen kullanıcıları updated_at üzerinden periyodik olarak okur
+        "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_users_updated_at ON users (updated_at);",
+    ], True),
+
+    Migration(17, 'user_suggestions', """
+        -- Önceden hesaplanmış "takip etmek isteyebileceğin kişiler" listeleri (bkz. suggestions.py).
+        CREATE TABLE IF NOT EXISTS user_suggestions (
+            user_id INT NOT NULL REFERENCES users(user_id) ON DELETE CASCADE,
+            suggested_user_id INT NOT NULL REFERENCES users(user_id) ON DELETE CASCADE,
+            score DOUBLE PRECISION NOT NULL,
+            mutual_count INT NOT NULL DEFAULT 0,
+            computed_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+            PRIMARY KEY (user_id, suggested_user_id)
+        );
+        CREATE INDEX IF NOT EXISTS idx_user_suggestions_user_score
+            ON user_suggestions (user_id, score DESC, suggested_user_id);
+
+        -- Takip değişikliği olan kullanıcılar; önerileri bir sonraki artımlı turda yeniden hesaplanır
+        CREATE TABLE IF NOT EXISTS suggestion_refresh_queue (
+            user_id INT PRIMARY KEY REFERENCES users(user_id) ON DELETE CASCADE,
+            enqueued_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+        );
+
+        CREATE OR REPLACE FUNCTION user_suggestions_on_follow_change() RETURNS TRIGGER AS $$
+        BEGIN
+            IF TG_OP = 'INSERT' THEN
+                -- Takip edilen kişi öneri listesinden hemen düşer
+                DELETE FROM user_suggestions
+                WHERE user_id = NEW.follower_user_id AND suggested_user_id = NEW.followed_user_id;
+                INSERT INTO suggestion_refresh_queue (user_id) VALUES (NEW.follower_user_id)
+                ON CONFLICT (user_id) DO NOTHING;
+            ELSE
+                INSERT INTO suggestion_refresh_queue (user_id) VALUES (OLD.follower_user_id)
+                ON CONFLICT (user_id) DO NOTHING;
+            END IF;
+            RETURN NULL;
+        END
+        $$ LANGUAGE plpgsql;
+
+        DROP TRIGGER IF EXISTS trg_user_suggestions_follow_change ON follows;
+        CREATE TRIGGER trg_user_suggestions_follow_change
+            AFTER INSERT OR DELETE ON follows
+            FOR EACH ROW EXECUTE FUNCTION user_suggestions_on_follow_change();
+    """, False),
+
+    Migration(18, 'user_stats_popularity_index', [
+        # Soğuk başlangıç önerileri: en çok takipçisi olan kullanıcılar
+        """CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_user_stats_followers
+               ON user_stats (followers_count DESC, user_id);""",
+    ], True),
+
+    Migration(19, 'rate_limit_buckets', """
+        -- Süreçler arası paylaşılan token bucket durumu (bkz. ratelimit.py, RATE_LIMIT_STORE = 'postgres').
+        -- UNLOGGED: çökmede içeriği silinir (limitler sıfırlanır), karşılığında yazmalar WAL'a girmez.
+        CREATE UNLOGGED TABLE IF NOT EXISTS rate_limit_buckets (
+            bucket_key VARCHAR(300) PRIMARY KEY,
+            tokens DOUBLE PRECISION NOT NULL,
+            allowed BOOLEAN NOT NULL DEFAULT TRUE,
+            updated_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+        );
+        CREATE INDEX IF NOT EXISTS idx_rate_limit_buckets_updated_at ON rate_limit_buckets (updated_at);
+    """, False),
+
+    Migration(20, 'user_suggestions_state', """
+        -- Öneri listesinin en son ne zaman hesaplandığı (bkz. suggestions.compute_for_users).
+        -- Boş liste ile "hiç hesaplanmadı" durumunu ayırır; okuma anında yalnızca satırı olmayanlar hesaplanır.
+        CREATE TABLE IF NOT EXISTS user_suggestions_state (
+            user_id INT PRIMARY KEY REFERENCES users(user_id) ON DELETE CASCADE,
+            computed_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+        );
+        -- Listesi zaten olan kullanıcılar hesaplanmış sayılır
+        INSERT INTO user_suggestions_state (user_id, computed_at)
+        SELECT user_id, MAX(computed_at) FROM user_suggestions GROUP BY user_id
+        ON CONFLICT (user_id) DO NOTHING;
+    """, False),
+
+    Migration(21, 'notifications_updated_at', """
+        -- Birleştirilmiş bildirime yeni kullanıcı eklendiği an (bkz. notification_dispatch.COALESCE_SQL).
+        -- created_at sabit kalır: (created_at, notification_id) keyset imleci sayfalar arasında kaymaz.
+        -- NULL: satır oluşturulduktan sonra hiç güncellenmedi.
+        ALTER TABLE notifications ADD COLUMN IF NOT EXISTS updated_at TIMESTAMPTZ;
+    """, False),
+
+    Migration(22, 'drop_message_conversation_columns', [
+        # 12/13'ün ilk hali (GENERATED STORED sütunlar ve onların indeksi) uygulanmış veritabanları
+        # için: ifade indeksini kur, eskilerini kaldır. DROP COLUMN tabloyu yeniden yazmaz; yeni
+        # kurulumlarda bu ifadelerin hepsi etkisizdir.
+        """CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_messages_conversation_pair
+               ON messages (LEAST(sender_user_id, receiver_user_id), GREATEST(sender_user_id, receiver_user_id),
+                            message_id DESC);""",
+        "DROP INDEX CONCURRENTLY IF EXISTS idx_messages_conversation;",
+        """ALTER TABLE messages
+               DROP COLUMN IF EXISTS conversation_low_user_id,
+               DROP COLUMN IF EXISTS conversation_high_user_id;""",
+    ], True),
+]
+
+
+def _ensure_migrations_table(cursor):
+    cursor.execute(
+        """
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            version INT PRIMARY KEY,
+            name VARCHAR(100) NOT NULL,
+            applied_at TIMESTAMPTZ DEFAULT NOW()
+        );
+        """
+    )
+
+
+def applied_versions(conn):
+    """Returns the set of migration versions recorded in schema_migrations."""
+    with conn.cursor() as cursor:
+        _ensure_migrations_table(cursor)
+        cursor.execute("SELECT version FROM schema_migrations;")
+        versions = {row[0] for row in cursor.fetchall()}
+    conn.commit()
+    return versions
+
+
+def _drop_invalid_index(cursor, statement):
+    """
+    A failed CREATE INDEX CONCURRENTLY leaves an INVALID index behind, which
+    IF NOT EXISTS would then silently keep. Drop it so the retry rebuilds it.
+    """
+    words = statement.split()
+    if 'INDEX' not in words or 'EXISTS' not in words:
+        return
+    index_name = words[words.index('EXISTS') + 1]
+    cursor.execute(
+        """
+        SELECT 1 FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid
+        WHERE c.relname = %s AND NOT i.indisvalid;
+        """,
+        (index_name,)
+    )
+    if cursor.fetchone():
+        logger.info("migrations: dropping invalid index %s left by an earlier failed build.", index_name)
+        cursor.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {index_name};")
+
+
+def _apply(conn, migration):
+    with conn.cursor() as cursor:
+        if migration.concurrent:
+            # CONCURRENTLY işlem içinde çalışamaz; her ifade kendi başına commit edilir
+            conn.autocommit = True
+            try:
+                for statement in migration.sql:
+                    _drop_invalid_index(cursor, statement)
+                    cursor.execute(statement)
+                cursor.execute(
+                    "INSERT INTO schema_migrations (version, name) VALUES (%s, %s);",
+                    (migration.version, migration.name)
+                )
+            finally:
+                conn.autocommit = False
+        else:
+            cursor.execute(migration.sql)
+            cursor.execute(
+                "INSERT INTO schema_migrations (version, name) VALUES (%s, %s);",
+                (migration.version, migration.name)
+            )
+            conn.commit()
+
+
+def migrate(conn, target_version=None):
+    """
+    Applies every pending migration up to `target_version` (default: latest), in
+    order. Returns the list of applied versions. Stops at the first failure.
+    """
+    applied = []
+    with conn.cursor() as cursor:
+        cursor.execute("SELECT pg_advisory_lock(%s);", (MIGRATION_LOCK_KEY,))
+    conn.commit()
+    try:
+        done = applied_versions(conn)
+        for migration in sorted(MIGRATIONS, key=lambda m: m.version):
+            if migration.version in done:
+                continue
+            if target_version is not None and migration.version > target_version:
+                break
+            logger.info("migrations: applying %s (%s)...", migration.version, migration.name)
+            try:
+                _apply(conn, migration)
+            except psycopg2.Error as e:
+                logger.exception("migrations: %s (%s) failed: %s", migration.version, migration.name, e)
+                if not conn.closed:
+                    conn.rollback()
+                raise
+            applied.append(migration.version)
+    finally:
+        if not conn.closed:
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT pg_advisory_unlock(%s);", (MIGRATION_LOCK_KEY,))
+            conn.commit()
+    if applied:
+        logger.info("migrations: applied %s.", applied)
+    else:
+        logger.info("migrations: schema is up to date.")
+    return applied
+
+
+if __name__ == '__main__':
+    import sys
+    from db_pool import get_pool
+
+    command = sys.argv[1] if len(sys.argv) > 1 else 'migrate'
+    if command not in ('migrate', 'status'):
+        print("Usage: python migrations.py [migrate|status]")
+        sys.exit(2)
+    with get_pool().connection() as conn:
+        try:
+            if command == 'migrate':
+                migrate(conn)
+            else:
+                done = applied_versions(conn)
+                for migration in MIGRATIONS:
+                    state = 'applied' if migration.version in done else 'pending'
+                    print(f"{migration.version:>4}  {state:<8} {migration.name}")
+        except psycopg2.Error:
+            sys.exit(1)
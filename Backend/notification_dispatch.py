@@ -0,0 +1,319 @@
+# --- notification_dispatch.py ---
+# Bildirimlerin yazma yolundan ayrılması (transactional outbox).
+# create_like, create_comment, create_follow vb. bildirim olayını kendi
+# transaction'ı içinde notification_outbox tablosuna yazar (enqueue); ikinci bir
+# bağlantı açılmaz ve HTTP yanıtı bildirim yazımını beklemez. Arka plandaki
+# işçiler bekleyen olayları sırayla alıp çok satırlı INSERT'lerle
+# notifications tablosuna taşır ve ne kadar geride olduklarını (lag) raporlar.
+#
+# Olaylar veritabanında tutulduğu için süreç çökse de kaybolmaz; FOR UPDATE
+# SKIP LOCKED sayesinde birden fazla işçi/süreç aynı olayı iki kez taşımaz.
+#
+# Beğeni türündeki olaylar (like, comment_like) birleştirilir: aynı alıcı, gönderi
+# ve yorum için NOTIFICATION_COALESCE_WINDOW saniyelik pencereye düşen olaylar tek
+# satırda toplanır (actor_count + en son etkileşenler). Viral bir gönderi on binlerce
+# satır yerine pencere başına bir satır üretir.
+#
+# Yazılan/güncellenen her bildirim aynı transaction içinde realtime.publish ile
+# alıcının SSE akışına da iletilir.
+#
+# Kullanım: python notification_dispatch.py run|drain|lag
+import sys
+import threading
+import time
+
+import psycopg2
+import psycopg2.extras
+
+from db_config import (
+    NOTIFICATION_DISPATCH_WORKERS, NOTIFICATION_DISPATCH_BATCH_SIZE,
+    NOTIFICATION_DISPATCH_POLL_INTERVAL, NOTIFICATION_DISPATCH_LAG_WARNING,
+    NOTIFICATION_COALESCE_WINDOW, NOTIFICATION_COALESCE_LATEST_ACTORS,
+)
+from db_pool import get_pool
+from log_utils import get_logger, fields
+import metrics
+import realtime
+
+logger = get_logger(__name__)
+
+# Birleştirilen bildirim türleri
+COALESCED_TYPES = ('like', 'comment_like')
+
+# Bekleyen olayları sırayla alır ve outbox'tan siler (commit'e kadar diğer işçiler atlar)
+CLAIM_SQL = """
+    DELETE FROM notification_outbox
+    WHERE outbox_id IN (
+        SELECT outbox_id FROM notification_outbox
+        ORDER BY outbox_id
+        LIMIT %(batch_size)s
+        FOR UPDATE SKIP LOCKED
+    )
+    RETURNING outbox_id, recipient_user_id, actor_user_id, type, post_id, comment_id,
+              message_id, follow_request_id, created_at;
+"""
+
+INSERT_SQL = """
+    INSERT INTO notifications
+        (recipient_user_id, actor_user_id, type, post_id, comment_id, message_id, follow_request_id, created_at)
+    VALUES %s
+    RETURNING notification_id, recipient_user_id, actor_user_id, type, post_id, comment_id,
+              message_id, follow_request_id, actor_count, created_at, updated_at, is_deleted;
+"""
+
+# Pencerede zaten bir satır varsa ona eklenir: sayaç artar, son kullanıcılar öne alınır,
+# satır yeniden okunmamış olur ve updated_at ilerler. created_at (listenin sıralama ve
+# keyset anahtarı) sabit kalır, böylece sayfalama sırasında satır yer değiştirmez; kullanıcının
+# sildiği bildirim (is_deleted) geri gelmez.
+COALESCE_SQL = f"""
+    INSERT INTO notifications AS n
+        (recipient_user_id, actor_user_id, type, post_id, comment_id, created_at,
+         actor_count, latest_actor_ids, coalesce_bucket)
+    VALUES %s
+    ON CONFLICT (recipient_user_id, type, post_id, (COALESCE(comment_id, 0)), coalesce_bucket)
+        WHERE coalesce_bucket IS NOT NULL
+    DO UPDATE SET
+        actor_user_id = COALESCE(EXCLUDED.actor_user_id, n.actor_user_id),
+        updated_at = GREATEST(COALESCE(n.updated_at, n.created_at), EXCLUDED.created_at),
+        -- Son kullanıcılar arasında zaten olanlar (ör. beğenip geri alıp yeniden beğenen) iki kez sayılmaz
+        actor_count = n.actor_count + EXCLUDED.actor_count - cardinality(ARRAY(
+            SELECT unnest(EXCLUDED.latest_actor_ids) INTERSECT SELECT unnest(n.latest_actor_ids)
+        )),
+        latest_actor_ids = ARRAY(
+            SELECT actor_id
+            FROM unnest(EXCLUDED.latest_actor_ids || n.latest_actor_ids) WITH ORDINALITY AS t(actor_id, ord)
+            GROUP BY actor_id
+            ORDER BY MIN(ord)
+            LIMIT {int(NOTIFICATION_COALESCE_LATEST_ACTORS)}
+        ),
+        is_read = FALSE
+    RETURNING notification_id, recipient_user_id, actor_user_id, type, post_id, comment_id,
+              message_id, follow_request_id, actor_count, created_at, updated_at, is_deleted;
+"""
+
+
+def enqueue(cursor, recipient_user_id, actor_user_id, notification_type,
+            post_id=None, comment_id=None, message_id=None, follow_request_id=None):
+    """
+    Records a notification event in the outbox using the caller's cursor (and transaction).
+    The caller commits; call wake() afterwards so an in-process worker picks it up immediately.
+    """
+    cursor.execute(
+        """
+        INSERT INTO notification_outbox
+            (recipient_user_id, actor_user_id, type, post_id, comment_id, message_id, follow_request_id)
+        VALUES (%s, %s, %s, %s, %s, %s, %s);
+        """,
+        (recipient_user_id, actor_user_id, notification_type, post_id, comment_id, message_id, follow_request_id)
+    )
+
+
+def coalesce_events(events, window=NOTIFICATION_COALESCE_WINDOW, latest_actors=NOTIFICATION_COALESCE_LATEST_ACTORS):
+    """
+    Splits claimed outbox rows (in outbox_id order) into rows for INSERT_SQL and
+    one aggregated row per (recipient, type, post, comment, window) for COALESCE_SQL.
+    """
+    plain_rows = []
+    groups = {}
+    for event in events:
+        if window <= 0 or event['type'] not in COALESCED_TYPES:
+            plain_rows.append((event['recipient_user_id'], event['actor_user_id'], event['type'], event['post_id'],
+                               event['comment_id'], event['message_id'], event['follow_request_id'], event['created_at']))
+            continue
+        bucket = int(event['created_at'].timestamp() // window)
+        key = (event['recipient_user_id'], event['type'], event['post_id'], event['comment_id'], bucket)
+        group = groups.get(key)
+        if group is None:
+            group = groups[key] = {'actors': [], 'actor_user_id': None, 'created_at': event['created_at']}
+        actor_user_id = event['actor_user_id']
+        if actor_user_id is not None: # Silinmiş kullanıcı (SET NULL) sayılmaz
+            if actor_user_id in group['actors']:
+                group['actors'].remove(actor_user_id)
+            group['actors'].insert(0, actor_user_id) # En yeni başta
+            group['actor_user_id'] = actor_user_id
+        group['created_at'] = max(group['created_at'], event['created_at'])
+    coalesced_rows = [
+        (recipient_user_id, group['actor_user_id'], notification_type, post_id, comment_id, group['created_at'],
+         max(len(group['actors']), 1), group['actors'][:latest_actors], bucket)
+        for (recipient_user_id, notification_type, post_id, comment_id, bucket), group in groups.items()
+    ]
+    return plain_rows, coalesced_rows
+
+
+def dispatch_batch(conn, batch_size=NOTIFICATION_DISPATCH_BATCH_SIZE):
+    """Moves up to `batch_size` pending events into notifications and commits. Returns the number of events moved."""
+    started = time.perf_counter()
+    with conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cursor:
+        cursor.execute(CLAIM_SQL, {'batch_size': batch_size})
+        events = cursor.fetchall()
+        plain_rows, coalesced_rows = coalesce_events(events)
+        written = []
+        if plain_rows:
+            written += psycopg2.extras.execute_values(cursor, INSERT_SQL, plain_rows, page_size=batch_size, fetch=True)
+        if coalesced_rows:
+            written += psycopg2.extras.execute_values(cursor, COALESCE_SQL, coalesced_rows, page_size=batch_size, fetch=True)
+        realtime.publish(cursor, [
+            (row['recipient_user_id'], 'notification', realtime.notification_event_data(row))
+            for row in written if not row['is_deleted'] # Silinmiş satıra eklenen beğeni istemciye gönderilmez
+        ])
+    conn.commit()
+    moved = len(events)
+    if moved > 0:
+        metrics.observe_notification_dispatch(moved, time.perf_counter() - started)
+        logger.debug("dispatch_batch: moved %s notification events (%s plain rows, %s coalesced groups).",
+                     moved, len(plain_rows), len(coalesced_rows))
+    return moved
+
+
+def outbox_lag(conn):
+    """Returns how far the dispatcher is behind: pending event count and age of the oldest one in seconds."""
+    with conn.cursor() as cursor:
+        cursor.execute(
+            """
+            SELECT COUNT(*), COALESCE(EXTRACT(EPOCH FROM (NOW() - MIN(created_at))), 0)
+            FROM notification_outbox;
+            """
+        )
+        pending, oldest_age = cursor.fetchone()
+    conn.rollback() # Salt okuma; transaction'ı açık bırakma
+    return {'pending': pending, 'oldest_age_seconds': float(oldest_age)}
+
+
+class NotificationDispatcher:
+    """Background worker threads that drain the notification outbox in batches."""
+
+    def __init__(self, workers=NOTIFICATION_DISPATCH_WORKERS, batch_size=NOTIFICATION_DISPATCH_BATCH_SIZE,
+                 poll_interval=NOTIFICATION_DISPATCH_POLL_INTERVAL, lag_warning=NOTIFICATION_DISPATCH_LAG_WARNING):
+        if workers < 1 or batch_size < 1:
+            raise ValueError(f"Invalid dispatcher settings: workers={workers}, batch_size={batch_size}")
+        self.workers = workers
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.lag_warning = lag_warning
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+        self._threads = []
+        self._lock = threading.Lock()
+        self._lagging = False
+        self.dispatched = 0
+        self.errors = 0
+        self.lag = {'pending': 0, 'oldest_age_seconds': 0.0}
+
+    def start(self):
+        with self._lock:
+            if self._threads:
+                return
+            self._stopping.clear()
+            self._threads = [
+                threading.Thread(target=self._run, name=f"notification-dispatch-{i}", daemon=True)
+                for i in range(self.workers)
+            ]
+            for thread in self._threads:
+                thread.start()
+        logger.info("Notification dispatcher started.", extra=fields(workers=self.workers, batch_size=self.batch_size))
+
+    def stop(self, timeout=5.0):
+        with self._lock:
+            threads, self._threads = self._threads, []
+        self._stopping.set()
+        self._wakeup.set()
+        for thread in threads:
+            thread.join(timeout)
+
+    def wake(self):
+        """Signals the workers that new events were committed."""
+        self._wakeup.set()
+
+    def _record_lag(self, lag):
+        with self._lock:
+            self.lag = lag
+            lagging = lag['oldest_age_seconds'] > self.lag_warning
+            changed = lagging != self._lagging
+            self._lagging = lagging
+        # Her turda değil, yalnızca eşik aşıldığında/geri dönüldüğünde logla
+        if changed and lagging:
+            logger.warning("Notification dispatch is falling behind.", extra=fields(**lag))
+        elif changed:
+            logger.info("Notification dispatch caught up.", extra=fields(**lag))
+
+    def _run(self):
+        while not self._stopping.is_set():
+            self._wakeup.clear() # Boşaltmadan önce temizle; bu sırada gelen wake() kaybolmaz
+            try:
+                with get_pool().connection() as conn:
+                    while not self._stopping.is_set():
+                        moved = dispatch_batch(conn, self.batch_size)
+                        with self._lock:
+                            self.dispatched += moved
+                        if moved < self.batch_size:
+                            break
+                    self._record_lag(outbox_lag(conn))
+            except psycopg2.Error as e:
+                with self._lock:
+                    self.errors += 1
+                logger.exception("Notification dispatch failed: %s", e)
+            self._wakeup.wait(self.poll_interval)
+
+    def stats(self):
+        with self._lock:
+            snapshot = dict(self.lag)
+            snapshot['dispatched'] = self.dispatched
+            snapshot['errors'] = self.errors
+            snapshot['workers'] = len(self._threads)
+        return snapshot
+
+
+_dispatcher = None
+_dispatcher_lock = threading.Lock()
+
+
+def get_dispatcher():
+    """Returns the process-wide dispatcher, creating it (not started) on first use."""
+    global _dispatcher
+    if _dispatcher is None:
+        with _dispatcher_lock:
+            if _dispatcher is None:
+                _dispatcher = NotificationDispatcher()
+    return _dispatcher
+
+
+metrics.register_stats('solara_notification', lambda: get_dispatcher().stats(), {
+    'pending': ('outbox_pending', 'gauge', 'Notification events waiting in the outbox.'),
+    'oldest_age_seconds': ('outbox_oldest_age_seconds', 'gauge', 'Age of the oldest undispatched outbox event.'),
+    'workers': ('dispatch_workers', 'gauge', 'Running notification dispatch threads.'),
+})
+
+
+def wake():
+    """Wakes the in-process dispatcher if one is running; otherwise the next poll picks the events up."""
+    if _dispatcher is not None:
+        _dispatcher.wake()
+
+
+if __name__ == '__main__':
+    command = sys.argv[1] if len(sys.argv) > 1 else 'run'
+    if command == 'run':
+        dispatcher = get_dispatcher()
+        dispatcher.start()
+        try:
+            while True:
+                time.sleep(60)
+                logger.info("Notification dispatcher stats.", extra=fields(**dispatcher.stats()))
+        except KeyboardInterrupt:
+            dispatcher.stop()
+    elif command == 'drain':
+        with get_pool().connection() as conn:
+            total = 0
+            while True:
+                moved = dispatch_batch(conn)
+                total += moved
+                if moved < NOTIFICATION_DISPATCH_BATCH_SIZE:
+                    break
+        print(f"--- Moved {total} notification events. ---")
+    elif command == 'lag':
+        with get_pool().connection() as conn:
+            lag = outbox_lag(conn)
+        print(f"pending={lag['pending']} oldest_age_seconds={lag['oldest_age_seconds']:.1f}")
+    else:
+        print("Usage: python notification_dispatch.py run|drain|lag")
+        sys.exit(1)
@@ -0,0 +1,58 @@
+# --- pagination.py ---
+# Keyset (cursor) sayfalama için yardımcılar.
+# İstemciye verilen cursor opak bir metindir; içinde son görülen satırın
+# sıralama anahtarı (ör. created_at, post_id) saklanır.
+import base64
+import json
+import re
+from datetime import datetime
+
+# PostgreSQL'in ::TEXT çıktısındaki '+00' gibi saat dilimleri (Python 3.11 öncesi fromisoformat '+00:00' ister)
+_SHORT_UTC_OFFSET = re.compile(r'([+-]\d\d)$')
+
+
+def encode_cursor(*values):
+    """Encodes the sort key of the last row of a page into an opaque, URL-safe cursor string."""
+    raw = json.dumps(list(values), separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def _parse_timestamp(value):
+    if not isinstance(value, str):
+        raise ValueError("Invalid cursor: expected a timestamp")
+    try:
+        return datetime.fromisoformat(_SHORT_UTC_OFFSET.sub(r'\1:00', value))
+    except ValueError:
+        raise ValueError("Invalid cursor: malformed timestamp") from None
+
+
+def decode_cursor(cursor, expected_length, types=None):
+    """
+    Decodes a cursor produced by encode_cursor. Raises ValueError if it is malformed.
+    `types` optionally gives the expected type of each value (str, int or datetime);
+    datetime values are parsed from their ISO 8601 text so bad ones never reach the query.
+    """
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+    except (ValueError, TypeError, UnicodeError) as e:
+        raise ValueError(f"Invalid cursor: {e}")
+    if not isinstance(values, list) or len(values) != expected_length:
+        raise ValueError("Invalid cursor: unexpected shape")
+    if types is not None:
+        for i, expected in enumerate(types):
+            if expected is datetime:
+                values[i] = _parse_timestamp(values[i])
+            elif not isinstance(values[i], expected) or isinstance(values[i], bool):
+                raise ValueError("Invalid cursor: unexpected values")
+    return values
+
+
+def parse_limit(value, default, maximum):
+    """Parses a `limit` query parameter, falling back to `default` and capping at `maximum`."""
+    if value is None or value == '':
+        return default
+    limit = int(value) # Geçersiz değerde ValueError fırlatır; çağıran 400 döndürür
+    if limit < 1:
+        raise ValueError("limit must be a positive integer")
+    return min(limit, maximum)
@@ -0,0 +1,177 @@
+# --- passwords.py ---
+# Parola özetleme (bcrypt) servisi.
+#
+# bcrypt bilerek yavaştır (maliyet 12'de ~100-300 ms CPU). İstek iş parçacığında
+# çalıştırıldığında aynı worker'daki diğer istekler giriş yoğunluklarında bekler; bu
+# yüzden hashpw/checkpw çağrıları çekirdek sayısı kadar süreçli bir ProcessPoolExecutor'da
+# çalışır. Aynı anda işlenebilecek özetleme sayısı bir semafor ile sınırlanır; sıra
+# PASSWORD_HASH_QUEUE_TIMEOUT içinde gelmezse PasswordHashBusy yükseltilir (uç noktalar
+# 503 döner) ve kuyruk sınırsız büyümez.
+#
+# Maliyet (rounds) PASSWORD_HASH_ROUNDS ile ayarlanır. Farklı maliyetle üretilmiş bir
+# özet, başarılı girişte yeni maliyetle yeniden özetlenir (verify_password yeni özeti
+# döndürür, çağıran kaydeder); kullanıcılar bir şey fark etmez.
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import bcrypt
+
+from db_config import (
+    PASSWORD_HASH_ROUNDS, PASSWORD_HASH_WORKERS, PASSWORD_HASH_MAX_CONCURRENT, PASSWORD_HASH_QUEUE_TIMEOUT,
+)
+from log_utils import get_logger, fields
+import metrics
+
+logger = get_logger(__name__)
+
+
+class PasswordHashBusy(Exception):
+    """Raised when no hashing slot frees up within PASSWORD_HASH_QUEUE_TIMEOUT."""
+
+
+def _hashpw(password, rounds):
+    return bcrypt.hashpw(password, bcrypt.gensalt(rounds=rounds)).decode('utf-8')
+
+
+def _checkpw(password, password_hash):
+    return bcrypt.checkpw(password, password_hash)
+
+
+def hash_rounds(password_hash):
+    """Returns the cost factor of a bcrypt hash ('$2b$12$...' -> 12), or None if it cannot be parsed."""
+    parts = password_hash.split('$')
+    try:
+        return int(parts[2])
+    except (IndexError, ValueError):
+        return None
+
+
+class PasswordHasher:
+    """Runs bcrypt in a process pool with a cap on concurrent (running + queued) hashes."""
+
+    def __init__(self, workers=PASSWORD_HASH_WORKERS, max_concurrent=PASSWORD_HASH_MAX_CONCURRENT,
+                 queue_timeout=PASSWORD_HASH_QUEUE_TIMEOUT, rounds=PASSWORD_HASH_ROUNDS):
+        # workers None: çekirdek sayısı; 0: havuz yok, istek iş parçacığında çalışır (geliştirme)
+        self.workers = (os.cpu_count() or 1) if workers is None else workers
+        self.queue_timeout = queue_timeout
+        self.rounds = rounds
+        self._slots = threading.BoundedSemaphore(max_concurrent or max(self.workers, 1) * 2)
+        self._executor = None
+        self._lock = threading.Lock()
+        self.hashed = 0
+        self.verified = 0
+        self.rehashed = 0
+        self.rejected = 0
+        self.in_flight = 0
+
+    def _get_executor(self):
+        # İlk kullanımda oluşturulur: gunicorn fork'undan sonra her worker kendi havuzunu açar
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(max_workers=self.workers)
+                logger.info("Password hashing pool started.", extra=fields(workers=self.workers, rounds=self.rounds))
+            return self._executor
+
+    def _run(self, fn, *args):
+        if not self._slots.acquire(timeout=self.queue_timeout):
+            with self._lock:
+                self.rejected += 1
+            logger.warning("Password hashing queue is full.", extra=fields(timeout=self.queue_timeout))
+            raise PasswordHashBusy()
+        with self._lock:
+            self.in_flight += 1
+        try:
+            if self.workers == 0:
+                return fn(*args)
+            try:
+                return self._get_executor().submit(fn, *args).result()
+            except BrokenProcessPool:
+                # Bir alt süreç öldüyse havuz kullanılamaz; yenisi açılır ve bir kez yeniden denenir
+                logger.exception("Password hashing pool broke; restarting it.")
+                with self._lock:
+                    self._executor = None
+                return self._get_executor().submit(fn, *args).result()
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+            self._slots.release()
+
+    def hash_password(self, password):
+        """Returns the bcrypt hash (str) of `password` at the configured cost."""
+        password_hash = self._run(_hashpw, password.encode('utf-8'), self.rounds)
+        with self._lock:
+            self.hashed += 1
+        return password_hash
+
+    def verify_password(self, password, password_hash):
+        """
+        Checks `password` against `password_hash`. Returns (ok, new_hash): new_hash is
+        a fresh hash at the configured cost when the stored one used a different cost
+        (the caller should store it), otherwise None.
+        """
+        if not password_hash:
+            return False, None
+        try:
+            ok = self._run(_checkpw, password.encode('utf-8'), password_hash.encode('utf-8'))
+        except ValueError:
+            logger.warning("Stored password hash is not a valid bcrypt hash.")
+            return False, None
+        with self._lock:
+            self.verified += 1
+        if not ok or hash_rounds(password_hash) == self.rounds:
+            return ok, None
+        new_hash = self.hash_password(password)
+        with self._lock:
+            self.rehashed += 1
+        return True, new_hash
+
+    def shutdown(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'workers': self.workers,
+                'in_flight': self.in_flight,
+                'hashed': self.hashed,
+                'verified': self.verified,
+                'rehashed': self.rehashed,
+                'rejected': self.rejected,
+            }
+
+
+_hasher = None
+_hasher_lock = threading.Lock()
+
+
+def get_hasher():
+    """Returns the process-wide hasher (its pool starts on first use)."""
+    global _hasher
+    if _hasher is None:
+        with _hasher_lock:
+            if _hasher is None:
+                _hasher = PasswordHasher()
+    return _hasher
+
+
+metrics.register_stats('solara_password', lambda: get_hasher().stats(), {
+    'workers': ('hash_workers', 'gauge', 'Processes in the password hashing pool.'),
+    'in_flight': ('hash_in_flight', 'gauge', 'Hash/verify calls running or queued.'),
+    'hashed': ('hashes_total', 'counter', 'Passwords hashed.'),
+    'verified': ('verifications_total', 'counter', 'Password verifications.'),
+    'rehashed': ('rehashes_total', 'counter', 'Stored hashes upgraded to the configured cost.'),
+    'rejected': ('hash_rejected_total', 'counter', 'Hash/verify calls rejected because the queue was full.'),
+})
+
+
+def hash_password(password):
+    return get_hasher().hash_password(password)
+
+
+def verify_password(password, password_hash):
+    return get_hasher().verify_password(password, password_hash)
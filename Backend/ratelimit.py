@@ -0,0 +1,176 @@
+# --- ratelimit.py ---
+# Giriş/kayıt uç noktaları için token bucket hız sınırlayıcı.
+#
+# Her anahtarın (ör. 'login:ip:1.2.3.4', 'login:user:ali') bir kovası vardır: en fazla
+# `capacity` jeton tutar, saniyede `rate` jeton dolar, her istek bir jeton harcar. Jeton
+# yoksa istek reddedilir ve Retry-After süresi döner. Kontrol, kullanıcı araması ve
+# bcrypt doğrulamasından önce yapılır; böylece kaba kuvvet / credential stuffing
+# akışları veritabanına ve CPU havuzuna (passwords.py) ulaşmaz.
+#
+# Depo: süreç içi LocalBucketStore her zaman ilk kontroldür (veritabanına gitmeden
+# reddeder). RATE_LIMIT_STORE = 'postgres' ise izin verilen istekler ayrıca
+# rate_limit_buckets tablosundaki paylaşılan kovadan düşülür, böylece sınır tüm
+# worker'lar için ortak olur. Paylaşılan depo hata verirse istek engellenmez (fail open).
+import threading
+import time
+from collections import OrderedDict
+
+import psycopg2
+
+from db_config import (
+    RATE_LIMIT_ENABLED, RATE_LIMIT_STORE, RATE_LIMIT_LOCAL_MAX_KEYS, RATE_LIMIT_IDLE_TTL, RATE_LIMIT_PRUNE_INTERVAL,
+)
+from db_pool import get_pool
+from log_utils import get_logger
+import metrics
+
+logger = get_logger(__name__)
+
+
+class LocalBucketStore:
+    """In-process buckets, bounded to `max_keys` (least recently used keys are dropped, i.e. reset to full)."""
+
+    def __init__(self, max_keys=RATE_LIMIT_LOCAL_MAX_KEYS):
+        self.max_keys = max_keys
+        self._buckets = OrderedDict() # key -> [tokens, updated_at]; en son kullanılan sonda
+        self._lock = threading.Lock()
+
+    def take(self, key, capacity, rate, cost=1.0):
+        """Takes `cost` tokens from `key`'s bucket. Returns (allowed, tokens left)."""
+        now = time.monotonic()
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = self._buckets[key] = [float(capacity), now]
+                while len(self._buckets) > self.max_keys:
+                    self._buckets.popitem(last=False)
+            else:
+                self._buckets.move_to_end(key)
+                bucket[0] = min(float(capacity), bucket[0] + (now - bucket[1]) * rate)
+                bucket[1] = now
+            if bucket[0] < cost:
+                return False, bucket[0]
+            bucket[0] -= cost
+            return True, bucket[0]
+
+    def __len__(self):
+        with self._lock:
+            return len(self._buckets)
+
+
+_TAKE_SQL = """
+    INSERT INTO rate_limit_buckets AS b (bucket_key, tokens, allowed, updated_at)
+    VALUES (%(key)s, %(capacity)s - %(cost)s, TRUE, clock_timestamp())
+    ON CONFLICT (bucket_key) DO UPDATE SET
+        allowed = LEAST(%(capacity)s, b.tokens + EXTRACT(EPOCH FROM clock_timestamp() - b.updated_at) * %(rate)s) >= %(cost)s,
+        tokens = LEAST(%(capacity)s, b.tokens + EXTRACT(EPOCH FROM clock_timestamp() - b.updated_at) * %(rate)s)
+                 - CASE WHEN LEAST(%(capacity)s, b.tokens + EXTRACT(EPOCH FROM clock_timestamp() - b.updated_at) * %(rate)s) >= %(cost)s
+                        THEN %(cost)s ELSE 0 END,
+        updated_at = clock_timestamp()
+    RETURNING allowed, tokens;
+"""
+
+
+class PostgresBucketStore:
+    """Buckets shared by every worker, one row per key in rate_limit_buckets (a single upsert per take)."""
+
+    def __init__(self, idle_ttl=RATE_LIMIT_IDLE_TTL, prune_interval=RATE_LIMIT_PRUNE_INTERVAL):
+        self.idle_ttl = idle_ttl
+        self.prune_interval = prune_interval
+        self._next_prune = time.monotonic() + prune_interval
+        self._lock = threading.Lock()
+
+    def take(self, key, capacity, rate, cost=1.0):
+        """Takes `cost` tokens from `key`'s shared bucket. Returns (allowed, tokens left); raises psycopg2.Error."""
+        with get_pool().connection() as conn:
+            try:
+                with conn.cursor() as cursor:
+                    cursor.execute(_TAKE_SQL, {'key': key, 'capacity': capacity, 'rate': rate, 'cost': cost})
+                    allowed, tokens = cursor.fetchone()
+                    if self._prune_due():
+                        # Uzun süredir dokunulmayan kovalar zaten dolmuştur; silinmeleri davranışı değiştirmez
+                        cursor.execute(
+                            "DELETE FROM rate_limit_buckets WHERE updated_at < NOW() - make_interval(secs => %s);",
+                            (self.idle_ttl,)
+                        )
+                conn.commit()
+            except psycopg2.Error:
+                conn.rollback()
+                raise
+        return allowed, tokens
+
+    def _prune_due(self):
+        now = time.monotonic()
+        with self._lock:
+            if now < self._next_prune:
+                return False
+            self._next_prune = now + self.prune_interval
+            return True
+
+
+class RateLimiter:
+    """Token-bucket limiter: a local bucket check, then (optionally) the shared store."""
+
+    def __init__(self, store=RATE_LIMIT_STORE):
+        self.local = LocalBucketStore()
+        self.shared = PostgresBucketStore() if store == 'postgres' else None
+        self._lock = threading.Lock()
+        self._counters = {} # scope -> {'allowed': n, 'limited': n}
+        self.store_errors = 0
+
+    def check(self, scope, key, capacity, rate):
+        """
+        Spends one token from the bucket for (scope, key). Returns 0 when the request
+        may proceed, otherwise the number of seconds to wait (for Retry-After).
+        """
+        bucket_key = f"{scope}:{key}"
+        allowed, tokens = self.local.take(bucket_key, capacity, rate)
+        if allowed and self.shared is not None:
+            try:
+                allowed, tokens = self.shared.take(bucket_key, capacity, rate)
+            except psycopg2.Error as e:
+                with self._lock:
+                    self.store_errors += 1
+                logger.warning("Shared rate limit store failed; allowing request: %s", e)
+        with self._lock:
+            counters = self._counters.setdefault(scope, {'allowed': 0, 'limited': 0})
+            counters['allowed' if allowed else 'limited'] += 1
+        if allowed:
+            return 0
+        return max(1, int((1.0 - tokens) / rate + 0.999)) if rate > 0 else 60
+
+    def stats(self):
+        with self._lock:
+            return {
+                'scopes': {scope: dict(counters) for scope, counters in self._counters.items()},
+                'local_keys': len(self.local),
+                'store_errors': self.store_errors,
+            }
+
+
+_limiter = None
+_limiter_lock = threading.Lock()
+
+
+def get_limiter():
+    """Returns the process-wide limiter, creating it on first use."""
+    global _limiter
+    if _limiter is None:
+        with _limiter_lock:
+            if _limiter is None:
+                _limiter = RateLimiter()
+    return _limiter
+
+
+metrics.register_stats('solara_rate_limit', lambda: get_limiter().stats() if RATE_LIMIT_ENABLED else None, {
+    'scopes': ('requests_total', 'counter', 'Rate-limited requests by scope and result.', ('scope', 'result')),
+    'local_keys': ('local_keys', 'gauge', 'Buckets held in the in-process store.'),
+    'store_errors': ('store_errors_total', 'counter', 'Shared bucket store failures (requests allowed).'),
+})
+
+
+def check(scope, key, capacity, rate):
+    """Module-level shortcut for get_limiter().check(); always 0 when RATE_LIMIT_ENABLED is False."""
+    if not RATE_LIMIT_ENABLED:
+        return 0
+    return get_limiter().check(scope, key, capacity, rate)
@@ -0,0 +1,393 @@
+# --- realtime.py ---
+# Mesaj ve bildirimler için anlık olay akışı (Server-Sent Events).
+#
+# Yazma tarafı: create_message ve bildirim dağıtımı, olayı kendi transaction'ı
+# içinde user_events tablosuna yazar (publish). Tablodaki tetikleyici pg_notify ile
+# 'solara_events' kanalına yayınlar; yayın commit anında yapılır.
+#
+# Okuma tarafı: her sunucu sürecinde tek bir EventBroker iş parçacığı ayrı bir
+# bağlantıda LISTEN yapar ve gelen olayları o süreçteki SSE bağlantılarına
+# (kullanıcı başına abonelikler) dağıtır. Böylece birden fazla worker/süreç
+# çalışabilir ve açık bir SSE bağlantısı veritabanı bağlantısı tutmaz.
+#
+# Yeniden bağlanan istemci Last-Event-ID başlığını gönderir; kaçırılan olaylar
+# user_events tablosundan okunur (REALTIME_EVENT_RETENTION süresi boyunca).
+#
+# Sıralama: event_id (BIGSERIAL) INSERT anında atanır, commit anında değil. Eşzamanlı iki
+# işlemden küçük id'li olan daha sonra commit edebilir; "son id'den büyükler" imleci bu
+# olayı kaçırır. Bu yüzden akış imleci (EventCursor) tek bir id değil, bir taban (floor:
+# bu id'ye kadar her şey teslim edildi ya da boşluk kapandı) ve tabanın üstünde teslim
+# edilmiş id'lerdir. Tabanın hemen üstündeki boşluk, ondan büyük bir id görüldükten
+# REALTIME_GAP_TIMEOUT saniye sonra kapanır. Aynı imleç SSE id alanında istemciye gider
+# ve Last-Event-ID ile geri gelir; tablodan yeniden okuma tabandan başlar.
+import json
+import queue
+from collections import OrderedDict
+import select
+import threading
+import time
+
+import psycopg2
+import psycopg2.extensions
+import psycopg2.extras
+
+from db_config import (
+    DB_HOST, DB_NAME, DB_USER, DB_PASSWORD,
+    REALTIME_ENABLED, REALTIME_HEARTBEAT_INTERVAL, REALTIME_RETRY_MS, REALTIME_SUBSCRIBER_QUEUE_SIZE,
+    REALTIME_EVENT_RETENTION, REALTIME_RECONNECT_DELAY, REALTIME_GAP_TIMEOUT,
+)
+from db_pool import get_pool
+from log_utils import get_logger, fields
+import metrics
+
+logger = get_logger(__name__)
+
+CHANNEL = 'solara_events'
+CATCH_UP_PAGE_SIZE = 500
+MESSAGE_PREVIEW_LENGTH = 200 # pg_notify yükü 8000 baytı aşmasın diye mesaj metni kısaltılır
+PRUNE_INTERVAL = 300 # Saniye; eski olaylar bu aralıkla silinir
+DELIVERED_ID_MEMORY = 1024 # Bağlantı başına hatırlanan son teslim edilmiş id sayısı (tekrar göndermemek için)
+MAX_PENDING_IDS = 64 # İmleçte tabanın üstünde tutulabilecek id sınırı; aşılırsa en eski boşluk kapatılır
+
+# Abonelik kuyruğuna konan işaret: "canlı akışta boşluk olabilir, tablodan yeniden oku"
+RESYNC = object()
+
+
+def publish(cursor, events):
+    """
+    Records events for delivery using the caller's cursor (and transaction).
+    `events` is a list of (user_id, kind, data) tuples; `data` must be JSON-serializable.
+    """
+    if not REALTIME_ENABLED or not events:
+        return
+    psycopg2.extras.execute_values(
+        cursor,
+        "INSERT INTO user_events (user_id, kind, data) VALUES %s;",
+        [(user_id, kind, psycopg2.extras.Json(data)) for user_id, kind, data in events]
+    )
+
+
+def message_event_data(message_id, sender_user_id, receiver_user_id, message_text, created_at):
+    return {
+        'message_id': message_id,
+        'sender_user_id': sender_user_id,
+        'receiver_user_id': receiver_user_id,
+        'message_preview': (message_text or '')[:MESSAGE_PREVIEW_LENGTH],
+        'created_at': created_at.isoformat() if created_at else None,
+    }
+
+
+def notification_event_data(row):
+    """Event payload for a notifications row (new or coalesced); clients re-fetch details if needed."""
+    return {
+        'notification_id': row['notification_id'],
+        'type': row['type'],
+        'actor_user_id': row['actor_user_id'],
+        'post_id': row.get('post_id'),
+        'comment_id': row.get('comment_id'),
+        'message_id': row.get('message_id'),
+        'follow_request_id': row.get('follow_request_id'),
+        'actor_count': row.get('actor_count', 1),
+        'created_at': row['created_at'].isoformat() if row.get('created_at') else None,
+        'updated_at': row['updated_at'].isoformat() if row.get('updated_at') else None,
+    }
+
+
+def events_since(conn, user_id, last_event_id, limit=CATCH_UP_PAGE_SIZE):
+    """
+    Returns up to `limit` stored events for the user with event_id > last_event_id, oldest first.
+    Used with EventCursor.floor: committed events above the floor may include ids already delivered.
+    """
+    with conn.cursor() as cursor:
+        cursor.execute(
+            """
+            SELECT event_id, kind, data FROM user_events
+            WHERE user_id = %s AND event_id > %s
+            ORDER BY event_id
+            LIMIT %s;
+            """,
+            (user_id, last_event_id, limit)
+        )
+        rows = cursor.fetchall()
+    conn.rollback()
+    return [{'id': event_id, 'kind': kind, 'data': data} for event_id, kind, data in rows]
+
+
+def latest_event_id(conn, user_id):
+    with conn.cursor() as cursor:
+        cursor.execute("SELECT COALESCE(MAX(event_id), 0) FROM user_events WHERE user_id = %s;", (user_id,))
+        event_id = cursor.fetchone()[0]
+    conn.rollback()
+    return event_id
+
+
+def prune_events(conn, max_age_seconds=REALTIME_EVENT_RETENTION):
+    """Deletes events older than the retention window. Returns the number of rows deleted."""
+    with conn.cursor() as cursor:
+        cursor.execute(
+            "DELETE FROM user_events WHERE created_at < NOW() - make_interval(secs => %s);",
+            (max_age_seconds,)
+        )
+        deleted = cursor.rowcount
+    conn.commit()
+    return deleted
+
+
+class EventCursor:
+    """
+    Position of one SSE stream: every event_id <= floor has been delivered (or its gap
+    has timed out), plus the ids above the floor that were delivered out of order.
+    """
+
+    def __init__(self, floor=0, pending=(), gap_timeout=REALTIME_GAP_TIMEOUT):
+        self.floor = floor
+        self.gap_timeout = gap_timeout
+        now = time.monotonic()
+        self._pending = {event_id: now for event_id in pending if event_id > floor} # id -> ilk görülme zamanı
+        self._delivered = OrderedDict((event_id, None) for event_id in self._pending)
+
+    @classmethod
+    def parse(cls, value):
+        """Parses a Last-Event-ID ('floor' or 'floor:id,id,...'); raises ValueError."""
+        floor, _, pending = value.partition(':')
+        return cls(int(floor), [int(event_id) for event_id in pending.split(',') if event_id])
+
+    def __str__(self):
+        if not self._pending:
+            return str(self.floor)
+        return f"{self.floor}:{','.join(str(event_id) for event_id in sorted(self._pending))}"
+
+    def is_new(self, event_id):
+        # Tabanın altındaki bir id de yeni olabilir: boşluğu zaman aşımıyla kapanmış, geç commit edilmiş olay
+        return event_id not in self._delivered
+
+    def delivered(self, event_id):
+        self._delivered[event_id] = None
+        while len(self._delivered) > DELIVERED_ID_MEMORY:
+            self._delivered.popitem(last=False)
+        if event_id > self.floor:
+            self._pending.setdefault(event_id, time.monotonic())
+        self._settle()
+
+    def _settle(self):
+        now = time.monotonic()
+        while self._pending:
+            lowest = min(self._pending)
+            # Aradaki id'lerin işlemleri `lowest` yazılmadan önce başladı; süre dolduysa artık beklenmez
+            if lowest == self.floor + 1 or len(self._pending) > MAX_PENDING_IDS \
+                    or now - self._pending[lowest] >= self.gap_timeout:
+                self.floor = lowest
+                del self._pending[lowest]
+            else:
+                break
+
+
+class Subscription:
+    """One connected SSE client: a bounded queue of events for a single user."""
+
+    def __init__(self, user_id, maxsize=REALTIME_SUBSCRIBER_QUEUE_SIZE):
+        self.user_id = user_id
+        self.queue = queue.Queue(maxsize=maxsize)
+
+    def deliver(self, event):
+        try:
+            self.queue.put_nowait(event)
+        except queue.Full:
+            # İstemci yetişemiyor: bekleyenleri at, bir sonraki okumada tablodan yeniden eşitlensin
+            self.resync()
+
+    def resync(self):
+        while True:
+            try:
+                self.queue.get_nowait()
+            except queue.Empty:
+                break
+        try:
+            self.queue.put_nowait(RESYNC)
+        except queue.Full:
+            pass
+
+
+class EventBroker:
+    """Background LISTEN thread that fans pg_notify events out to this process's subscriptions."""
+
+    def __init__(self, reconnect_delay=REALTIME_RECONNECT_DELAY, **connect_kwargs):
+        self.reconnect_delay = reconnect_delay
+        self._connect_kwargs = connect_kwargs or {
+            'host': DB_HOST, 'database': DB_NAME, 'user': DB_USER, 'password': DB_PASSWORD,
+        }
+        self._subscriptions = {} # user_id -> set(Subscription)
+        self._lock = threading.Lock()
+        self._thread = None
+        self._stopping = threading.Event()
+        self._last_prune = 0.0
+        self.events_received = 0
+        self.reconnects = 0
+
+    def start(self):
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._stopping.clear()
+            self._thread = threading.Thread(target=self._run, name="realtime-listener", daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout=5.0):
+        with self._lock:
+            thread, self._thread = self._thread, None
+        self._stopping.set()
+        if thread is not None:
+            thread.join(timeout)
+
+    def subscribe(self, user_id):
+        subscription = Subscription(user_id)
+        with self._lock:
+            self._subscriptions.setdefault(user_id, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscriptions = self._subscriptions.get(subscription.user_id)
+            if subscriptions is not None:
+                subscriptions.discard(subscription)
+                if not subscriptions:
+                    del self._subscriptions[subscription.user_id]
+
+    def _dispatch(self, payload):
+        try:
+            event = json.loads(payload)
+            user_id = event['user_id']
+        except (ValueError, KeyError, TypeError):
+            logger.error("realtime: ignoring malformed notify payload: %.200s", payload)
+            return
+        with self._lock:
+            subscriptions = list(self._subscriptions.get(user_id, ()))
+            self.events_received += 1
+        for subscription in subscriptions:
+            subscription.deliver(event)
+
+    def _resync_all(self):
+        with self._lock:
+            subscriptions = [s for group in self._subscriptions.values() for s in group]
+        for subscription in subscriptions:
+            subscription.resync()
+
+    def _prune_if_due(self):
+        now = time.monotonic()
+        if now - self._last_prune < PRUNE_INTERVAL:
+            return
+        self._last_prune = now
+        try:
+            with get_pool().connection() as conn:
+                deleted = prune_events(conn)
+            if deleted:
+                logger.debug("realtime: pruned %s old events.", deleted)
+        except psycopg2.Error as e:
+            logger.exception("realtime: pruning old events failed: %s", e)
+
+    def _listen(self):
+        conn = psycopg2.connect(**self._connect_kwargs)
+        try:
+            conn.set_isolation_level(psycopg2.extensions.ISOLATION_LEVEL_AUTOCOMMIT)
+            with conn.cursor() as cursor:
+                cursor.execute(f"LISTEN {CHANNEL};")
+            # Bağlantı yokken yayınlanan olaylar kaçırılmış olabilir
+            self._resync_all()
+            logger.info("realtime: listening for events.", extra=fields(channel=CHANNEL))
+            while not self._stopping.is_set():
+                if select.select([conn], [], [], 1.0) != ([], [], []):
+                    conn.poll()
+                    while conn.notifies:
+                        self._dispatch(conn.notifies.pop(0).payload)
+                self._prune_if_due()
+        finally:
+            conn.close()
+
+    def _run(self):
+        while not self._stopping.is_set():
+            try:
+                self._listen()
+            except (psycopg2.Error, OSError) as e:
+                self.reconnects += 1
+                logger.exception("realtime: listener connection lost: %s", e)
+                self._stopping.wait(self.reconnect_delay)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'subscribers': sum(len(group) for group in self._subscriptions.values()),
+                'users': len(self._subscriptions),
+                'events_received': self.events_received,
+                'reconnects': self.reconnects,
+            }
+
+
+_broker = None
+_broker_lock = threading.Lock()
+
+
+def get_broker():
+    """Returns the process-wide broker, starting its listener thread on first use."""
+    global _broker
+    if _broker is None:
+        with _broker_lock:
+            if _broker is None:
+                broker = EventBroker()
+                broker.start()
+                _broker = broker
+    return _broker
+
+
+metrics.register_stats('solara_realtime', lambda: get_broker().stats() if REALTIME_ENABLED else None, {
+    'subscribers': ('subscribers', 'gauge', 'Open SSE connections in this process.'),
+    'users': ('users', 'gauge', 'Distinct users with an open SSE connection.'),
+    'events_received': ('events_received_total', 'counter', 'Events received from the LISTEN connection.'),
+    'reconnects': ('listener_reconnects_total', 'counter', 'Times the LISTEN connection was re-established.'),
+})
+
+
+def _format_event(event, cursor):
+    return f"id: {cursor}\nevent: {event['kind']}\ndata: {json.dumps(event['data'], separators=(',', ':'))}\n\n"
+
+
+def sse_stream(user_id, cursor=None, broker=None):
+    """
+    Generator producing the text/event-stream body for one client. Events after
+    `cursor` (an EventCursor, from Last-Event-ID) are replayed from user_events
+    first; then live events follow.
+    """
+    broker = broker or get_broker()
+    # Önce abone ol, sonra tablodan oku: aradaki olaylar kuyrukta bekler, id ile tekilleştirilir
+    subscription = broker.subscribe(user_id)
+    try:
+        yield f"retry: {REALTIME_RETRY_MS}\n\n"
+        if cursor is None:
+            with get_pool().connection() as conn:
+                cursor = EventCursor(latest_event_id(conn, user_id))
+        pending_resync = True
+        while True:
+            if pending_resync:
+                pending_resync = False
+                after = cursor.floor
+                while True:
+                    with get_pool().connection() as conn: # Bağlantı yalnızca okuma süresince tutulur
+                        page = events_since(conn, user_id, after)
+                    for event in page:
+                        after = event['id']
+                        if cursor.is_new(event['id']):
+                            cursor.delivered(event['id'])
+                            yield _format_event(event, cursor)
+                    if len(page) < CATCH_UP_PAGE_SIZE:
+                        break
+            try:
+                event = subscription.queue.get(timeout=REALTIME_HEARTBEAT_INTERVAL)
+            except queue.Empty:
+                yield ": keepalive\n\n"
+                continue
+            if event is RESYNC:
+                pending_resync = True
+            elif cursor.is_new(event['id']):
+                cursor.delivered(event['id'])
+                yield _format_event(event, cursor)
+    finally:
+        broker.unsubscribe(subscription)
@@ -0,0 +1,95 @@
+# --- rows.py ---
+# Büyük sonuç kümeleri için sıkıştırılmış satır gösterimi.
+#
+# RealDictCursor her satır için ayrı bir dict (ve anahtar tablosu) oluşturur. Buradaki
+# CompactCursor ise satırları düz tuple olarak alır ve cursor.description'dan bir kez
+# üretilen Row alt sınıfıyla sarar: sütun adları ve ad -> konum tablosu sınıfta tek
+# kopya olarak durur, satır başına yalnızca tuple'ın kendisi kalır (__slots__ = ()).
+#
+# Row salt okunurdur ve dict gibi okunabilir (row['username'], row.get(...), keys(),
+# dict(row)); JSON'a çevrilirken serialization.py satırları parça başına bir kez
+# dict'e dönüştürür (to_dicts).
+import functools
+
+import psycopg2.extensions
+
+
+class Row(tuple):
+    """A result row: a tuple with read-only access by column name (see row_class)."""
+    __slots__ = ()
+    _fields = ()
+    _index = {}
+
+    def __getitem__(self, key):
+        if isinstance(key, str):
+            return tuple.__getitem__(self, self._index[key])
+        return tuple.__getitem__(self, key)
+
+    def __getattr__(self, name):
+        try:
+            return tuple.__getitem__(self, self._index[name])
+        except KeyError:
+            raise AttributeError(name) from None
+
+    def __contains__(self, key):
+        return key in self._index
+
+    def get(self, key, default=None):
+        i = self._index.get(key)
+        return default if i is None else tuple.__getitem__(self, i)
+
+    def keys(self):
+        return self._index.keys()
+
+    def items(self):
+        return ((name, tuple.__getitem__(self, i)) for name, i in self._index.items())
+
+    def _asdict(self):
+        return {name: tuple.__getitem__(self, i) for name, i in self._index.items()}
+
+    def __repr__(self):
+        return f"Row({self._asdict()!r})"
+
+
+@functools.lru_cache(maxsize=256)
+def row_class(fields):
+    """Returns the Row subclass for a tuple of column names (cached per distinct column list)."""
+    # Aynı adlı sütunlarda (ör. p.* ve p.created_at::TEXT AS created_at) RealDictCursor gibi sonuncusu geçerlidir
+    index = {name: i for i, name in enumerate(fields)}
+    return type('Row', (Row,), {'__slots__': (), '_fields': fields, '_index': index})
+
+
+class CompactCursor(psycopg2.extensions.cursor):
+    """Cursor whose fetch methods return Row tuples instead of one dict per row."""
+    _row_class = None
+
+    def execute(self, query, vars=None):
+        self._row_class = None
+        return super().execute(query, vars)
+
+    def _wrap(self, values):
+        cls = self._row_class
+        if cls is None:
+            # İsimli cursor'larda description ancak ilk FETCH'ten sonra bilinir
+            cls = self._row_class = row_class(tuple(column[0] for column in self.description))
+        return cls(values)
+
+    def fetchone(self):
+        values = super().fetchone()
+        return None if values is None else self._wrap(values)
+
+    def fetchmany(self, size=None):
+        batch = super().fetchmany(self.arraysize if size is None else size)
+        return [self._wrap(values) for values in batch]
+
+    def fetchall(self):
+        return [self._wrap(values) for values in super().fetchall()]
+
+    def __iter__(self):
+        for values in super().__iter__():
+            yield self._wrap(values)
+
+
+def to_dicts(rows):
+    """Converts a batch of rows (Row or dict) to plain dicts for JSON encoding."""
+    return [row._asdict() if isinstance(row, Row) else row for row in rows]
@@ -0,0 +1,103 @@
+# --- serialization.py ---
+# Liste uç noktaları için JSON kodlama ve akış (streaming) yanıtları.
+#
+# Satırlar db_utils'taki iter_* fonksiyonlarından sunucu tarafı cursor ile parça
+# parça (fetchmany) gelir; her parça kodlanıp hemen gönderilir. Böylece yanıtın
+# tamamı hiçbir zaman bellekte (önce dict listesi, sonra JSON metni olarak) tutulmaz.
+# Satırlar sıkıştırılmış tuple'lardır (rows.Row); dict'e yalnızca kodlanırken, parça
+# başına bir kez çevrilir.
+#
+# orjson kuruluysa kullanılır (datetime, date ve UUID'yi doğrudan ISO 8601 olarak
+# kodlar); yoksa standart json modülü aynı çıktıyı üretecek şekilde kullanılır.
+import json
+import uuid
+from datetime import date, datetime, time
+from decimal import Decimal
+
+from flask import Response, stream_with_context
+
+from rows import to_dicts
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def _default(value):
+    """Encodes the non-JSON types psycopg2 returns (orjson handles datetimes itself)."""
+    if isinstance(value, (datetime, date, time)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, uuid.UUID):
+        return str(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+if orjson is not None:
+    def dumps(value):
+        """Encodes `value` to compact UTF-8 JSON bytes."""
+        return orjson.dumps(value, default=_default)
+else:
+    _encoder = json.JSONEncoder(default=_default, separators=(',', ':'), ensure_ascii=False)
+
+    def dumps(value):
+        """Encodes `value` to compact UTF-8 JSON bytes."""
+        return _encoder.encode(value).encode('utf-8')
+
+
+def _encode_batch(batch, first):
+    # Parça tek seferde dict listesine çevrilip tek çağrıyla kodlanır; dış köşeli parantezler atılır
+    body = dumps(to_dicts(batch))[1:-1]
+    return body if first else b',' + body
+
+
+def _stream(batches, key, limit, next_cursor):
+    count = 0
+    last_row = None
+    has_more = False
+    try:
+        yield b'{' + dumps(key) + b':[' if key is not None else b'['
+        for batch in batches:
+            if limit is not None and count + len(batch) > limit:
+                # limit + 1'inci satır yalnızca sonraki sayfanın varlığını gösterir
+                has_more = True
+                batch = batch[:limit - count]
+            if batch:
+                yield _encode_batch(batch, count == 0)
+                count += len(batch)
+                last_row = batch[-1]
+            if has_more:
+                break
+    finally:
+        batches.close()
+    if key is None:
+        yield b']'
+    else:
+        cursor = next_cursor(last_row) if has_more and next_cursor is not None else None
+        yield b'],"next_cursor":' + dumps(cursor) + b'}'
+
+
+def json_stream_response(batches, key=None, limit=None, next_cursor=None, status=200):
+    """
+    Streams row batches (a generator of lists of rows, see db_utils.iter_*) as a
+    chunked JSON response: a bare array, or {key: [...], "next_cursor": ...} when
+    `key` is given. With `limit`, the caller fetches limit + 1 rows; an extra row
+    sets next_cursor to next_cursor(last row of the page).
+
+    The first batch is read before the response starts, so query errors still
+    reach the caller as exceptions (and can become a 500); later ones end the stream.
+    """
+    first = next(batches, None)
+
+    def chained():
+        try:
+            if first is not None:
+                yield first
+            yield from batches
+        finally:
+            batches.close()
+
+    body = _stream(chained(), key, limit, next_cursor)
+    return Response(stream_with_context(body), status=status, mimetype='application/json')
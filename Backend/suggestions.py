@@ -0,0 +1,280 @@
+# --- suggestions.py ---
+# Takip önerileri ("tanıyor olabileceğin kişiler").
+# Adaylar arkadaşın arkadaşlarıdır: takip ettiğin kişilerin takip ettikleri. Puan,
+# ortak bağlantı sayısı ile adayın popülerliğinin (ln(1 + takipçi)) ağırlıklı
+# toplamıdır; az bağlantısı olan kullanıcılar için en popüler hesaplar aday havuzuna
+# eklenir. Sonuçlar kullanıcı başına en iyi SUGGESTIONS_TOP_K satır olarak
+# user_suggestions tablosuna yazılır; /api/suggested_users yalnızca bu listeyi okur.
+# Hesaplama zamanı user_suggestions_state'e kaydedilir, böylece aday bulunamayan
+# kullanıcıların boş listesi "hiç hesaplanmadı" ile karışmaz.
+#
+# Güncellik: follows tablosundaki tetikleyici takip eden kullanıcıyı
+# suggestion_refresh_queue kuyruğuna ekler (takip edilen kişi listeden hemen düşer);
+# kuyruk SuggestionRefresher tarafından artımlı olarak işlenir. İki adım ötedeki
+# değişiklikler (takip ettiğin birinin yeni takipleri) periyodik toplu işle yansır.
+#
+# Kullanım: python suggestions.py run|refresh-pending|rebuild [batch_size]
+import sys
+import threading
+import time
+
+import psycopg2
+
+from db_config import (
+    SUGGESTIONS_TOP_K, SUGGESTIONS_MUTUAL_WEIGHT, SUGGESTIONS_POPULARITY_WEIGHT, SUGGESTIONS_MAX_FOLLOWEES,
+    SUGGESTIONS_POPULAR_POOL, SUGGESTIONS_REFRESH_INTERVAL, SUGGESTIONS_BATCH_SIZE,
+)
+from db_pool import get_pool
+from log_utils import get_logger, fields
+
+logger = get_logger(__name__)
+
+COMPUTE_SQL = """
+    WITH targets AS (
+        SELECT DISTINCT unnest(%(user_ids)s::INT[]) AS user_id
+    ),
+    followees AS (
+        -- Çok takip eden hesaplarda yalnızca en son takip edilenler kullanılır
+        SELECT t.user_id, f1.followed_user_id
+        FROM targets t
+        CROSS JOIN LATERAL (
+            SELECT f.followed_user_id FROM follows f
+            WHERE f.follower_user_id = t.user_id
+            ORDER BY f.created_at DESC
+            LIMIT %(max_followees)s
+        ) f1
+    ),
+    friends_of_friends AS (
+        SELECT fe.user_id, f2.followed_user_id AS candidate, COUNT(*) AS mutual_count
+        FROM followees fe
+        JOIN follows f2 ON f2.follower_user_id = fe.followed_user_id
+        GROUP BY fe.user_id, f2.followed_user_id
+    ),
+    popular AS (
+        SELECT t.user_id, us.user_id AS candidate, 0 AS mutual_count
+        FROM targets t
+        CROSS JOIN (
+            SELECT user_id FROM user_stats
+            ORDER BY followers_count DESC, user_id
+            LIMIT %(popular_pool)s
+        ) us
+    ),
+    candidates AS (
+        SELECT DISTINCT ON (user_id, candidate) user_id, candidate, mutual_count
+        FROM (SELECT * FROM friends_of_friends UNION ALL SELECT * FROM popular) c
+        ORDER BY user_id, candidate, mutual_count DESC
+    ),
+    scored AS (
+        SELECT c.user_id, c.candidate, c.mutual_count,
+               c.mutual_count * %(mutual_weight)s
+                   + ln(1 + COALESCE(us.followers_count, 0)) * %(popularity_weight)s AS score
+        FROM candidates c
+        LEFT JOIN user_stats us ON us.user_id = c.candidate
+        WHERE c.candidate <> c.user_id
+          AND NOT EXISTS (
+              SELECT 1 FROM follows x
+              WHERE x.follower_user_id = c.user_id AND x.followed_user_id = c.candidate
+          )
+          AND NOT EXISTS (
+              SELECT 1 FROM follow_requests r
+              WHERE r.requester_user_id = c.user_id AND r.recipient_user_id = c.candidate
+          )
+    ),
+    ranked AS (
+        SELECT s.*, row_number() OVER (PARTITION BY s.user_id ORDER BY s.score DESC, s.candidate) AS rn
+        FROM scored s
+    )
+    INSERT INTO user_suggestions (user_id, suggested_user_id, score, mutual_count)
+    SELECT user_id, candidate, score, mutual_count
+    FROM ranked
+    WHERE rn <= %(top_k)s
+    ON CONFLICT (user_id, suggested_user_id) DO NOTHING;
+"""
+
+# Aynı kullanıcının listesini eşzamanlı hesaplayan işlemleri sıraya sokan advisory lock sınıfı
+# (iki int4 anahtarlı biçim: (SUGGESTIONS_LOCK_CLASS, user_id))
+SUGGESTIONS_LOCK_CLASS = 7351002
+
+
+def compute_for_users(conn, user_ids, top_k=SUGGESTIONS_TOP_K):
+    """
+    Recomputes the suggestion lists of `user_ids` in one transaction (replacing the
+    old rows), records the computation in user_suggestions_state and commits.
+    Concurrent computations for the same user are serialized with a transaction-level
+    advisory lock. Returns the number of suggestion rows written.
+    """
+    if not user_ids:
+        return 0
+    user_ids = sorted(set(user_ids)) # Kilitler hep aynı sırada alınır (kilitlenme olmaz)
+    with conn.cursor() as cursor:
+        cursor.execute(
+            "SELECT pg_advisory_xact_lock(%s, user_id) FROM unnest(%s::INT[]) AS user_id ORDER BY user_id;",
+            (SUGGESTIONS_LOCK_CLASS, user_ids)
+        )
+        cursor.execute("DELETE FROM user_suggestions WHERE user_id = ANY(%s);", (user_ids,))
+        cursor.execute(COMPUTE_SQL, {
+            'user_ids': user_ids,
+            'max_followees': SUGGESTIONS_MAX_FOLLOWEES,
+            'popular_pool': SUGGESTIONS_POPULAR_POOL,
+            'mutual_weight': SUGGESTIONS_MUTUAL_WEIGHT,
+            'popularity_weight': SUGGESTIONS_POPULARITY_WEIGHT,
+            'top_k': top_k,
+        })
+        written = cursor.rowcount
+        # Boş liste de bir sonuçtur: okuma anında yeniden hesaplanmaz
+        cursor.execute(
+            """
+            INSERT INTO user_suggestions_state (user_id, computed_at)
+            SELECT user_id, NOW() FROM unnest(%s::INT[]) AS user_id
+            ON CONFLICT (user_id) DO UPDATE SET computed_at = EXCLUDED.computed_at;
+            """,
+            (user_ids,)
+        )
+    conn.commit()
+    return written
+
+
+def refresh_pending(conn, batch_size=SUGGESTIONS_BATCH_SIZE):
+    """
+    Claims up to `batch_size` users from suggestion_refresh_queue (SKIP LOCKED, so
+    several workers can run) and recomputes their lists in the same transaction.
+    Returns the number of users refreshed.
+    """
+    with conn.cursor() as cursor:
+        cursor.execute(
+            """
+            DELETE FROM suggestion_refresh_queue
+            WHERE user_id IN (
+                SELECT user_id FROM suggestion_refresh_queue
+                ORDER BY enqueued_at
+                LIMIT %s
+                FOR UPDATE SKIP LOCKED
+            )
+            RETURNING user_id;
+            """,
+            (batch_size,)
+        )
+        user_ids = [row[0] for row in cursor.fetchall()]
+    if not user_ids:
+        conn.commit()
+        return 0
+    compute_for_users(conn, user_ids) # Kuyruktan silme ile aynı işlemde commit edilir
+    return len(user_ids)
+
+
+def rebuild_all(conn, batch_size=SUGGESTIONS_BATCH_SIZE):
+    """Periodic batch job: recomputes every user's list in user_id ranges. Returns the number of users processed."""
+    processed = 0
+    last_user_id = 0
+    with conn.cursor() as cursor:
+        while True:
+            cursor.execute(
+                "SELECT user_id FROM users WHERE user_id > %s ORDER BY user_id LIMIT %s;",
+                (last_user_id, batch_size)
+            )
+            user_ids = [row[0] for row in cursor.fetchall()]
+            if not user_ids:
+                break
+            compute_for_users(conn, user_ids)
+            processed += len(user_ids)
+            last_user_id = user_ids[-1]
+    conn.commit()
+    logger.info("rebuild_all: suggestions recomputed.", extra=fields(users=processed))
+    return processed
+
+
+class SuggestionRefresher:
+    """Background thread that drains suggestion_refresh_queue."""
+
+    def __init__(self, batch_size=SUGGESTIONS_BATCH_SIZE, poll_interval=SUGGESTIONS_REFRESH_INTERVAL):
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self._stopping = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+        self.refreshed = 0
+        self.errors = 0
+
+    def start(self):
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._stopping.clear()
+            self._thread = threading.Thread(target=self._run, name="suggestion-refresh", daemon=True)
+            self._thread.start()
+        logger.info("Suggestion refresher started.", extra=fields(batch_size=self.batch_size))
+
+    def stop(self, timeout=5.0):
+        with self._lock:
+            thread, self._thread = self._thread, None
+        self._stopping.set()
+        if thread is not None:
+            thread.join(timeout)
+
+    def _run(self):
+        while not self._stopping.is_set():
+            try:
+                with get_pool().connection() as conn:
+                    while not self._stopping.is_set():
+                        refreshed = refresh_pending(conn, self.batch_size)
+                        with self._lock:
+                            self.refreshed += refreshed
+                        if refreshed < self.batch_size:
+                            break
+            except psycopg2.Error as e:
+                with self._lock:
+                    self.errors += 1
+                logger.exception("Suggestion refresh failed: %s", e)
+            self._stopping.wait(self.poll_interval)
+
+    def stats(self):
+        with self._lock:
+            return {'refreshed': self.refreshed, 'errors': self.errors}
+
+
+_refresher = None
+_refresher_lock = threading.Lock()
+
+
+def get_refresher():
+    """Returns the process-wide refresher, creating it (not started) on first use."""
+    global _refresher
+    if _refresher is None:
+        with _refresher_lock:
+            if _refresher is None:
+                _refresher = SuggestionRefresher()
+    return _refresher
+
+
+if __name__ == '__main__':
+    command = sys.argv[1] if len(sys.argv) > 1 else 'run'
+    batch_size = int(sys.argv[2]) if len(sys.argv) > 2 else SUGGESTIONS_BATCH_SIZE
+    if command == 'run':
+        refresher = SuggestionRefresher(batch_size)
+        refresher.start()
+        try:
+            while True:
+                time.sleep(60)
+                logger.info("Suggestion refresher stats.", extra=fields(**refresher.stats()))
+        except KeyboardInterrupt:
+            refresher.stop()
+    elif command in ('refresh-pending', 'rebuild'):
+        with get_pool().connection() as conn:
+            try:
+                if command == 'rebuild':
+                    rebuild_all(conn, batch_size)
+                else:
+                    total = 0
+                    while True:
+                        refreshed = refresh_pending(conn, batch_size)
+                        total += refreshed
+                        if refreshed < batch_size:
+                            break
+                    print(f"--- Refreshed suggestions for {total} users. ---")
+            except psycopg2.Error as e:
+                logger.exception("%s failed: %s", command, e)
+                conn.rollback()
+                sys.exit(1)
+    else:
+        print("Usage: python suggestions.py run|refresh-pending|rebuild [batch_size]")
+        sys.exit(2)
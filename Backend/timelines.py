@@ -0,0 +1,187 @@
+# --- timelines.py ---
+# Fan-out-on-write ana sayfa zaman çizelgeleri.
+# Bir gönderi oluşturulduğunda post_id, yazarın takipçilerinin timeline_entries
+# kayıtlarına yazılır; ana sayfa akışı böylece takip edilen herkesin gönderilerini
+# sıralamak yerine (user_id, post_created_at, post_id) indeksinde sınırlı bir
+# aralık taraması olur. Çok takipçisi olan yazarlar timeline_pull_authors
+# tablosuna alınır ve onların gönderileri okuma anında birleştirilir.
+#
+# Buradaki yardımcılar çağıranın bağlantısını (ve işlemini) kullanır; commit
+# çağıranın sorumluluğundadır.
+import psycopg2
+
+from db_config import TIMELINE_FANOUT_MAX_FOLLOWERS, TIMELINE_BACKFILL_POSTS, TIMELINE_MAX_ENTRIES
+from log_utils import get_logger
+
+logger = get_logger(__name__)
+
+
+def fan_out_post(conn, author_user_id, post_id):
+    """Pushes a new post into the timelines of the author's followers, or marks the author for merge-at-read."""
+    with conn.cursor() as cursor:
+        # Takipçi sayısı tetikleyicilerle tutulan user_stats'tan okunur (COUNT(*) yerine)
+        cursor.execute("SELECT followers_count FROM user_stats WHERE user_id = %s;", (author_user_id,))
+        row = cursor.fetchone()
+        followers_count = row[0] if row else 0
+        if followers_count > TIMELINE_FANOUT_MAX_FOLLOWERS:
+            # Çok takipçili hesap: yazma anında dağıtma, okuma anında birleştir
+            cursor.execute(
+                "INSERT INTO timeline_pull_authors (user_id) VALUES (%s) ON CONFLICT (user_id) DO NOTHING;",
+                (author_user_id,)
+            )
+            logger.debug("fan_out_post: user %s has %s followers, post %s will be merged at read time.", author_user_id, followers_count, post_id)
+            return 0
+        cursor.execute(
+            """
+            INSERT INTO timeline_entries (user_id, post_id, author_user_id, post_created_at)
+            SELECT f.follower_user_id, p.post_id, p.user_id, p.created_at
+            FROM follows f
+            JOIN posts p ON p.post_id = %(post_id)s
+            WHERE f.followed_user_id = %(author_user_id)s
+            ON CONFLICT (user_id, post_id) DO NOTHING;
+            """,
+            {'post_id': post_id, 'author_user_id': author_user_id}
+        )
+        logger.debug("fan_out_post: post %s pushed into %s timelines.", post_id, cursor.rowcount)
+        return cursor.rowcount
+
+
+def backfill_follow(conn, follower_user_id, followed_user_id):
+    """Copies the followed user's most recent posts into the follower's timeline after a new follow."""
+    with conn.cursor() as cursor:
+        cursor.execute(
+            """
+            INSERT INTO timeline_entries (user_id, post_id, author_user_id, post_created_at)
+            SELECT %(follower_user_id)s, p.post_id, p.user_id, p.created_at
+            FROM posts p
+            WHERE p.user_id = %(followed_user_id)s
+              AND NOT EXISTS (SELECT 1 FROM timeline_pull_authors pa WHERE pa.user_id = p.user_id)
+            ORDER BY p.created_at DESC, p.post_id DESC
+            LIMIT %(limit)s
+            ON CONFLICT (user_id, post_id) DO NOTHING;
+            """,
+            {'follower_user_id': follower_user_id, 'followed_user_id': followed_user_id, 'limit': TIMELINE_BACKFILL_POSTS}
+        )
+        logger.debug("backfill_follow: %s posts of user %s added to timeline of %s.", cursor.rowcount, followed_user_id, follower_user_id)
+        return cursor.rowcount
+
+
+def prune_follow(conn, follower_user_id, followed_user_id):
+    """Removes the unfollowed user's posts from the follower's timeline."""
+    with conn.cursor() as cursor:
+        cursor.execute(
+            "DELETE FROM timeline_entries WHERE user_id = %s AND author_user_id = %s;",
+            (follower_user_id, followed_user_id)
+        )
+        logger.debug("prune_follow: %s entries of user %s removed from timeline of %s.", cursor.rowcount, followed_user_id, follower_user_id)
+        return cursor.rowcount
+
+
+def timeline_page_sql(keyset):
+    """
+    Returns a subquery selecting (post_id) for one feed page: a bounded range scan of the
+    reader's timeline merged with the newest posts of followed pull authors.
+    Expects the %(current_user_id)s and %(limit)s parameters, plus
+    %(before_created_at)s / %(before_post_id)s when `keyset` is True.
+    """
+    timeline_keyset = ""
+    pull_keyset = ""
+    if keyset:
+        timeline_keyset = "AND (te.post_created_at, te.post_id) < (%(before_created_at)s::timestamptz, %(before_post_id)s)"
+        pull_keyset = "AND (pp.created_at, pp.post_id) < (%(before_created_at)s::timestamptz, %(before_post_id)s)"
+    # UNION (ALL değil): bir yazar sonradan pull listesine alınırsa eski gönderileri iki kaynakta da olabilir
+    return f"""
+        (
+            SELECT te.post_id
+            FROM timeline_entries te
+            WHERE te.user_id = %(current_user_id)s
+            {timeline_keyset}
+            ORDER BY te.post_created_at DESC, te.post_id DESC
+            LIMIT %(limit)s
+        )
+        UNION
+        (
+            SELECT pp.post_id
+            FROM follows f
+            JOIN timeline_pull_authors pa ON pa.user_id = f.followed_user_id
+            JOIN posts pp ON pp.user_id = f.followed_user_id
+            WHERE f.follower_user_id = %(current_user_id)s
+            {pull_keyset}
+            ORDER BY pp.created_at DESC, pp.post_id DESC
+            LIMIT %(limit)s
+        )
+    """
+
+
+def rebuild_timelines(conn):
+    """Rebuilds every timeline from the follows table (use after enabling fan-out on an existing database)."""
+    with conn.cursor() as cursor:
+        cursor.execute("TRUNCATE timeline_entries;")
+        cursor.execute(
+            """
+            INSERT INTO timeline_pull_authors (user_id)
+            SELECT followed_user_id FROM follows
+            GROUP BY followed_user_id
+            HAVING COUNT(*) > %s
+            ON CONFLICT (user_id) DO NOTHING;
+            """,
+            (TIMELINE_FANOUT_MAX_FOLLOWERS,)
+        )
+        cursor.execute(
+            """
+            INSERT INTO timeline_entries (user_id, post_id, author_user_id, post_created_at)
+            SELECT follower_user_id, post_id, user_id, created_at
+            FROM (
+                SELECT f.follower_user_id, p.post_id, p.user_id, p.created_at,
+                       ROW_NUMBER() OVER (PARTITION BY f.follower_user_id ORDER BY p.created_at DESC, p.post_id DESC) AS rn
+                FROM follows f
+                JOIN posts p ON p.user_id = f.followed_user_id
+                WHERE NOT EXISTS (SELECT 1 FROM timeline_pull_authors pa WHERE pa.user_id = f.followed_user_id)
+            ) ranked
+            WHERE rn <= %s;
+            """,
+            (TIMELINE_MAX_ENTRIES,)
+        )
+        return cursor.rowcount
+
+
+def trim_timelines(conn):
+    """Deletes timeline entries beyond the newest TIMELINE_MAX_ENTRIES per user."""
+    with conn.cursor() as cursor:
+        cursor.execute(
+            """
+            DELETE FROM timeline_entries te
+            USING (
+                SELECT user_id, post_id,
+                       ROW_NUMBER() OVER (PARTITION BY user_id ORDER BY post_created_at DESC, post_id DESC) AS rn
+                FROM timeline_entries
+            ) ranked
+            WHERE te.user_id = ranked.user_id AND te.post_id = ranked.post_id AND ranked.rn > %s;
+            """,
+            (TIMELINE_MAX_ENTRIES,)
+        )
+        return cursor.rowcount
+
+
+# Bakım işleri: python timelines.py rebuild | trim
+if __name__ == '__main__':
+    import sys
+    from db_pool import get_pool
+
+    command = sys.argv[1] if len(sys.argv) > 1 else 'trim'
+    if command not in ('rebuild', 'trim'):
+        print("Usage: python timelines.py [rebuild|trim]")
+        sys.exit(2)
+    with get_pool().connection() as conn:
+        try:
+            if command == 'rebuild':
+                count = rebuild_timelines(conn)
+                logger.info("Timelines rebuilt: %s entries written.", count)
+            else:
+                count = trim_timelines(conn)
+                logger.info("Timelines trimmed: %s entries deleted.", count)
+            conn.commit()
+        except psycopg2.Error as e:
+            logger.exception("Timeline maintenance failed: %s", e)
+            conn.rollback()
+            sys.exit(1)
@@ -0,0 +1,440 @@
+# --- user_index.py ---
+# Kullanıcı adı / ad soyad önek araması için süreç içi, sıkıştırılmış indeks.
+# /api/users/search her tuş vuruşunda Postgres'e gitmek yerine buradan cevaplanır
+# (USER_INDEX_ENABLED = True iken; indeks yüklenene kadar SQL aramasına düşülür).
+#
+# Yerleşim: anahtarlar (küçük harfli kullanıcı adı, ad soyad ve soyadı parçaları)
+# UTF-8 bayt sırasına göre sıralanıp tek bir bytes bloğunda tutulur; yanında
+# array('I') ofsetleri ve array('i') user_id'leri vardır. Düğüm başına sözlük ya da
+# anahtar başına Python nesnesi yoktur; bellek kabaca anahtar uzunluğu + 9 bayttır.
+# Görüntülenen alanlar (kullanıcı adı, ad, profil resmi) da user_id sırasıyla aynı
+# biçimde ayrı bir blokta saklanır.
+#
+# Güncellemeler: create_user ve update_user_profile bu süreçteki indeksi hemen
+# günceller (note_user); diğer süreçlerdeki değişiklikler arka plan iş parçacığı
+# tarafından users.updated_at üzerinden periyodik olarak okunur. Değişiklikler küçük
+# bir "delta" katmanında birikir; USER_INDEX_MAX_DELTA aşılınca ya da
+# USER_INDEX_REBUILD_INTERVAL dolunca ana bloklar yeniden kurulur.
+import bisect
+import threading
+import time
+from array import array
+from datetime import timedelta
+
+import psycopg2
+
+from db_config import (
+    USER_INDEX_ENABLED, USER_INDEX_REFRESH_INTERVAL, USER_INDEX_REBUILD_INTERVAL, USER_INDEX_MAX_DELTA,
+    USER_SEARCH_DEFAULT_LIMIT, USER_SEARCH_MAX_LIMIT, USER_SEARCH_CANDIDATES,
+)
+from db_pool import get_pool
+from log_utils import get_logger, fields
+import metrics
+
+logger = get_logger(__name__)
+
+KIND_USERNAME = 0
+KIND_NAME = 1
+FIELD_SEPARATOR = '\x1f'
+LOAD_BATCH_SIZE = 10000
+REFRESH_OVERLAP = timedelta(seconds=5) # Geç commit edilen işlemleri kaçırmamak için watermark geriye kaydırılır
+FOLLOW_RERANK_FACTOR = 3
+PREFIX_END = b'\xff' # UTF-8'de hiç geçmeyen bayt: önek aralığının üst sınırı
+
+
+def _normalize(text):
+    return ' '.join((text or '').lower().split())
+
+
+def _keys_for(username, full_name):
+    """Yields (key_bytes, kind) pairs under which a user is findable."""
+    if username:
+        yield _normalize(username).encode('utf-8'), KIND_USERNAME
+    name = _normalize(full_name)
+    if name:
+        yield name.encode('utf-8'), KIND_NAME
+        for token in name.split(' ')[1:]: # Soyadı (ve ikinci ad) ile de bulunabilsin
+            yield token.encode('utf-8'), KIND_NAME
+
+
+def _pack(username, full_name, profile_picture_url):
+    return FIELD_SEPARATOR.join((username or '', full_name or '', profile_picture_url or '')).encode('utf-8')
+
+
+def _unpack(user_id, data):
+    username, full_name, profile_picture_url = data.decode('utf-8').split(FIELD_SEPARATOR)
+    return {
+        'user_id': user_id,
+        'username': username,
+        'full_name': full_name or None,
+        'profile_picture_url': profile_picture_url or None,
+    }
+
+
+def _fields(user_id, data):
+    row = _unpack(user_id, data)
+    return user_id, row['username'], row['full_name'], row['profile_picture_url']
+
+
+class _PackedArray:
+    """Immutable list of byte strings stored in one blob with an offsets array."""
+    __slots__ = ('blob', 'offsets')
+
+    def __init__(self, items):
+        blob = bytearray()
+        offsets = array('I', [0])
+        for item in items:
+            blob += item
+            offsets.append(len(blob))
+        self.blob = bytes(blob)
+        self.offsets = offsets
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i):
+        return self.blob[self.offsets[i]:self.offsets[i + 1]]
+
+    def nbytes(self):
+        return len(self.blob) + self.offsets.itemsize * len(self.offsets)
+
+
+class _Segment:
+    """
+    Immutable snapshot: sorted search keys (keys/key_ids/kinds) and display
+    records sorted by user_id (record_ids/records).
+    """
+    __slots__ = ('keys', 'key_ids', 'kinds', 'record_ids', 'records')
+
+    def __init__(self, records):
+        """`records` is an iterable of (user_id, username, full_name, profile_picture_url) in user_id order."""
+        record_ids = array('i')
+        packed = []
+        entries = []
+        for user_id, username, full_name, profile_picture_url in records:
+            record_ids.append(user_id)
+            packed.append(_pack(username, full_name, profile_picture_url))
+            entries.extend((key, user_id, kind) for key, kind in _keys_for(username, full_name))
+        entries.sort()
+        self.keys = _PackedArray(entry[0] for entry in entries)
+        self.key_ids = array('i', (entry[1] for entry in entries))
+        self.kinds = array('B', (entry[2] for entry in entries))
+        self.record_ids = record_ids
+        self.records = _PackedArray(packed)
+
+    def __len__(self):
+        return len(self.record_ids)
+
+    def record(self, user_id):
+        i = bisect.bisect_left(self.record_ids, user_id)
+        if i < len(self.record_ids) and self.record_ids[i] == user_id:
+            return self.records[i]
+        return None
+
+    def iter_records(self):
+        for i in range(len(self.record_ids)):
+            yield self.record_ids[i], self.records[i]
+
+    def scan(self, prefix):
+        """Yields (key, user_id, kind) for keys starting with `prefix`, in key order."""
+        i = bisect.bisect_left(self.keys, prefix)
+        end = bisect.bisect_left(self.keys, prefix + PREFIX_END, i)
+        for j in range(i, end):
+            yield self.keys[j], self.key_ids[j], self.kinds[j]
+
+    def nbytes(self):
+        return (self.keys.nbytes() + self.records.nbytes() + self.key_ids.itemsize * len(self.key_ids)
+                + self.kinds.itemsize * len(self.kinds) + self.record_ids.itemsize * len(self.record_ids))
+
+
+class UserIndex:
+    """Prefix index over usernames and full names with a small mutable overlay."""
+
+    def __init__(self, max_delta=USER_INDEX_MAX_DELTA):
+        self.max_delta = max_delta
+        self._segment = None
+        self._overrides = {} # user_id -> packed record (None: kullanıcı kaldırıldı)
+        self._delta_keys = [] # sorted [(key, user_id, kind)] for overridden users
+        self._lock = threading.Lock()
+        self._thread = None
+        self._stopping = threading.Event()
+        self._compact_requested = threading.Event()
+        self.watermark = None
+        self.loaded_at = None
+        self.rebuilds = 0
+        self.lookups = 0
+
+    @property
+    def ready(self):
+        return self._segment is not None
+
+    # --- Okuma ---
+
+    def lookup(self, query, limit, exclude_user_id=None):
+        """
+        Returns up to `limit` matching users as dicts (user_id, username, full_name,
+        profile_picture_url, exact, username_match), best first, or None while the
+        index is still loading.
+        """
+        prefix = _normalize(query).encode('utf-8')
+        if not prefix:
+            return []
+        with self._lock:
+            # _apply/compact referansları değiştirir, nesneleri yerinde değiştirmez; kilit yalnızca anlık görüntü için
+            segment, overrides, delta_keys = self._segment, self._overrides, self._delta_keys
+            self.lookups += 1
+        if segment is None:
+            return None
+        # user_id -> (tam eşleşme değil, tür, anahtar uzunluğu, anahtar); en iyi eşleşme tutulur
+        best = {}
+        scanned = 0
+        for key, user_id, kind in segment.scan(prefix):
+            if scanned >= USER_SEARCH_CANDIDATES:
+                break
+            scanned += 1
+            if user_id in overrides or user_id == exclude_user_id:
+                continue
+            rank = (key != prefix, kind, len(key), key)
+            if user_id not in best or rank < best[user_id]:
+                best[user_id] = rank
+        i = bisect.bisect_left(delta_keys, (prefix,))
+        while i < len(delta_keys) and delta_keys[i][0].startswith(prefix):
+            key, user_id, kind = delta_keys[i]
+            i += 1
+            if user_id == exclude_user_id:
+                continue
+            rank = (key != prefix, kind, len(key), key)
+            if user_id not in best or rank < best[user_id]:
+                best[user_id] = rank
+        # Yalnızca döndürülecek kayıtlar çözülür
+        results = []
+        for user_id, (inexact, kind, _, _) in sorted(best.items(), key=lambda item: item[1])[:limit]:
+            data = overrides[user_id] if user_id in overrides else segment.record(user_id)
+            if data is None:
+                continue
+            row = _unpack(user_id, data)
+            row['exact'] = not inexact
+            row['username_match'] = kind == KIND_USERNAME
+            results.append(row)
+        return results
+
+    # --- Yazma ---
+
+    def note_user(self, user_id, username, full_name=None, profile_picture_url=None):
+        """Records a created or changed user (visible to lookups immediately)."""
+        self._apply([(user_id, username, full_name, profile_picture_url)])
+
+    def remove_user(self, user_id):
+        self._apply([(user_id, None, None, None)])
+
+    def _apply(self, rows):
+        with self._lock:
+            overrides = dict(self._overrides)
+            changed = {row[0] for row in rows}
+            delta_keys = [entry for entry in self._delta_keys if entry[1] not in changed]
+            for user_id, username, full_name, profile_picture_url in rows:
+                if username is None:
+                    overrides[user_id] = None
+                    continue
+                overrides[user_id] = _pack(username, full_name, profile_picture_url)
+                delta_keys.extend((key, user_id, kind) for key, kind in _keys_for(username, full_name))
+            delta_keys.sort()
+            # Okuyucular kilit altında referansları alır; yeni nesneler atomik olarak değiştirilir
+            self._overrides, self._delta_keys = overrides, delta_keys
+            if len(overrides) > self.max_delta:
+                self._compact_requested.set()
+
+    def compact(self):
+        """Folds the overlay into a new segment. Runs outside the lock; lookups continue meanwhile."""
+        with self._lock:
+            segment, overrides = self._segment, self._overrides
+        if segment is None:
+            return
+
+        def merged():
+            pending = sorted(overrides)
+            p = 0
+            for user_id, data in segment.iter_records():
+                while p < len(pending) and pending[p] < user_id:
+                    if overrides[pending[p]] is not None:
+                        yield _fields(pending[p], overrides[pending[p]])
+                    p += 1
+                if p < len(pending) and pending[p] == user_id:
+                    data = overrides[user_id]
+                    p += 1
+                    if data is None:
+                        continue
+                yield _fields(user_id, data)
+            for user_id in pending[p:]:
+                if overrides[user_id] is not None:
+                    yield _fields(user_id, overrides[user_id])
+
+        self._compact_requested.clear()
+        new_segment = _Segment(merged())
+        with self._lock:
+            # Derleme sırasında gelen değişiklikler overlay'de kalır
+            remaining = {uid: data for uid, data in self._overrides.items() if overrides.get(uid, 0) is not data}
+            self._segment = new_segment
+            self._overrides = remaining
+            self._delta_keys = [entry for entry in self._delta_keys if entry[1] in remaining]
+        self.rebuilds += 1
+
+    # --- Veritabanından yükleme ---
+
+    def load(self, conn):
+        """Builds the segment from the users table (server-side cursor, bounded client memory)."""
+        started = time.perf_counter()
+        with conn.cursor() as cursor:
+            cursor.execute("SELECT NOW();")
+            watermark = cursor.fetchone()[0]
+        with conn.cursor(name='user_index_load') as cursor:
+            cursor.itersize = LOAD_BATCH_SIZE
+            cursor.execute("SELECT user_id, username, full_name, profile_picture_url FROM users ORDER BY user_id;")
+            segment = _Segment(cursor)
+        conn.rollback()
+        with self._lock:
+            self._segment = segment
+            self._overrides = {}
+            self._delta_keys = []
+        self.watermark = watermark - REFRESH_OVERLAP
+        self.loaded_at = time.monotonic()
+        self.rebuilds += 1
+        logger.info("user_index: loaded.", extra=fields(users=len(segment), bytes=segment.nbytes(),
+                                                         duration_ms=round((time.perf_counter() - started) * 1000, 1)))
+
+    def refresh(self, conn):
+        """Applies users created or changed since the last refresh. Returns the number of rows applied."""
+        with conn.cursor() as cursor:
+            cursor.execute("SELECT NOW();")
+            now = cursor.fetchone()[0]
+            cursor.execute(
+                """
+                SELECT user_id, username, full_name, profile_picture_url FROM users
+                WHERE updated_at >= %s;
+                """,
+                (self.watermark,)
+            )
+            rows = cursor.fetchall()
+        conn.rollback()
+        if rows:
+            self._apply(rows)
+        self.watermark = now - REFRESH_OVERLAP
+        return len(rows)
+
+    # --- Arka plan iş parçacığı ---
+
+    def start(self):
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._stopping.clear()
+            self._thread = threading.Thread(target=self._run, name="user-index", daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout=5.0):
+        with self._lock:
+            thread, self._thread = self._thread, None
+        self._stopping.set()
+        if thread is not None:
+            thread.join(timeout)
+
+    def _run(self):
+        while not self._stopping.is_set():
+            try:
+                with get_pool().connection() as conn:
+                    if self._segment is None or time.monotonic() - self.loaded_at >= USER_INDEX_REBUILD_INTERVAL:
+                        # Tam yeniden yükleme silinen kullanıcıları da temizler
+                        self.load(conn)
+                    else:
+                        applied = self.refresh(conn)
+                        if applied:
+                            logger.debug("user_index: applied %s changed users.", applied)
+                if self._compact_requested.is_set():
+                    self.compact()
+            except psycopg2.Error as e:
+                logger.exception("user_index: refresh failed: %s", e)
+            self._stopping.wait(USER_INDEX_REFRESH_INTERVAL)
+
+    def stats(self):
+        with self._lock:
+            segment = self._segment
+            return {
+                'ready': 1 if segment is not None else 0,
+                'users': len(segment) if segment is not None else 0,
+                'keys': len(segment.keys) if segment is not None else 0,
+                'bytes': segment.nbytes() if segment is not None else 0,
+                'delta': len(self._overrides),
+                'rebuilds': self.rebuilds,
+                'lookups': self.lookups,
+            }
+
+
+def followed_among(conn, follower_user_id, user_ids):
+    """Returns the subset of `user_ids` that follower_user_id follows."""
+    if not user_ids:
+        return set()
+    with conn.cursor() as cursor:
+        cursor.execute(
+            "SELECT followed_user_id FROM follows WHERE follower_user_id = %s AND followed_user_id = ANY(%s);",
+            (follower_user_id, list(user_ids))
+        )
+        followed = {row[0] for row in cursor.fetchall()}
+    conn.rollback()
+    return followed
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_index():
+    """Returns the process-wide index (its refresh thread is started by app.py)."""
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                _index = UserIndex()
+    return _index
+
+
+metrics.register_stats('solara_user_index', lambda: get_index().stats() if USER_INDEX_ENABLED else None, {
+    'ready': ('ready', 'gauge', '1 once the in-memory user index has been built.'),
+    'users': ('users', 'gauge', 'Users in the index segment.'),
+    'keys': ('keys', 'gauge', 'Search keys in the index segment.'),
+    'bytes': ('bytes', 'gauge', 'Approximate memory used by the index segment.'),
+    'delta': ('delta_users', 'gauge', 'Users changed since the last rebuild.'),
+    'rebuilds': ('rebuilds_total', 'counter', 'Index segment rebuilds.'),
+    'lookups': ('lookups_total', 'counter', 'Searches answered from the index.'),
+})
+
+
+def note_user(user_id, username, full_name=None, profile_picture_url=None):
+    """Write hook for db_utils; a no-op in processes that do not serve search from the index."""
+    if _index is not None and _index.ready:
+        _index.note_user(user_id, username, full_name, profile_picture_url)
+
+
+def search(query, current_user_id=None, limit=None):
+    """
+    Prefix search served from the index, in the same shape as db_utils.search_users.
+    Returns None when the index is disabled or not loaded yet (callers fall back to SQL).
+    """
+    if not USER_INDEX_ENABLED or _index is None:
+        return None
+    limit = min(limit or USER_SEARCH_DEFAULT_LIMIT, USER_SEARCH_MAX_LIMIT)
+    # Takip edilenler öne alınabilsin diye istenenden biraz fazla aday alınır
+    candidates = _index.lookup(query, limit * FOLLOW_RERANK_FACTOR, exclude_user_id=current_user_id)
+    if candidates is None:
+        return None
+    followed = set()
+    if current_user_id is not None and candidates:
+        # Takip durumu bellekte tutulmaz; (follower, followed) UNIQUE indeksinde tek bir sorgu
+        with get_pool().connection() as conn:
+            followed = followed_among(conn, current_user_id, [row['user_id'] for row in candidates])
+    for row in candidates:
+        row['is_following'] = row['user_id'] in followed
+    candidates.sort(key=lambda r: (not r['exact'], not r['username_match'], not r['is_following']))
+    return [
+        {key: row[key] for key in ('user_id', 'username', 'full_name', 'profile_picture_url', 'is_following')}
+        for row in candidates[:limit]
+    ]
@@ -375,4 +375,16 @@ document.addEventListener('DOMContentLoaded', function() {
 
     // Fetch notifications and requests when the page loads
     fetchNotificationsAndRequests();
+
+    // Listen for new notifications over Server-Sent Events instead of polling.
+    // The browser reconnects automatically and sends Last-Event-ID, so nothing is missed.
+    if (window.EventSource) {
+        const eventSource = new EventSource('/api/events/stream');
+        eventSource.addEventListener('notification', function() {
+            fetchNotificationsAndRequests();
+        });
+        eventSource.onerror = function(error) {
+            console.warn('Event stream interrupted, the browser will reconnect:', error);
+        };
+    }
 });